@@ -1,41 +1,181 @@
 #!/usr/bin/env python3
 """API Charm for SnapPulse."""
 
+import json
+import logging
+import re
+
 from ops.main import main
 from ops.charm import CharmBase
-from ops.pebble import Layer
-from ops.model import ActiveStatus
+from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+from ops.pebble import PathError
+
+logger = logging.getLogger(__name__)
+
+# State survives restarts in the in-memory store's snapshots
+SNAPSHOT_DIR = "/var/lib/snappulse/snapshots"
+# SQLite store, shared by the workers
+STORE_DIR = "/var/lib/snappulse/store"
+# Streaming models and the ingest feed, for stores that keep no directory of
+# their own
+STATE_DIR = "/var/lib/snappulse/state"
+# Service environment, read by each worker as it starts (SETTINGS_FILE)
+SETTINGS_FILE = "/etc/snappulse/api.json"
+RATE_LIMITS = ("ingest", "read", "heavy")
+_WORKERS = re.compile(r"--workers (\d+) ")
+
+
+def uvicorn_command(workers: int, timeout: int) -> str:
+    """Return the command running ``workers`` API workers."""
+    return (
+        "uvicorn main:app --host 0.0.0.0 --port 8000 "
+        f"--workers {workers} "
+        f"--timeout-graceful-shutdown {timeout}"
+    )
 
 
 class ApiCharm(CharmBase):
-    """Charm the API service."""
+    """Charm the API service.
+
+    Tuning knobs are charm config options, written to a settings file that
+    every uvicorn worker loads into its environment as it starts.
+
+    Several workers need a store they can share: SQLite or OpenSearch.
+    They are then changed in place: SIGTTIN and SIGTTOU make uvicorn add or
+    remove workers, and SIGHUP replaces them one at a time, each new worker
+    starting before the old one finishes its requests in flight and exits.
+    A single worker is not supervised by uvicorn, so Pebble restarts it
+    instead: it stops accepting connections and drains for up to
+    ``shutdown-timeout`` seconds before the new one starts.
+    """
 
     def __init__(self, *args):
         super().__init__(*args)
         self.framework.observe(self.on.install, self._on_install)
+        self.framework.observe(self.on.api_pebble_ready, self._on_api_pebble_ready)
         self.framework.observe(self.on.config_changed, self._on_config_changed)
 
     def _on_install(self, _):
         """Handle the install event."""
         self.unit.status = ActiveStatus("installing dependencies")
 
-    def _on_config_changed(self, _):
-        """Handle the config-changed event."""
-        layer = Layer(
-            {
-                "summary": "API",
-                "services": {
-                    "api": {
-                        "override": "replace",
-                        "command": "uvicorn main:app --host 0.0.0.0 --port 8000",
-                        "startup": "enabled",
-                    }
-                },
-            }
-        )
-        self.unit.get_container("api").add_layer("api", layer, combine=True)
+    def _on_api_pebble_ready(self, event):
+        """Handle pebble-ready event."""
+        self._update_layer()
+
+    def _on_config_changed(self, event):
+        """Handle config-changed event."""
+        self._update_layer()
+
+    def _environment(self):
+        """Return the service environment built from the charm config."""
+        environment = {
+            "STORE_SHARDS": str(self.config["store-shards"]),
+            "SNAPSHOT_SEC": str(self.config["snapshot-sec"]),
+            "MAX_IN_FLIGHT": str(self.config["max-in-flight"]),
+        }
+        if self.config["opensearch-url"]:
+            environment.update(
+                {
+                    "OPENSEARCH_URL": self.config["opensearch-url"],
+                    "OPENSEARCH_BATCH": str(self.config["opensearch-batch"]),
+                    "OPENSEARCH_REFRESH": self.config["opensearch-refresh"],
+                    "STATE_DIR": STATE_DIR,
+                }
+            )
+        elif self.config["sqlite-store"]:
+            environment["STORE_DIR"] = STORE_DIR
+        else:
+            environment["SNAPSHOT_DIR"] = SNAPSHOT_DIR
+        for route_class in RATE_LIMITS:
+            limit = self.config[f"rate-limit-{route_class}"]
+            if limit:
+                environment[f"RATE_LIMIT_{route_class.upper()}"] = limit
+        return environment
+
+    def _update_layer(self):
+        """Update the Pebble layer."""
+        container = self.unit.get_container("api")
+
+        if not container.can_connect():
+            self.unit.status = WaitingStatus("Waiting for Pebble API")
+            return
+
+        workers = self.config["workers"]
+        timeout = self.config["shutdown-timeout"]
+        if workers < 1 or timeout < 0:
+            self.unit.status = BlockedStatus(
+                "workers must be positive and shutdown-timeout not negative"
+            )
+            return
+        shared = bool(self.config["opensearch-url"] or self.config["sqlite-store"])
+        if workers > 1 and not shared:
+            # The in-memory store belongs to the process that holds it
+            self.unit.status = BlockedStatus(
+                "workers > 1 needs a shared store: set sqlite-store or opensearch-url"
+            )
+            return
+
+        settings = json.dumps(self._environment(), sort_keys=True)
+        try:
+            settings_changed = container.pull(SETTINGS_FILE).read() != settings
+        except PathError:
+            settings_changed = True
+        container.push(SETTINGS_FILE, settings, make_dirs=True)
+
+        running = self._running_workers(container, timeout)
+        pebble_layer = {
+            "summary": "API layer",
+            "description": "pebble config layer for the API",
+            "services": {
+                "api": {
+                    "override": "replace",
+                    "summary": "API service",
+                    "command": uvicorn_command(workers, timeout),
+                    "startup": "enabled",
+                    "environment": {"SETTINGS_FILE": SETTINGS_FILE},
+                    # Leave uvicorn time to drain before Pebble kills it
+                    "kill-delay": f"{timeout + 5}s",
+                }
+            },
+        }
+        container.add_layer("api", pebble_layer, combine=True)
+
+        if shared and running is not None and running > 1 and workers > 1:
+            # uvicorn's supervisor adopts the change; the new command in the
+            # plan only applies to the next start
+            for _ in range(workers - running):
+                container.send_signal("SIGTTIN", "api")
+            for _ in range(running - workers):
+                container.send_signal("SIGTTOU", "api")
+            if settings_changed:
+                container.send_signal("SIGHUP", "api")
+            logger.info("API workers changed in place: %d workers", workers)
+        elif settings_changed:
+            container.restart("api")
+            logger.info("API restarted: %d workers", workers)
+        else:
+            # Restart the service only if its command changed
+            container.replan()
+            logger.info("API layer updated: %d workers", workers)
+
         self.unit.status = ActiveStatus()
 
+    def _running_workers(self, container, timeout):
+        """Return how many workers the running service has, or None if it
+        is not running or was started with another shutdown timeout."""
+        service = container.get_services("api").get("api")
+        if service is None or not service.is_running():
+            return None
+        planned = container.get_plan().services.get("api")
+        match = _WORKERS.search(planned.command if planned is not None else "")
+        if match is None:
+            return None
+        workers = int(match.group(1))
+        if planned.command != uvicorn_command(workers, timeout):
+            return None
+        return workers
+
 
 if __name__ == "__main__":
     main(ApiCharm)
@@ -1,45 +1,49 @@
 #!/usr/bin/env python3
 """Collector Charm for SnapPulse."""
 
+import logging
+
 from ops.main import main
 from ops.charm import CharmBase
-from ops.pebble import Layer
-from ops.model import ActiveStatus
+from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+
+logger = logging.getLogger(__name__)
+
+PEER_RELATION = "collectors"
+# Records not yet forwarded to the API when the collector stopped
+SPOOL_DIR = "/var/lib/snappulse/spool"
+# Snap Store validators for conditional requests
+CACHE_DIR = "/var/lib/snappulse/http-cache"
+# Records per /ingest/batch request the API accepts (MAX_INGEST_BATCH)
+MAX_BATCH_SIZE = 500
 
 
 class CollectorCharm(CharmBase):
-    """Charm the Collector service."""
+    """Charm the Collector service.
+
+    Units share the tracked snaps through the ``collectors`` peer relation:
+    each unit is told its own name and the names of all peers, and the
+    collector claims its slice by consistent hashing (see partition.py).
+    """
 
     def __init__(self, *args):
         super().__init__(*args)
         self.framework.observe(self.on.install, self._on_install)
+        self.framework.observe(
+            self.on.collector_pebble_ready, self._on_collector_pebble_ready
+        )
         self.framework.observe(self.on.config_changed, self._on_config_changed)
+        self.framework.observe(
+            self.on[PEER_RELATION].relation_joined, self._on_peers_changed
+        )
+        self.framework.observe(
+            self.on[PEER_RELATION].relation_departed, self._on_peers_changed
+        )
 
     def _on_install(self, _):
         """Handle the install event."""
         self.unit.status = ActiveStatus("installing dependencies")
 
-    def _on_config_changed(self, _):
-        """Handle the config-changed event."""
-        layer = Layer(
-            {
-                "summary": "Collector",
-                "services": {
-                    "collector": {
-                        "override": "replace",
-                        "command": "python app.py",
-                        "startup": "enabled",
-                    }
-                },
-            }
-        )
-        self.unit.get_container("collector").add_layer("collector", layer, combine=True)
-        self.unit.status = ActiveStatus()
-
-
-if __name__ == "__main__":
-    main(CollectorCharm)
-
     def _on_collector_pebble_ready(self, event):
         """Handle pebble-ready event."""
         self._update_layer()
@@ -48,15 +52,36 @@ if __name__ == "__main__":
         """Handle config-changed event."""
         self._update_layer()
 
+    def _on_peers_changed(self, event):
+        """Rebalance the snaps when collector units are added or removed."""
+        self._update_layer()
+
+    def _peer_units(self):
+        """Return the names of all collector units, this one included."""
+        units = {self.unit.name}
+        relation = self.model.get_relation(PEER_RELATION)
+        if relation is not None:
+            units.update(unit.name for unit in relation.units)
+        return sorted(units)
+
     def _update_layer(self):
         """Update the Pebble layer."""
         container = self.unit.get_container("collector")
 
         if not container.can_connect():
-            logger.info("Waiting for Pebble API")
+            self.unit.status = WaitingStatus("Waiting for Pebble API")
+            return
+
+        if not 1 <= self.config["batch-size"] <= MAX_BATCH_SIZE:
+            # The API would reject every batch, and they would be spooled forever
+            self.unit.status = BlockedStatus(
+                f"batch-size must be between 1 and {MAX_BATCH_SIZE}"
+            )
             return
 
-        # Define the layer
+        peers = self._peer_units()
+        snap_name = self.config.get("snap-name", "firefox")
+        timeout = self.config["shutdown-timeout"]
         pebble_layer = {
             "summary": "collector layer",
             "description": "pebble config layer for collector",
@@ -67,18 +92,31 @@ if __name__ == "__main__":
                     "command": "python3 /app/app.py",
                     "startup": "enabled",
                     "environment": {
-                        "SNAP_NAME": self.config.get("snap-name", "firefox"),
+                        "SNAP_NAME": snap_name,
+                        "SNAP_NAMES": self.config.get("snaps") or snap_name,
+                        "COLLECTOR_UNIT": self.unit.name,
+                        "COLLECTOR_PEERS": ",".join(peers),
+                        "POLL_SEC": str(self.config["poll-sec"]),
+                        "COLLECTOR_CONCURRENCY": str(self.config["concurrency"]),
+                        "BATCH_SIZE": str(self.config["batch-size"]),
+                        "CACHE_DIR": CACHE_DIR,
+                        "CACHE_ENTRIES": str(self.config["cache-size"]),
+                        "SHUTDOWN_TIMEOUT": str(timeout),
+                        "SPOOL_DIR": SPOOL_DIR,
                     },
+                    # Leave the collector time to flush before Pebble kills it
+                    "kill-delay": f"{timeout + 5}s",
                 }
             },
         }
 
-        # Add the layer to Pebble
+        # Restart the service if its environment changed
         container.add_layer("collector", pebble_layer, combine=True)
-        container.autostart()
+        container.replan()
 
-        self.unit.status = ActiveStatus("Collector service is running")
-        self._stored.started = True
+        self.unit.status = ActiveStatus(
+            f"Collecting as unit {peers.index(self.unit.name) + 1} of {len(peers)}"
+        )
 
 
 if __name__ == "__main__":
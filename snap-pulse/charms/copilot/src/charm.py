@@ -6,6 +6,8 @@ from ops.charm import CharmBase
 from ops.pebble import Layer
 from ops.model import ActiveStatus
 
+RESULTS_DIR = "/var/lib/snappulse/analyses"
+
 
 class CopilotCharm(CharmBase):
     """Charm the Copilot service."""
@@ -29,53 +31,20 @@ class CopilotCharm(CharmBase):
                         "override": "replace",
                         "command": "uvicorn main:app --host 0.0.0.0 --port 8001",
                         "startup": "enabled",
+                        "environment": {
+                            "GITHUB_TOKEN": self.config.get("github-token", ""),
+                            # Past analyses survive restarts (see results.py)
+                            "RESULTS_DIR": RESULTS_DIR,
+                        },
                     }
                 },
             }
         )
-        self.unit.get_container("copilot").add_layer("copilot", layer, combine=True)
-        self.unit.status = ActiveStatus()
-
-
-if __name__ == "__main__":
-    main(CopilotCharm)
-
-    def _on_config_changed(self, event):
-        """Handle config-changed event."""
-        self._update_layer()
-
-    def _update_layer(self):
-        """Update the Pebble layer."""
         container = self.unit.get_container("copilot")
-
-        if not container.can_connect():
-            logger.info("Waiting for Pebble API")
-            return
-
-        # Define the layer
-        pebble_layer = {
-            "summary": "copilot layer",
-            "description": "pebble config layer for copilot",
-            "services": {
-                "copilot": {
-                    "override": "replace",
-                    "summary": "copilot service",
-                    "command": "python3 main.py",
-                    "startup": "enabled",
-                    "environment": {
-                        "PORT": "8001",
-                        "GITHUB_TOKEN": self.config.get("github-token", ""),
-                    },
-                }
-            },
-        }
-
-        # Add the layer to Pebble
-        container.add_layer("copilot", pebble_layer, combine=True)
-        container.autostart()
-
-        self.unit.status = ActiveStatus("Copilot service is running on port 8001")
-        self._stored.started = True
+        container.add_layer("copilot", layer, combine=True)
+        # Restart with the new environment
+        container.replan()
+        self.unit.status = ActiveStatus()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Measure the cold start of each Python service.
+
+For the API and the copilot, the time from launching uvicorn to the first
+successful ``/health`` response; for the collector, which has no
+``/health``, the time to start an interpreter and import it. Each service is started
+``rounds`` times and the median and fastest runs reported.
+
+Usage: python scripts/bench_cold_start.py [rounds]
+"""
+
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+SERVICES = os.path.join(os.path.dirname(__file__), "..", "services")
+TIMEOUT = 60.0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(service: str) -> float:
+    """Start a service under uvicorn and return the seconds until /health
+    answers."""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=os.path.join(SERVICES, service),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < TIMEOUT:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0)
+                if response.status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError(f"{service} exited with {process.returncode}")
+            time.sleep(0.01)
+        raise RuntimeError(f"{service} did not answer within {TIMEOUT}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def import_module(service: str, module: str) -> float:
+    """Return the seconds to start an interpreter and import a module."""
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", f"import {module}"],
+        cwd=os.path.join(SERVICES, service),
+        check=True,
+    )
+    return time.perf_counter() - started
+
+
+def report(label: str, timings) -> None:
+    print(
+        f"{label:<10} median {statistics.median(timings) * 1000:7.0f} ms, "
+        f"fastest {min(timings) * 1000:7.0f} ms"
+    )
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    report("api", [start_server("api") for _ in range(rounds)])
+    report("copilot", [start_server("copilot") for _ in range(rounds)])
+    report("collector", [import_module("collector", "app") for _ in range(rounds)])
+
+
+if __name__ == "__main__":
+    main()
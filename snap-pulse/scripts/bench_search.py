@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Measure search and autocomplete latency over a synthetic snap catalogue.
+
+Usage: python scripts/bench_search.py [snaps]
+"""
+
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "api"))
+
+from search import SearchIndex  # noqa: E402
+
+COMMON_WORDS = [
+    "snap",
+    "app",
+    "tool",
+    "editor",
+    "browser",
+    "music",
+    "video",
+    "linux",
+    "open",
+    "source",
+    "client",
+    "server",
+    "game",
+    "player",
+    "manager",
+]
+QUERIES = ["s", "sn", "brow", "browsr", "music pl", "open source ed", "videoo player"]
+
+
+def random_document(words):
+    name = f"{random.choice(words)}-{random.choice(words)}"
+    vocabulary = COMMON_WORDS + words
+    return name, {
+        "title": name,
+        "summary": " ".join(random.choices(vocabulary, k=8)),
+        "description": " ".join(random.choices(vocabulary, k=60)),
+        "categories": [random.choice(COMMON_WORDS)],
+        "publisher": random.choice(words[:2000]),
+    }
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[int(len(samples) * fraction)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    random.seed(1)
+    words = [
+        "".join(random.choices(string.ascii_lowercase, k=random.randint(3, 10)))
+        for _ in range(20000)
+    ]
+    index = SearchIndex()
+    start = time.perf_counter()
+    for i in range(count):
+        name, fields = random_document(words)
+        index.add(f"{name}-{i}", fields)
+    print(f"Indexed {count} snaps in {time.perf_counter() - start:.1f} s")
+
+    # Interleave ingests with queries, as in production
+    latencies = []
+    for i in range(2000):
+        name, fields = random_document(words)
+        index.add(f"{name}-{count + i}", fields)
+        start = time.perf_counter()
+        index.search(random.choice(QUERIES))
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(
+        f"Query latency: p50 {percentile(latencies, 0.5):.2f} ms, "
+        f"p99 {percentile(latencies, 0.99):.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
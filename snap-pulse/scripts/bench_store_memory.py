@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Measure memory per stored record in the API's in-memory snap store,
+its /snaps indexes included (see "Store Memory" in docs/DEVELOPMENT.md).
+
+Usage: python scripts/bench_store_memory.py [records]
+"""
+
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "api"))
+
+from models import SnapData  # noqa: E402
+from store import MemoryStore  # noqa: E402
+
+CHANNELS = ["stable", "candidate", "beta", "edge"]
+PUBLISHERS = [f"publisher-{i}" for i in range(2000)]
+
+
+def make_records(count: int):
+    random.seed(42)
+    for i in range(count):
+        yield SnapData(
+            snap_name=f"snap-{i // len(CHANNELS)}",
+            channel=CHANNELS[i % len(CHANNELS)],
+            download_total=random.randint(1000, 5_000_000),
+            download_last_30_days=random.randint(100, 500_000),
+            rating=round(random.uniform(3.0, 5.0), 1),
+            version=f"1.{random.randint(0, 20)}.0",
+            last_updated=datetime.now(),
+            confinement=random.choice(["strict", "classic", "devmode"]),
+            grade=random.choice(["stable", "devel"]),
+            publisher=random.choice(PUBLISHERS),
+            trending_score=round(random.uniform(0, 100), 1),
+        )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    store = MemoryStore()
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for data in make_records(count):
+        store.put(data)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{count} records: {(after - before) / count:.0f} bytes per record")
+
+
+if __name__ == "__main__":
+    main()
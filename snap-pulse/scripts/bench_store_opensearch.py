@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compare the OpenSearch store with the in-memory store.
+
+Times ingesting records (for OpenSearch: until every ``_bulk`` request is
+acknowledged), a filtered and sorted query page, ``/trending`` and the
+all-channels ``/stats`` summary. Without ``--url`` the OpenSearch store
+talks to the in-process stand-in of opensearch_mock.py, which measures the
+client side only; point it at a local single-node cluster for real numbers:
+
+    docker run -p 9200:9200 -e discovery.type=single-node \\
+        -e DISABLE_SECURITY_PLUGIN=true opensearchproject/opensearch:2
+
+Usage: python scripts/bench_store_opensearch.py [records] [--url URL]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "api"))
+
+from models import SnapData  # noqa: E402
+from opensearch_mock import MockOpenSearch  # noqa: E402
+from opensearch_store import OpenSearchStore  # noqa: E402
+from store import MemoryStore  # noqa: E402
+
+CHANNELS = ["stable", "candidate", "beta", "edge"]
+PUBLISHERS = [f"publisher-{i}" for i in range(200)]
+ROUNDS = 50
+
+
+def make_records(count: int):
+    random.seed(42)
+    for i in range(count):
+        yield SnapData(
+            snap_name=f"snap-{i // len(CHANNELS)}",
+            channel=CHANNELS[i % len(CHANNELS)],
+            download_total=random.randint(1000, 5_000_000),
+            download_last_30_days=random.randint(100, 500_000),
+            rating=round(random.uniform(3.0, 5.0), 1),
+            version=f"1.{random.randint(0, 20)}.0",
+            last_updated=datetime.now(),
+            confinement=random.choice(["strict", "classic", "devmode"]),
+            grade=random.choice(["stable", "devel"]),
+            publisher=random.choice(PUBLISHERS),
+            trending_score=round(random.uniform(0, 100), 1),
+        )
+
+
+def timed(label: str, call, rounds: int = ROUNDS) -> None:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        call()
+    elapsed = (time.perf_counter() - started) / rounds
+    print(f"  {label:<10} {elapsed * 1000:9.3f} ms")
+
+
+async def run(store, records) -> None:
+    await store.start()
+    started = time.perf_counter()
+    for i, data in enumerate(records):
+        store.put(data)
+        if i % 500 == 0:
+            # Let the flusher send full batches while ingesting, as between
+            # the API's ingest requests
+            await asyncio.sleep(0)
+    await store.stop()
+    elapsed = time.perf_counter() - started
+    print(f"  {'ingest':<10} {len(records) / elapsed:9.0f} records/s")
+    if isinstance(store, OpenSearchStore):
+        # Make the last batch searchable before querying
+        store.refresh()
+
+    filters = {"publisher": "publisher-7", "grade": "stable"}
+    timed("query", lambda: store.query(filters, "download_total", True, 20))
+    timed("trending", lambda: store.trending(10))
+    timed("summary", lambda: store.snap_summary("snap-42"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("records", type=int, nargs="?", default=100_000)
+    parser.add_argument("--url", help="OpenSearch cluster to use")
+    args = parser.parse_args()
+    records = list(make_records(args.records))
+
+    print(f"MemoryStore, {args.records} records")
+    asyncio.run(run(MemoryStore(), records))
+
+    if args.url:
+        store = OpenSearchStore(args.url, index="snappulse-bench")
+        target = args.url
+    else:
+        transport = httpx.MockTransport(MockOpenSearch())
+        store = OpenSearchStore("http://opensearch", transport=transport)
+        target = "in-process stand-in"
+    print(f"OpenSearchStore ({target}), {args.records} records")
+    asyncio.run(run(store, records))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the collector -> API data path on localhost.
+
+Starts, each as its own process:
+
+- the mock Snap Store and fake GitHub of scripts/loadtest,
+- the API, and the copilot pointed at the fake GitHub, and
+- the collector, polling the mock store for ``--snaps`` snaps every
+  ``--poll-sec`` seconds.
+
+and reports:
+
+- initial load: seconds until every snap is visible in the API, and the
+  records per second that took,
+- freshness lag: ``--releases`` new revisions are released in the mock
+  store at a steady rate over ``--duration`` seconds, and each is timed
+  from release until ``/stats/<snap>/stable`` reports its version,
+- copilot latency of ``--analyses`` ``/analyze`` calls, and
+- CPU seconds and peak RSS of every service, read from /proc.
+
+The dashboard renders what the API's endpoints return, so the data path is
+timed up to API visibility. Service logs are kept in a temporary directory,
+printed at the end.
+
+Usage: python scripts/load_test.py [--snaps 2000] [--poll-sec 10]
+       [--releases 200] [--duration 60] [--analyses 50] [--json FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SERVICES = os.path.join(ROOT, "services")
+LOADTEST = os.path.join(ROOT, "scripts", "loadtest")
+# Seconds between checks of the API for released versions
+WATCH_INTERVAL = 0.25
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+# Limits high enough that admission control does not throttle the test
+UNLIMITED = "100000/100000"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Service:
+    """A service process with its log file and resource usage."""
+
+    def __init__(self, name: str, args: List[str], cwd: str, env: Dict[str, str]):
+        self.name = name
+        self.args = args
+        self.cwd = cwd
+        self.env = env
+        self.port: Optional[int] = None
+        self.process: Optional[subprocess.Popen] = None
+        self.started = 0.0
+
+    @classmethod
+    def uvicorn(cls, name: str, module: str, cwd: str, env: Dict[str, str]):
+        service = cls(name, [], cwd, env)
+        service.port = free_port()
+        service.args = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            f"{module}:app",
+            "--port",
+            str(service.port),
+            "--log-level",
+            "warning",
+        ]
+        return service
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, log_dir: str) -> None:
+        log = open(os.path.join(log_dir, f"{self.name}.log"), "wb")
+        self.started = time.monotonic()
+        self.process = subprocess.Popen(
+            self.args,
+            cwd=self.cwd,
+            env={**os.environ, "PYTHONUNBUFFERED": "1", **self.env},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        log.close()
+
+    def wait_ready(self, path: str = "/docs", timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with {self.process.returncode}")
+            try:
+                if httpx.get(self.url + path, timeout=1.0).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError(f"{self.name} did not start within {timeout}s")
+
+    def usage(self) -> Dict[str, Optional[float]]:
+        """Return CPU seconds, CPU share and peak RSS in MiB, from /proc."""
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as f:
+                # Fields after the command name, which may contain spaces
+                fields = f.read().rpartition(")")[2].split()
+            cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+            with open(f"/proc/{self.process.pid}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+            rss = int(status["VmHWM"].split()[0]) / 1024
+        except (OSError, KeyError, IndexError, ValueError):
+            return {"cpu_sec": None, "cpu_pct": None, "peak_rss_mib": None}
+        wall = time.monotonic() - self.started
+        return {
+            "cpu_sec": round(cpu, 2),
+            "cpu_pct": round(cpu / wall * 100, 1),
+            "peak_rss_mib": round(rss, 1),
+        }
+
+    def stop(self) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+async def visible_count(client: httpx.AsyncClient, api: str) -> int:
+    response = await client.get(
+        f"{api}/export", params={"format": "ndjson", "compression": "none"}
+    )
+    response.raise_for_status()
+    return response.content.count(b"\n")
+
+
+async def initial_load(api: str, snaps: int, started: float, timeout: float) -> dict:
+    """Wait until every snap is visible in the API."""
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        while time.monotonic() - started < timeout:
+            if await visible_count(client, api) >= snaps:
+                elapsed = time.monotonic() - started
+                return {
+                    "seconds": round(elapsed, 2),
+                    "records_per_sec": round(snaps / elapsed, 1),
+                }
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Not every snap reached the API within {timeout}s")
+
+
+async def freshness(
+    store: str, api: str, names: List[str], releases: int, duration: float, wait: float
+) -> dict:
+    """Release new revisions and time each until the API serves it."""
+    pending: Dict[str, tuple] = {}
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def release_all(client: httpx.AsyncClient):
+        for name in random.sample(names, releases):
+            response = await client.post(f"{store}/_release/{name}")
+            response.raise_for_status()
+            pending[name] = (response.json()["version"], time.monotonic())
+            await asyncio.sleep(duration / releases)
+        done.set()
+
+    async def check(client: httpx.AsyncClient, name: str):
+        version, released = pending[name]
+        response = await client.get(f"{api}/stats/{name}/stable")
+        if response.status_code == 200 and response.json()["version"] == version:
+            lags.append(time.monotonic() - released)
+            del pending[name]
+
+    async with httpx.AsyncClient(
+        timeout=30.0, limits=httpx.Limits(max_connections=32)
+    ) as client:
+        releaser = asyncio.create_task(release_all(client))
+        deadline = None
+        while not done.is_set() or pending:
+            if done.is_set():
+                deadline = deadline or time.monotonic() + wait
+                if time.monotonic() > deadline:
+                    break
+            await asyncio.gather(*(check(client, name) for name in list(pending)))
+            await asyncio.sleep(WATCH_INTERVAL)
+        await releaser
+    return {
+        "releases": releases,
+        "seen": len(lags),
+        "lag_p50_sec": round(percentile(lags, 50) or 0, 2),
+        "lag_p95_sec": round(percentile(lags, 95) or 0, 2),
+        "lag_max_sec": round(max(lags, default=0), 2),
+    }
+
+
+async def analyses(copilot: str, count: int, concurrency: int = 4) -> dict:
+    """Time ``/analyze`` calls against the fake GitHub."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def analyze(client: httpx.AsyncClient, i: int):
+        nonlocal failures
+        async with semaphore:
+            started = time.monotonic()
+            response = await client.post(
+                f"{copilot}/analyze",
+                json={
+                    "snapcraft_yaml": "",
+                    "repository_url": f"https://github.com/load-test/repo-{i}",
+                    "issue_number": i,
+                },
+            )
+            if response.status_code == 200:
+                latencies.append(time.monotonic() - started)
+            else:
+                failures += 1
+
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        await asyncio.gather(*(analyze(client, i) for i in range(count)))
+    return {
+        "requests": count,
+        "failures": failures,
+        "latency_p50_ms": round((percentile(latencies, 50) or 0) * 1000, 1),
+        "latency_p95_ms": round((percentile(latencies, 95) or 0) * 1000, 1),
+    }
+
+
+async def run(args, services: Dict[str, Service]) -> dict:
+    store, api = services["store"].url, services["api"].url
+    names = [f"snap-{i:05d}" for i in range(args.snaps)]
+    started = services["collector"].started
+    report = {
+        "snaps": args.snaps,
+        "poll_sec": args.poll_sec,
+        "initial_load": await initial_load(
+            api, args.snaps, started, timeout=max(300.0, args.snaps / 10)
+        ),
+    }
+    report["freshness"], report["copilot"] = await asyncio.gather(
+        freshness(
+            store,
+            api,
+            names,
+            min(args.releases, args.snaps),
+            args.duration,
+            wait=args.poll_sec * 2 + 30,
+        ),
+        analyses(services["copilot"].url, args.analyses),
+    )
+    async with httpx.AsyncClient() as client:
+        report["snap_store_requests"] = (await client.get(f"{store}/_stats")).json()
+        report["github_requests"] = (
+            await client.get(f"{services['github'].url}/_stats")
+        ).json()
+    report["resources"] = {name: s.usage() for name, s in services.items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snaps", type=int, default=2000)
+    parser.add_argument("--poll-sec", type=int, default=10)
+    parser.add_argument("--releases", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--analyses", type=int, default=50)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix="snappulse-load-")
+    store = Service.uvicorn(
+        "store", "mock_store", LOADTEST, {"MOCK_SNAP_PREFIX": "snap-"}
+    )
+    github = Service.uvicorn("github", "fake_github", LOADTEST, {})
+    api = Service.uvicorn(
+        "api",
+        "main",
+        os.path.join(SERVICES, "api"),
+        {
+            "RATE_LIMIT_INGEST": UNLIMITED,
+            "RATE_LIMIT_READ": UNLIMITED,
+            "RATE_LIMIT_HEAVY": UNLIMITED,
+            "MAX_IN_FLIGHT": "1024",
+        },
+    )
+    copilot = Service.uvicorn(
+        "copilot",
+        "main",
+        os.path.join(SERVICES, "copilot"),
+        {"GITHUB_TOKEN": "load-test", "GITHUB_API_URL": github.url},
+    )
+    collector = Service(
+        "collector",
+        [sys.executable, "app.py"],
+        os.path.join(SERVICES, "collector"),
+        {
+            "SNAP_NAMES": ",".join(f"snap-{i:05d}" for i in range(args.snaps)),
+            "POLL_SEC": str(args.poll_sec),
+            "COLLECTOR_CONCURRENCY": "32",
+            "BATCH_SIZE": "100",
+            "SNAP_STORE_API": f"{store.url}/v2",
+            "API_URL": api.url,
+            "METRICS_PORT": "0",
+        },
+    )
+    services = {
+        "store": store,
+        "github": github,
+        "api": api,
+        "copilot": copilot,
+        "collector": collector,
+    }
+    try:
+        for service in (store, github, api, copilot):
+            service.start(log_dir)
+        for service in (store, github, api, copilot):
+            service.wait_ready()
+        collector.start(log_dir)
+        report = asyncio.run(run(args, services))
+    finally:
+        for service in reversed(list(services.values())):
+            service.stop()
+
+    print(json.dumps(report, indent=2))
+    print(f"Service logs: {log_dir}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Local stand-in for the GitHub REST API, for scripts/load_test.py.
+
+Answers the requests the copilot's GitHubClient makes for ``/analyze``:
+repository metadata, file contents, branch refs, file updates and pull
+requests. Every repository holds the same ``snap/snapcraft.yaml`` and
+every response carries ``X-RateLimit-*`` headers. ``GET /_stats`` counts
+the requests served.
+
+Run with: uvicorn fake_github:app --port 9200
+"""
+
+import base64
+import threading
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+
+SNAPCRAFT_PATH = "snap/snapcraft.yaml"
+SNAPCRAFT_YAML = """\
+name: load-test
+base: core22
+version: '1.0'
+summary: Load test snap
+description: A snap the fake GitHub serves to every analysis
+grade: stable
+confinement: strict
+apps:
+  load-test:
+    command: bin/load-test
+    plugs: [home, network]
+parts:
+  load-test:
+    plugin: python
+    source: .
+    build-packages: [python3-dev, gcc]
+    stage-packages: [libssl3, tzdata]
+"""
+RATE_LIMIT = 5000
+WINDOW = 3600
+
+app = FastAPI(title="Fake GitHub")
+
+_lock = threading.Lock()
+_window = {"reset": time.time() + WINDOW, "used": 0}
+_counts = {"requests": 0, "pulls": 0}
+
+
+@app.middleware("http")
+async def rate_limit_headers(request: Request, call_next):
+    with _lock:
+        if time.time() >= _window["reset"]:
+            _window.update(reset=time.time() + WINDOW, used=0)
+        _window["used"] += 1
+        _counts["requests"] += 1
+        remaining = max(0, RATE_LIMIT - _window["used"])
+        reset = int(_window["reset"])
+    response = await call_next(request)
+    response.headers["X-RateLimit-Limit"] = str(RATE_LIMIT)
+    response.headers["X-RateLimit-Remaining"] = str(remaining)
+    response.headers["X-RateLimit-Reset"] = str(reset)
+    return response
+
+
+@app.get("/repos/{owner}/{name}")
+def repo(owner: str, name: str):
+    return {"full_name": f"{owner}/{name}", "default_branch": "main"}
+
+
+@app.get("/repos/{owner}/{name}/contents/{path:path}")
+def contents(owner: str, name: str, path: str, ref: str = "main"):
+    if path != SNAPCRAFT_PATH:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {
+        "type": "file",
+        "path": path,
+        "sha": "0" * 40,
+        "content": base64.b64encode(SNAPCRAFT_YAML.encode("utf-8")).decode("ascii"),
+    }
+
+
+@app.put("/repos/{owner}/{name}/contents/{path:path}")
+def update_contents(owner: str, name: str, path: str):
+    return {"content": {"path": path, "sha": "1" * 40}}
+
+
+@app.get("/repos/{owner}/{name}/git/ref/heads/{branch}")
+def branch(owner: str, name: str, branch: str):
+    return {"ref": f"refs/heads/{branch}", "object": {"sha": "2" * 40}}
+
+
+@app.post("/repos/{owner}/{name}/git/refs", status_code=201)
+def create_ref(owner: str, name: str):
+    return {"object": {"sha": "2" * 40}}
+
+
+@app.post("/repos/{owner}/{name}/pulls", status_code=201)
+def create_pull(owner: str, name: str):
+    with _lock:
+        _counts["pulls"] += 1
+        number = _counts["pulls"]
+    return {
+        "number": number,
+        "html_url": f"https://github.com/{owner}/{name}/pull/{number}",
+    }
+
+
+@app.get("/_stats")
+def stats():
+    with _lock:
+        return dict(_counts)
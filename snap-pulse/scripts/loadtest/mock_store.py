@@ -0,0 +1,93 @@
+"""
+Local stand-in for the Snap Store info API, for scripts/load_test.py.
+
+Serves ``GET /v2/snaps/info/<name>`` for every name starting with
+``MOCK_SNAP_PREFIX``, in the shape the collector reads, with an ``ETag``
+per revision so unchanged snaps are answered with 304. ``POST
+/_release/<name>`` releases a new revision to the snap's stable channel,
+and ``GET /_stats`` counts the info requests served.
+
+Run with: MOCK_SNAP_PREFIX=snap- uvicorn mock_store:app --port 9100
+"""
+
+import os
+import threading
+import zlib
+from typing import Dict
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+
+PREFIX = os.getenv("MOCK_SNAP_PREFIX", "snap-")
+RISKS = ("stable", "candidate", "edge")
+ARCHITECTURES = ("amd64", "arm64")
+
+app = FastAPI(title="Mock Snap Store")
+
+_lock = threading.Lock()
+# Stable revision of every snap released since start; others are at 1
+_revisions: Dict[str, int] = {}
+_counts = {"full": 0, "not_modified": 0}
+
+
+def info(name: str, revision: int) -> dict:
+    seed = zlib.crc32(name.encode("utf-8"))
+    channel_map = []
+    for offset, risk in enumerate(RISKS):
+        for arch in ARCHITECTURES:
+            channel_map.append(
+                {
+                    "channel": {
+                        "architecture": arch,
+                        "name": risk,
+                        "risk": risk,
+                        "track": "latest",
+                        "released-at": "2025-07-01T00:00:00+00:00",
+                    },
+                    "confinement": "strict",
+                    "revision": revision + offset,
+                    "version": f"1.{revision + offset}",
+                    "download": {"size": 10_000_000 + seed % 1000 + revision},
+                }
+            )
+    return {
+        "name": name,
+        "summary": f"Summary of {name}",
+        "description": f"{name} is a snap served by the mock Snap Store.",
+        "publisher": {"display-name": f"publisher-{seed % 50}"},
+        "license": "MIT",
+        "categories": [{"name": ("utilities", "development", "games")[seed % 3]}],
+        "default-track": "latest",
+        "channel-map": channel_map,
+        "download": {"size": 10_000_000 + seed % 1000},
+    }
+
+
+@app.get("/v2/snaps/info/{name}")
+def snap_info(name: str, request: Request):
+    if not name.startswith(PREFIX):
+        raise HTTPException(status_code=404, detail="No such snap")
+    with _lock:
+        revision = _revisions.get(name, 1)
+    etag = f'"{name}-{revision}"'
+    if request.headers.get("If-None-Match") == etag:
+        with _lock:
+            _counts["not_modified"] += 1
+        return Response(status_code=304, headers={"ETag": etag})
+    with _lock:
+        _counts["full"] += 1
+    return JSONResponse(info(name, revision), headers={"ETag": etag})
+
+
+@app.post("/_release/{name}")
+def release(name: str):
+    """Release a new stable revision; return its version."""
+    with _lock:
+        revision = _revisions[name] = _revisions.get(name, 1) + 1
+    return {"snap_name": name, "revision": revision, "version": f"1.{revision}"}
+
+
+@app.get("/_stats")
+def stats():
+    with _lock:
+        return dict(_counts)
@@ -0,0 +1,195 @@
+"""
+Rate limiting and admission control for the API.
+
+Every request belongs to a route class (see ``classify``). The
+``AdmissionMiddleware`` admits it in two steps:
+
+- **Rate limit.** Each client has a token bucket per route class, refilled
+  at the class rate up to its burst size. A client out of tokens gets a
+  429 response.
+- **Load shedding.** Requests in flight are capped at ``max_in_flight``.
+  Lower priority classes may only use a share of that capacity, so ingest
+  and health checks are still admitted when heavy reads have filled
+  their share. Requests over the cap get an immediate 429 rather than
+  waiting in a queue.
+
+Limits can be set with ``RATE_LIMIT_<CLASS>`` environment variables of
+the form ``rate/burst``, e.g. ``RATE_LIMIT_HEAVY=5/20``. Admission counters
+are exposed through ``AdmissionController.metrics``.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+@dataclass
+class RouteClass:
+    name: str
+    # Lower values are admitted first under load
+    priority: int
+    # Tokens per second and bucket size per client; None disables the limit
+    rate: Optional[float]
+    burst: float = 0.0
+
+
+# Share of the in-flight capacity usable by each priority
+PRIORITY_SHARES = {0: 1.0, 1: 0.75, 2: 0.5}
+MAX_CLIENTS = 10000
+
+DEFAULT_CLASSES = (
+    RouteClass("health", 0, None),
+    RouteClass("ingest", 0, 1000.0, 2000.0),
+    RouteClass("read", 1, 50.0, 100.0),
+    RouteClass("heavy", 2, 5.0, 20.0),
+)
+HEALTH_PATHS = ("/", "/health", "/metrics")
+INGEST_PREFIXES = ("/ingest", "/webhook/")
+HEAVY_PREFIXES = ("/compare", "/export", "/forecast", "/history")
+
+
+def classify(path: str) -> str:
+    """Return the route class of a request."""
+    if path in HEALTH_PATHS:
+        return "health"
+    if path.startswith(INGEST_PREFIXES):
+        return "ingest"
+    if path.startswith(HEAVY_PREFIXES):
+        return "heavy"
+    return "read"
+
+
+def load_classes() -> Dict[str, RouteClass]:
+    """Return the route classes with limits overridden from the
+    environment."""
+    classes = {}
+    for default in DEFAULT_CLASSES:
+        limit = os.getenv(f"RATE_LIMIT_{default.name.upper()}")
+        if limit:
+            rate, _, burst = limit.partition("/")
+            default = RouteClass(
+                default.name, default.priority, float(rate), float(burst or rate)
+            )
+        classes[default.name] = default
+    return classes
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        """Take a token; return 0 on success, else the seconds until one is
+        available."""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class AdmissionController:
+    """Token buckets, in-flight accounting and counters.
+
+    Only used from the event loop, so it needs no locking.
+    """
+
+    def __init__(
+        self,
+        classes: Optional[Dict[str, RouteClass]] = None,
+        max_in_flight: Optional[int] = None,
+    ):
+        self.classes = classes or load_classes()
+        self.max_in_flight = max_in_flight or int(os.getenv("MAX_IN_FLIGHT", "64"))
+        self.in_flight = 0
+        # (client, class) -> bucket, least recently used first
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._counters = {
+            name: {"admitted": 0, "rate_limited": 0, "shed": 0} for name in self.classes
+        }
+
+    def admit(self, client: str, route_class: str) -> Tuple[bool, float]:
+        """Decide on a request; return whether it is admitted and, if not,
+        the seconds the client should wait."""
+        cls = self.classes[route_class]
+        counters = self._counters[route_class]
+        if cls.rate is not None:
+            now = time.monotonic()
+            key = (client, route_class)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(cls.burst, now)
+                if len(self._buckets) > MAX_CLIENTS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(cls.rate, cls.burst, now)
+            if wait:
+                counters["rate_limited"] += 1
+                return False, wait
+        if self.in_flight >= self.max_in_flight * PRIORITY_SHARES[cls.priority]:
+            counters["shed"] += 1
+            return False, 1.0
+        counters["admitted"] += 1
+        self.in_flight += 1
+        return True, 0.0
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "clients": len(self._buckets),
+            "classes": {name: dict(c) for name, c in self._counters.items()},
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an ``AdmissionController`` to HTTP
+    requests."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        route_class = classify(scope["path"])
+        admitted, wait = self.controller.admit(
+            client[0] if client else "unknown", route_class
+        )
+        if not admitted:
+            await self._reject(send, wait)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+    @staticmethod
+    async def _reject(send, wait: float) -> None:
+        body = json.dumps({"detail": "Too many requests"}).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, round(wait))).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,183 @@
+"""
+Streaming anomaly detection on snap download and rating series.
+
+Every ``/ingest`` data point updates one ``SeriesState`` per snap/channel.
+Two metrics are tracked:
+
+- ``downloads``: the daily download rate, derived from the change in
+  ``download_total`` since the previous point, and
+- ``rating``.
+
+Each metric keeps an exponentially weighted mean and variance, so memory is
+constant per series and nothing is recomputed in batch. Download rates also
+have a monthly cycle, so they are first divided by a seasonal factor for the
+day of the cycle; the ``SEASON_DAYS`` factors are themselves smoothed
+estimates of rate over level, as in Holt-Winters. A point more than
+``Z_THRESHOLD`` standard deviations from the mean, once the series has
+warmed up, is recorded as an anomaly event. Events get increasing ids and
+are kept in a bounded buffer that consumers tail with a cursor.
+"""
+
+import math
+import threading
+from array import array
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+ALPHA = 0.1  # EWMA weight of the newest point
+GAMMA = 0.2  # EWMA weight of the newest seasonal ratio
+SEASON_DAYS = 30
+Z_THRESHOLD = 4.0
+WARMUP_POINTS = 8
+MAX_EVENTS = 10000
+SECONDS_PER_DAY = 86400.0
+
+
+class Ewma:
+    """Exponentially weighted mean and variance of one metric."""
+
+    __slots__ = ("mean", "variance", "count")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.variance = 0.0
+        self.count = 0
+
+    def score(self, value: float) -> Optional[float]:
+        """Return the z-score of ``value``, or None while warming up."""
+        if self.count < WARMUP_POINTS:
+            return None
+        # Floor the deviation at 1% of the mean so a flat series does not
+        # flag tiny changes
+        deviation = max(math.sqrt(self.variance), abs(self.mean) * 0.01, 1e-9)
+        return (value - self.mean) / deviation
+
+    def update(self, value: float) -> None:
+        if self.count == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            self.mean += ALPHA * delta
+            self.variance = (1 - ALPHA) * (self.variance + ALPHA * delta * delta)
+        self.count += 1
+
+
+class SeriesState:
+    __slots__ = ("downloads", "season", "rating", "last_total", "last_time")
+
+    def __init__(self):
+        self.downloads = Ewma()
+        self.season = array("d", [1.0]) * SEASON_DAYS
+        self.rating = Ewma()
+        self.last_total: Optional[int] = None
+        self.last_time: Optional[float] = None
+
+    def deseasonalize(self, rate: float, timestamp: float) -> Tuple[float, float]:
+        """Return ``rate`` divided by its seasonal factor, and the factor,
+        then update the factor."""
+        day = int(timestamp // SECONDS_PER_DAY) % SEASON_DAYS
+        factor = self.season[day]
+        adjusted = rate / factor
+        level = self.downloads.mean
+        if self.downloads.count and level > 0:
+            ratio = min(max(rate / level, 0.1), 10.0)
+            self.season[day] = factor + GAMMA * (ratio - factor)
+        return adjusted, factor
+
+
+class AnomalyDetector:
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], SeriesState] = {}
+        self._events: deque = deque(maxlen=max_events)
+        self._next_id = 1
+
+    def observe(
+        self,
+        snap_name: str,
+        channel: str,
+        download_total: int,
+        rating: float,
+        timestamp: float,
+    ) -> List[dict]:
+        """Update the series with one data point and return new events."""
+        events = []
+        with self._lock:
+            state = self._series.get((snap_name, channel))
+            if state is None:
+                state = self._series[(snap_name, channel)] = SeriesState()
+
+            if state.last_time is not None and timestamp > state.last_time:
+                elapsed_days = (timestamp - state.last_time) / SECONDS_PER_DAY
+                rate = (download_total - state.last_total) / elapsed_days
+                adjusted, factor = state.deseasonalize(rate, timestamp)
+                events.append(
+                    self._check(
+                        state.downloads, "downloads", adjusted, timestamp, factor
+                    )
+                )
+            if state.last_time is None or timestamp > state.last_time:
+                state.last_total = download_total
+                state.last_time = timestamp
+
+            events.append(self._check(state.rating, "rating", rating, timestamp))
+
+            events = [e for e in events if e is not None]
+            for event in events:
+                event.update(id=self._next_id, snap_name=snap_name, channel=channel)
+                self._next_id += 1
+                self._events.append(event)
+        return events
+
+    @staticmethod
+    def _check(
+        ewma: Ewma, metric: str, value: float, timestamp: float, scale: float = 1.0
+    ) -> Optional[dict]:
+        # ``scale`` puts seasonally adjusted values back on the raw scale
+        z_score = ewma.score(value)
+        expected = ewma.mean
+        ewma.update(value)
+        if z_score is None or abs(z_score) < Z_THRESHOLD:
+            return None
+        return {
+            "metric": metric,
+            "direction": "spike" if z_score > 0 else "drop",
+            "value": round(value * scale, 3),
+            "expected": round(expected * scale, 3),
+            "z_score": round(z_score, 2),
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+        }
+
+    def events_after(self, cursor: int = 0, limit: int = 100) -> Tuple[List[dict], int]:
+        """Return up to ``limit`` events with an id above ``cursor``, and the
+        cursor to pass next time."""
+        with self._lock:
+            if not self._events or cursor >= self._events[-1]["id"]:
+                return [], cursor
+            # Ids are consecutive, so the start position is computed directly
+            start = max(0, cursor + 1 - self._events[0]["id"])
+            events = [
+                self._events[i]
+                for i in range(start, min(start + limit, len(self._events)))
+            ]
+        return events, events[-1]["id"]
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def get_state(self) -> dict:
+        """Return the series and events, to persist across restarts."""
+        with self._lock:
+            return {
+                "series": dict(self._series),
+                "events": list(self._events),
+                "next_id": self._next_id,
+            }
+
+    def set_state(self, state: dict) -> None:
+        """Replace the series and events with a saved ``get_state``."""
+        with self._lock:
+            self._series = state["series"]
+            self._events = deque(state["events"], maxlen=self._events.maxlen)
+            self._next_id = state["next_id"]
@@ -0,0 +1,106 @@
+"""
+Side-by-side comparison of many snaps.
+
+``/compare`` answers for hundreds of snaps in one call. It returns:
+
+- aligned time series from the rollups (see ``RollupEngine.aggregate``),
+  as one matrix per metric, and
+- rank tables of current values, with each snap's percentile rank across
+  the whole catalogue.
+
+Percentiles are looked up in ``Catalogue``, which holds a sorted array of
+every rankable field per channel. The arrays are rebuilt from the store at
+most every ``REFRESH_SEC`` seconds, so a comparison costs a few
+``searchsorted`` calls rather than a scan of the catalogue.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from records import SnapRecord
+
+RANK_FIELDS = ("download_total", "download_last_30_days", "rating", "trending_score")
+# How windows of each rollup metric are summarized in aligned series
+SERIES_AGGREGATES = {"downloads": "sum", "download_total": "last", "rating": "last"}
+REFRESH_SEC = 60
+
+
+class Catalogue:
+    """Sorted values of each rankable field, per channel."""
+
+    def __init__(self, refresh_sec: float = REFRESH_SEC):
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[str, np.ndarray]] = {}
+        self._refreshed = None
+        self.refresh_sec = refresh_sec
+
+    def stale(self) -> bool:
+        return (
+            self._refreshed is None
+            or time.monotonic() - self._refreshed >= self.refresh_sec
+        )
+
+    def refresh(self, records: Iterable[SnapRecord]) -> None:
+        columns: Dict[str, Dict[str, List[float]]] = {}
+        for record in records:
+            channel = columns.get(record.channel)
+            if channel is None:
+                channel = columns[record.channel] = {f: [] for f in RANK_FIELDS}
+            for field in RANK_FIELDS:
+                value = getattr(record, field)
+                # Unpublished figures are not ranked
+                if value is not None:
+                    channel[field].append(value)
+        values = {
+            channel: {
+                field: np.sort(np.array(v, dtype=float)) for field, v in c.items()
+            }
+            for channel, c in columns.items()
+        }
+        with self._lock:
+            self._values = values
+            self._refreshed = time.monotonic()
+
+    def percentiles(self, channel: str, field: str, values: np.ndarray) -> np.ndarray:
+        """Return the percentage of the channel's snaps at or below each
+        value."""
+        with self._lock:
+            catalogue = self._values.get(channel, {}).get(field)
+        if catalogue is None or not len(catalogue):
+            return np.full(len(values), np.nan)
+        below = np.searchsorted(catalogue, values, side="right")
+        return np.minimum(below / len(catalogue) * 100, 100.0)
+
+
+def rank_table(
+    names: List[str], values: np.ndarray, percentiles: np.ndarray
+) -> List[dict]:
+    """Rank ``names`` by descending ``values``, ties sharing a rank."""
+    order = np.argsort(-values, kind="stable")
+    ranks = np.searchsorted(np.sort(-values), -values, side="left") + 1
+    return [
+        {
+            "snap_name": names[i],
+            "value": float(values[i]),
+            "rank": int(ranks[i]),
+            "percentile": _number(percentiles[i], 1),
+        }
+        for i in order
+    ]
+
+
+def series_lists(matrix: np.ndarray, names: List[str]) -> Dict[str, list]:
+    """Convert a series matrix to lists per snap, with None for gaps."""
+    return {
+        name: [_number(value) for value in row.tolist()]
+        for name, row in zip(names, matrix)
+    }
+
+
+def _number(value: float, digits: Optional[int] = None):
+    if value != value:  # NaN
+        return None
+    return value if digits is None else round(float(value), digits)
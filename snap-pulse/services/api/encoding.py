@@ -0,0 +1,100 @@
+"""
+JSON encoding for SnapPulse API responses.
+
+Uses orjson when it is installed and falls back to the standard library.
+``/stats`` responses are serialized once at ingest by ``encode_stats`` and
+served as stored bytes through ``RawJSONResponse``.
+"""
+
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+
+from records import SnapRecord
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def loads(content: bytes) -> Any:
+    """Parse JSON ``content``."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize ``content`` to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def stats_dict(record: SnapRecord) -> dict:
+    """Return the public ``/stats`` representation of a record."""
+    return {
+        "snap_name": record.snap_name,
+        "channel": record.channel,
+        "download_total": record.download_total,
+        "download_last_30_days": record.download_last_30_days,
+        "rating": record.rating,
+        "version": record.version,
+        "last_updated": record.updated_at().isoformat(),
+        "confinement": record.confinement,
+        "grade": record.grade,
+        "publisher": record.publisher,
+        "trending_score": record.trending_score,
+    }
+
+
+def encode_stats(record: SnapRecord) -> bytes:
+    """Serialize the ``/stats`` representation of a record."""
+    # orjson returns bytes backed by an over-allocated buffer (1-4 KiB), so
+    # copy payloads that are kept in the store into an exact-size object
+    return bytes(memoryview(dumps(stats_dict(record))))
+
+
+def record_payload(record: SnapRecord) -> bytes:
+    """Return the stored payload of a record, encoding it on first use."""
+    payload = record.payload
+    if payload is None:
+        payload = record.payload = encode_stats(record)
+    return payload
+
+
+def decode_stats(payload: bytes) -> SnapRecord:
+    """Rebuild a record from its serialized ``/stats`` representation."""
+    fields = loads(payload)
+    return SnapRecord(
+        fields["snap_name"],
+        fields["channel"],
+        fields["download_total"],
+        fields["download_last_30_days"],
+        fields["rating"],
+        fields["version"],
+        datetime.fromisoformat(fields["last_updated"]).timestamp(),
+        fields["confinement"],
+        fields["grade"],
+        fields["publisher"],
+        fields["trending_score"],
+        payload,
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with ``dumps``."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    """Response for content that is already serialized JSON."""
+
+    media_type = "application/json"
@@ -0,0 +1,136 @@
+"""
+Bulk export of stored records.
+
+``export_chunks`` turns the record iterator of ``SnapStore.export`` into
+compressed bytes, one batch of ``BATCH_SIZE`` records at a time, so memory
+stays flat however large the store is. Formats:
+
+- ``ndjson``: one ``/stats`` object per line, written from the stored
+  payloads without encoding them again,
+- ``csv``: a header row, then one row per record, and
+- ``columns``: one JSON object per batch, mapping each field to the list of
+  its values.
+
+Every batch is flushed through the compressor, so a download cut short
+still decompresses up to its last complete batch. Pass the snap name and
+channel of the last record received as ``after`` to resume.
+
+zstd compression needs the optional ``zstandard`` package.
+"""
+
+import csv
+import io
+import zlib
+from itertools import islice
+from typing import Iterable, Iterator
+
+from encoding import dumps, record_payload, stats_dict
+from records import SnapRecord
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+BATCH_SIZE = 1000
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "columns": ("application/x-ndjson", "columns.ndjson"),
+}
+COMPRESSIONS = {
+    "gzip": ("application/gzip", ".gz"),
+    "zstd": ("application/zstd", ".zst"),
+    "none": (None, ""),
+}
+FIELDS = (
+    "snap_name",
+    "channel",
+    "download_total",
+    "download_last_30_days",
+    "rating",
+    "version",
+    "last_updated",
+    "confinement",
+    "grade",
+    "publisher",
+    "trending_score",
+)
+
+
+def media_type(fmt: str, compression: str) -> str:
+    return COMPRESSIONS[compression][0] or FORMATS[fmt][0]
+
+
+def filename(fmt: str, compression: str) -> str:
+    return f"snaps.{FORMATS[fmt][1]}{COMPRESSIONS[compression][1]}"
+
+
+def _encode_ndjson(batch: list) -> bytes:
+    return b"".join(record_payload(record) + b"\n" for record in batch)
+
+
+def _encode_csv(batch: list) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for record in batch:
+        row = stats_dict(record)
+        writer.writerow([row[field] for field in FIELDS])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_columns(batch: list) -> bytes:
+    rows = [stats_dict(record) for record in batch]
+    return dumps({field: [row[field] for row in rows] for field in FIELDS}) + b"\n"
+
+
+ENCODERS = {"ndjson": _encode_ndjson, "csv": _encode_csv, "columns": _encode_columns}
+
+
+class _Identity:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self, *args) -> bytes:
+        return b""
+
+
+def _compressor(compression: str):
+    """Return ``(compressor, batch flush mode)`` for ``compression``."""
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31), zlib.Z_SYNC_FLUSH
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        compressor = zstandard.ZstdCompressor().compressobj()
+        return compressor, zstandard.COMPRESSOBJ_FLUSH_BLOCK
+    return _Identity(), None
+
+
+def export_chunks(
+    records: Iterable[SnapRecord], fmt: str, compression: str
+) -> Iterator[bytes]:
+    """Yield ``records`` encoded as ``fmt`` and compressed, batch by batch.
+
+    Raises ``ValueError`` up front for an unsupported compression.
+    """
+    encode = ENCODERS[fmt]
+    compressor, flush_mode = _compressor(compression)
+    return _chunks(iter(records), fmt, encode, compressor, flush_mode)
+
+
+def _chunks(records, fmt, encode, compressor, flush_mode) -> Iterator[bytes]:
+    if fmt == "csv":
+        yield compressor.compress((",".join(FIELDS) + "\n").encode("utf-8"))
+    while True:
+        batch = list(islice(records, BATCH_SIZE))
+        if not batch:
+            break
+        chunk = compressor.compress(encode(batch))
+        if flush_mode is not None:
+            chunk += compressor.flush(flush_mode)
+        if chunk:
+            yield chunk
+    tail = compressor.flush()
+    if tail:
+        yield tail
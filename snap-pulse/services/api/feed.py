@@ -0,0 +1,80 @@
+"""
+Ingest feed shared by the API workers.
+
+The search index, streaming models and summary in main.py live in each
+worker's memory and are fed by ingests. When several workers share one
+store, an ingest reaches only the worker that accepted it, so every ingest
+is also appended here, and each worker applies the feed in order to its
+own models: the models of every worker end up fed by every ingest, in the
+same order, and with the ingest's own timestamp.
+
+The feed is one SQLite WAL file next to the shared store's state. Rows
+carry an increasing sequence number; a worker remembers the last one it
+applied, saves it with its models at shutdown, and on the next start
+replays only what came after. Rows already covered by saved models are
+trimmed once they are older than ``retention_sec``, which leaves running
+workers that much time to catch up.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+FEED_FILE = "feed.db"
+# Rows read per call to ``after``
+BATCH = 500
+# Seconds a row is kept after saved models cover it
+RETENTION_SEC = 3600.0
+
+
+class IngestFeed:
+    """Ingested records, in the order the workers accepted them."""
+
+    def __init__(self, directory: str, retention_sec: float = RETENTION_SEC):
+        os.makedirs(directory, exist_ok=True)
+        self.retention_sec = retention_sec
+        # Last row this worker has applied
+        self.seq = 0
+        # Handlers may run on different threads; the lock serializes them.
+        # Other workers write the same file, so wait for their transactions
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, FEED_FILE), timeout=30, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingests ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "timestamp REAL NOT NULL, data TEXT NOT NULL)"
+            )
+
+    def append(self, rows: List[Tuple[float, str]]) -> None:
+        """Append ``(timestamp, data)`` rows in one transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO ingests (timestamp, data) VALUES (?, ?)", rows
+            )
+
+    def after(self, seq: int, limit: int = BATCH) -> List[Tuple[int, float, str]]:
+        """Return up to ``limit`` ``(seq, timestamp, data)`` rows after ``seq``."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, timestamp, data FROM ingests WHERE seq > ? "
+                "ORDER BY seq LIMIT ?",
+                (seq, limit),
+            ).fetchall()
+
+    def trim(self, seq: int, now: Optional[float] = None) -> int:
+        """Delete rows up to ``seq`` older than the retention; return how many."""
+        cutoff = (time.time() if now is None else now) - self.retention_sec
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM ingests WHERE seq <= ? AND timestamp < ?", (seq, cutoff)
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
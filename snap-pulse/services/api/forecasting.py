@@ -0,0 +1,279 @@
+"""
+Download forecasts per snap/channel series.
+
+Each series is a sequence of daily download counts, derived from the
+``download_total`` of ingested points. A forecast comes from an additive
+Holt-Winters model (level, trend and a ``SEASON_DAYS`` monthly cycle), or
+Holt's linear model while there is less than two cycles of history.
+
+Models are cheap to keep current and expensive to fit:
+
+- every closed day updates the level, trend and seasonal state in O(1)
+  with the cached smoothing parameters, and
+- the parameters are refitted lazily, on the first forecast after
+  ``REFIT_DAYS`` new days, by a grid search that scores every parameter
+  combination for a whole group of series at once in NumPy.
+
+The last forecast of each model is cached until the next day closes, so
+repeated requests are served without any computation.
+"""
+
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+SEASON_DAYS = 30
+HISTORY_DAYS = 180
+MIN_HISTORY_DAYS = 3
+REFIT_DAYS = 7
+SECONDS_PER_DAY = 86400
+EPOCH = datetime(1970, 1, 1)
+
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.7)
+BETAS = (0.0, 0.01, 0.05, 0.1, 0.2)
+GAMMAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+
+Key = Tuple[str, str]
+
+
+def fit_holt_winters(
+    history: np.ndarray, first_day: int, period: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Fit additive Holt-Winters models to equal-length series.
+
+    ``history`` has one row per series, and its first column is day number
+    ``first_day``. Every combination of the ``ALPHAS``, ``BETAS`` and
+    ``GAMMAS`` grid is run over all series together, and the one with the
+    lowest one-step-ahead squared error is kept per series. With
+    ``period`` 1 there is no seasonal component.
+
+    Returns the parameters ``(alpha, beta, gamma)`` and the final level,
+    trend and seasonal state of each series, the latter indexed by day
+    number modulo ``period``.
+    """
+    gammas = GAMMAS if period > 1 else (0.0,)
+    grid = np.array(list(product(ALPHAS, BETAS, gammas)))
+    alpha, beta, gamma = grid[:, 0], grid[:, 1], grid[:, 2]
+    series, days = history.shape
+    combos = len(grid)
+
+    if period > 1:
+        first = history[:, :period].mean(axis=1)
+        second = history[:, period : 2 * period].mean(axis=1)
+        level = first
+        trend = (second - first) / period
+        season = history[:, :period] - first[:, None]
+        # Align the seasonal state so that it is indexed by day number
+        season = np.roll(season, first_day % period, axis=1)
+    else:
+        level = history[:, 0]
+        trend = (history[:, -1] - history[:, 0]) / (days - 1)
+        season = np.zeros((series, 1))
+
+    level = np.repeat(level[:, None], combos, axis=1)
+    trend = np.repeat(trend[:, None], combos, axis=1)
+    season = np.repeat(season[:, None, :], combos, axis=1)
+    sse = np.zeros((series, combos))
+
+    for t in range(days):
+        phase = (first_day + t) % period
+        value = history[:, t, None]
+        seasonal = season[:, :, phase]
+        error = value - (level + trend + seasonal)
+        sse += error * error
+        new_level = alpha * (value - seasonal) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        season[:, :, phase] = gamma * (value - new_level) + (1 - gamma) * seasonal
+        level = new_level
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(series)
+    return (
+        grid[best],
+        level[rows, best],
+        trend[rows, best],
+        season[rows, best],
+    )
+
+
+class SeriesModel:
+    """Daily download history and Holt-Winters state of one series."""
+
+    __slots__ = (
+        "history",
+        "day",
+        "day_start_total",
+        "last_total",
+        "params",
+        "level",
+        "trend",
+        "season",
+        "fitted_day",
+        "cached",
+    )
+
+    def __init__(self, day: int, total: int):
+        self.history: deque = deque(maxlen=HISTORY_DAYS)
+        # Day number of the open day, and the totals at its start and so far.
+        # The first day is usually seen in part, so it is not recorded.
+        self.day = day
+        self.day_start_total: Optional[float] = None
+        self.last_total = total
+        self.params: Optional[Tuple[float, float, float]] = None
+        self.level = 0.0
+        self.trend = 0.0
+        self.season: Optional[np.ndarray] = None
+        self.fitted_day = 0
+        self.cached: Optional[Tuple[int, dict]] = None
+
+    @property
+    def first_day(self) -> int:
+        """Day number of the oldest day in the history."""
+        return self.day - len(self.history)
+
+    @property
+    def period(self) -> int:
+        return SEASON_DAYS if len(self.history) >= 2 * SEASON_DAYS else 1
+
+    def observe(self, total: int, day: int) -> None:
+        if day > self.day:
+            gap = day - self.day
+            if self.day_start_total is None:
+                self.day += 1
+            else:
+                self._close_day(self.last_total - self.day_start_total)
+            # Spread downloads over days without data evenly
+            share = (total - self.last_total) / gap
+            for _ in range(gap - 1):
+                self._close_day(share)
+            self.day_start_total = self.last_total + share * (gap - 1)
+        if day >= self.day:
+            self.last_total = total
+
+    def _close_day(self, downloads: float) -> None:
+        phase = self.day % len(self.season) if self.season is not None else 0
+        self.history.append(max(downloads, 0.0))
+        self.day += 1
+        self.cached = None
+        if self.params is None:
+            return
+        # Advance the fitted state by one day with the cached parameters
+        alpha, beta, gamma = self.params
+        seasonal = self.season[phase]
+        level = alpha * (downloads - seasonal) + (1 - alpha) * (self.level + self.trend)
+        self.trend = beta * (level - self.level) + (1 - beta) * self.trend
+        self.season[phase] = gamma * (downloads - level) + (1 - gamma) * seasonal
+        self.level = level
+
+    def needs_fit(self) -> bool:
+        return (
+            self.params is None
+            or self.day - self.fitted_day >= REFIT_DAYS
+            or self.period != len(self.season)
+        )
+
+    def forecast(self, days: int) -> List[float]:
+        steps = np.arange(1, days + 1)
+        phases = (self.day + steps - 1) % len(self.season)
+        values = self.level + steps * self.trend + self.season[phases]
+        return np.maximum(values, 0.0).round().tolist()
+
+
+class Forecaster:
+    """Holt-Winters download forecasts for every snap/channel series."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[Key, SeriesModel] = {}
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def get_state(self) -> dict:
+        """Return the models, to persist across restarts."""
+        with self._lock:
+            return {"models": dict(self._models)}
+
+    def set_state(self, state: dict) -> None:
+        """Replace the models with a saved ``get_state``."""
+        with self._lock:
+            self._models = state["models"]
+
+    def observe(
+        self, snap_name: str, channel: str, download_total: int, timestamp: float
+    ) -> None:
+        """Add an ingested download total to its series."""
+        day = int(timestamp // SECONDS_PER_DAY)
+        with self._lock:
+            model = self._models.get((snap_name, channel))
+            if model is None:
+                self._models[(snap_name, channel)] = SeriesModel(day, download_total)
+            else:
+                model.observe(download_total, day)
+
+    def forecast(self, snap_name: str, channel: str, days: int) -> Optional[dict]:
+        """Return the forecast for one series, or None without enough
+        history."""
+        return self.forecast_many([(snap_name, channel)], days)[0]
+
+    def forecast_many(self, keys: Iterable[Key], days: int) -> List[Optional[dict]]:
+        """Return forecasts for many series, fitting stale models together."""
+        keys = list(keys)
+        with self._lock:
+            models = [self._models.get(key) for key in keys]
+            ready = {
+                m
+                for m in models
+                if m is not None and len(m.history) >= MIN_HISTORY_DAYS
+            }
+            self._fit([m for m in ready if m.needs_fit()])
+            return [
+                self._result(key, model, days) if model in ready else None
+                for key, model in zip(keys, models)
+            ]
+
+    @staticmethod
+    def _fit(models: List[SeriesModel]) -> None:
+        # Series with the same history length and period share one fit
+        groups: Dict[Tuple[int, int, int], List[SeriesModel]] = {}
+        for model in models:
+            key = (len(model.history), model.first_day, model.period)
+            groups.setdefault(key, []).append(model)
+        for (_, first_day, period), group in groups.items():
+            history = np.array([list(m.history) for m in group], dtype=float)
+            params, level, trend, season = fit_holt_winters(history, first_day, period)
+            for i, model in enumerate(group):
+                model.params = tuple(float(p) for p in params[i])
+                model.level = float(level[i])
+                model.trend = float(trend[i])
+                model.season = season[i].copy()
+                model.fitted_day = model.day
+                model.cached = None
+
+    @staticmethod
+    def _result(key: Key, model: SeriesModel, days: int) -> dict:
+        if model.cached is not None and model.cached[0] == days:
+            return model.cached[1]
+        downloads = model.forecast(days)
+        start = EPOCH + timedelta(days=model.day)
+        alpha, beta, gamma = model.params
+        result = {
+            "snap_name": key[0],
+            "channel": key[1],
+            "model": "holt-winters" if len(model.season) > 1 else "holt",
+            "parameters": {"alpha": alpha, "beta": beta, "gamma": gamma},
+            "forecast": [
+                {
+                    "date": (start + timedelta(days=i)).date().isoformat(),
+                    "downloads": value,
+                }
+                for i, value in enumerate(downloads)
+            ],
+            "projected_download_total": round(model.day_start_total + sum(downloads)),
+        }
+        model.cached = (days, result)
+        return result
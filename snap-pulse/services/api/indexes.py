@@ -0,0 +1,308 @@
+"""
+Secondary indexes for querying the snap catalogue.
+
+``SnapIndex`` numbers every stored record and keeps, by that record id:
+
+- an equality index (value -> ids) per filter field, and
+- a sorted index of ids per sortable field, ordered by ``(value,
+  snap_name, channel)``.
+
+Both are updated at ingest. The indexes hold small integers rather than
+key and sort tuples of their own; the sort order is read from the records
+when an index is searched. A query intersects the equality sets for its
+filters, then either sorts the (small) candidate set or walks the sorted
+index from the cursor, whichever touches fewer records.
+
+Download counts and ratings the Snap Store does not publish are None in
+records and sort as ``MISSING``, below every published value.
+
+Cursors are opaque strings that encode the last ``(value, snap_name,
+channel)`` returned, so pages stay stable while new data is ingested.
+"""
+
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from records import SnapRecord
+
+FILTER_FIELDS = ("publisher", "confinement", "grade", "channel")
+SORT_FIELDS = (
+    "download_total",
+    "download_last_30_days",
+    "rating",
+    "trending_score",
+    "last_updated",
+)
+
+MISSING = -1
+
+Key = Tuple[str, str]
+
+
+def sort_value(record: SnapRecord, field: str):
+    """Return the value ``record`` sorts by on ``field``."""
+    value = getattr(record, field)
+    return MISSING if value is None else value
+
+
+def encode_cursor(item: tuple) -> str:
+    """Encode a ``(value, snap_name, channel)`` item as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(item)).encode("utf-8")).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor, raising ``ValueError`` if it is malformed."""
+    try:
+        value, snap_name, channel = json.loads(base64.urlsafe_b64decode(cursor))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(value, (int, float)) or not (
+        isinstance(snap_name, str) and isinstance(channel, str)
+    ):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return value, snap_name, channel
+
+
+class SortedList:
+    """A sorted list split into bounded sublists.
+
+    Inserts and removals cost O(sqrt n) instead of the O(n) memmove of a
+    single flat list, which matters at millions of entries.
+
+    With ``key``, items are ordered by ``key(item)``, and the bounds passed
+    to ``iter_after`` are keys rather than items. The key of the last item
+    of each sublist is kept, so only the sublist searched calls ``key``.
+    """
+
+    LOAD = 1000
+
+    def __init__(
+        self, items: Iterable = (), key: Optional[Callable[[Any], Any]] = None
+    ):
+        self._key = key
+        items = sorted(items, key=key)
+        self._lists = [
+            items[i : i + self.LOAD] for i in range(0, len(items), self.LOAD)
+        ]
+        self._maxes = [self._order(sub[-1]) for sub in self._lists]
+        self._len = len(items)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _order(self, item):
+        return self._key(item) if self._key else item
+
+    def add(self, item) -> None:
+        order = self._order(item)
+        if not self._maxes:
+            self._lists.append([item])
+            self._maxes.append(order)
+        else:
+            pos = bisect_left(self._maxes, order)
+            if pos == len(self._maxes):
+                pos -= 1
+                self._lists[pos].append(item)
+                self._maxes[pos] = order
+            else:
+                sub = self._lists[pos]
+                sub.insert(bisect_left(sub, order, key=self._key), item)
+            sub = self._lists[pos]
+            if len(sub) > 2 * self.LOAD:
+                self._lists[pos : pos + 1] = [sub[: self.LOAD], sub[self.LOAD :]]
+                self._maxes[pos : pos + 1] = [
+                    self._order(sub[self.LOAD - 1]),
+                    self._maxes[pos],
+                ]
+        self._len += 1
+
+    def remove(self, item) -> None:
+        order = self._order(item)
+        pos = bisect_left(self._maxes, order)
+        sub = self._lists[pos] if pos < len(self._lists) else []
+        index = bisect_left(sub, order, key=self._key)
+        if index == len(sub) or sub[index] != item:
+            raise ValueError(f"{item!r} not in list")
+        del sub[index]
+        if not sub:
+            del self._lists[pos]
+            del self._maxes[pos]
+        elif index == len(sub):
+            self._maxes[pos] = self._order(sub[-1])
+        self._len -= 1
+
+    def iter_after(self, bound=None, reverse: bool = False) -> Iterator:
+        """Yield items after ``bound`` in ascending, or before it in
+        descending order; from the start when ``bound`` is None."""
+        if not reverse:
+            pos = 0 if bound is None else bisect_right(self._maxes, bound)
+            if pos < len(self._lists):
+                sub = self._lists[pos]
+                start = 0 if bound is None else bisect_right(sub, bound, key=self._key)
+                yield from sub[start:]
+                for sub in self._lists[pos + 1 :]:
+                    yield from sub
+        else:
+            pos = len(self._lists) - 1
+            if bound is not None:
+                pos = min(bisect_left(self._maxes, bound), pos)
+            if pos >= 0:
+                sub = self._lists[pos]
+                end = (
+                    len(sub)
+                    if bound is None
+                    else bisect_left(sub, bound, key=self._key)
+                )
+                yield from reversed(sub[:end])
+                for sub in reversed(self._lists[:pos]):
+                    yield from reversed(sub)
+
+
+def _item_key(rows: List[SnapRecord], field: str) -> Callable[[int], tuple]:
+    """Return a function giving the ``(value, snap_name, channel)`` a record
+    id sorts by on ``field``."""
+
+    value_of = attrgetter(field)
+
+    # Called for every comparison while searching an index, so sort_value
+    # is inlined
+    def key(record_id: int) -> tuple:
+        record = rows[record_id]
+        value = value_of(record)
+        return MISSING if value is None else value, record.snap_name, record.channel
+
+    return key
+
+
+class SnapIndex:
+    """Equality and sorted indexes over the records of a store."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[Key, int] = {}
+        # Records by id; an id is reused when its key is put again
+        self._rows: List[SnapRecord] = []
+        self._values: Dict[str, Dict[str, Set[int]]] = {f: {} for f in FILTER_FIELDS}
+        self._keys = {field: _item_key(self._rows, field) for field in SORT_FIELDS}
+        self._sorted: Dict[str, SortedList] = {
+            field: SortedList(key=self._keys[field]) for field in SORT_FIELDS
+        }
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def build(self, records: Iterable[SnapRecord]) -> None:
+        """Replace the indexes with ones built from ``records`` in bulk."""
+        current = {(r.snap_name, r.channel): r for r in records}
+        ids = {key: record_id for record_id, key in enumerate(current)}
+        rows = list(current.values())
+        values: Dict[str, Dict[str, Set[int]]] = {f: {} for f in FILTER_FIELDS}
+        for record_id in ids.values():
+            record = rows[record_id]
+            for field in FILTER_FIELDS:
+                values[field].setdefault(getattr(record, field), set()).add(record_id)
+        keys = {field: _item_key(rows, field) for field in SORT_FIELDS}
+        sorted_lists = {
+            field: SortedList(ids.values(), key=keys[field]) for field in SORT_FIELDS
+        }
+        with self._lock:
+            self._ids = ids
+            self._rows = rows
+            self._values = values
+            self._keys = keys
+            self._sorted = sorted_lists
+
+    def update(self, record: SnapRecord) -> None:
+        """Index ``record``, replacing the previous record for its key."""
+        key = (record.snap_name, record.channel)
+        with self._lock:
+            record_id = self._ids.get(key)
+            if record_id is None:
+                record_id = self._ids[key] = len(self._rows)
+                self._rows.append(record)
+            else:
+                # Unindexed while its row still holds the previous record,
+                # which the sorted indexes are ordered by
+                self._unindex(record_id)
+                self._rows[record_id] = record
+            for field in FILTER_FIELDS:
+                self._values[field].setdefault(getattr(record, field), set()).add(
+                    record_id
+                )
+            for field in SORT_FIELDS:
+                self._sorted[field].add(record_id)
+
+    def _unindex(self, record_id: int) -> None:
+        record = self._rows[record_id]
+        for field in FILTER_FIELDS:
+            value = getattr(record, field)
+            ids = self._values[field][value]
+            ids.discard(record_id)
+            if not ids:
+                del self._values[field][value]
+        for field in SORT_FIELDS:
+            self._sorted[field].remove(record_id)
+
+    def query(
+        self,
+        filters: Dict[str, str],
+        sort: str = "download_total",
+        descending: bool = True,
+        limit: int = 20,
+        after: Optional[tuple] = None,
+    ) -> Tuple[List[SnapRecord], Optional[tuple]]:
+        """Return up to ``limit`` records and the cursor item of the last one.
+
+        The cursor item is None when there are no further pages.
+        """
+        with self._lock:
+            candidates = self._candidates(filters)
+            if candidates is not None and len(candidates) * 8 < len(self._ids):
+                ids = self._page_from_candidates(
+                    candidates, sort, descending, limit + 1, after
+                )
+            else:
+                ids = []
+                for record_id in self._sorted[sort].iter_after(
+                    after, reverse=descending
+                ):
+                    if candidates is None or record_id in candidates:
+                        ids.append(record_id)
+                        if len(ids) > limit:
+                            break
+            records = [self._rows[record_id] for record_id in ids[:limit]]
+            next_item = self._keys[sort](ids[limit - 1]) if len(ids) > limit else None
+        return records, next_item
+
+    def _candidates(self, filters: Dict[str, str]) -> Optional[Set[int]]:
+        sets = []
+        for field, value in filters.items():
+            if value is None:
+                continue
+            sets.append(self._values[field].get(value, set()))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        if len(sets) == 1:
+            return sets[0]
+        return sets[0].intersection(*sets[1:])
+
+    def _page_from_candidates(
+        self,
+        candidates: Set[int],
+        sort: str,
+        descending: bool,
+        count: int,
+        after: Optional[tuple],
+    ) -> List[int]:
+        key = self._keys[sort]
+        ids = sorted(candidates, key=key)
+        if descending:
+            end = len(ids) if after is None else bisect_left(ids, after, key=key)
+            return ids[max(0, end - count) : end][::-1]
+        start = 0 if after is None else bisect_right(ids, after, key=key)
+        return ids[start : start + count]
@@ -1,56 +1,264 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from datetime import datetime
 from typing import Dict, List, Optional
+import asyncio
 import json
-import uvicorn
+import logging
 import os
-import httpx
+import time
+import numpy as np
+
+from admission import AdmissionController, AdmissionMiddleware
+from anomalies import AnomalyDetector
+from compare import RANK_FIELDS, SERIES_AGGREGATES, Catalogue, rank_table, series_lists
+from encoding import FastJSONResponse, RawJSONResponse, dumps, record_payload
+from export import COMPRESSIONS, FORMATS, export_chunks, filename, media_type
+from feed import IngestFeed
+from forecasting import Forecaster
+from indexes import SORT_FIELDS, decode_cursor, encode_cursor
+from models import CompareRequest, ForecastRequest, IngestData, SnapData
+from persistence import (
+    LIFECYCLE_FILE,
+    STATE_FILE,
+    read_lifecycle,
+    read_settings,
+    read_state,
+    write_lifecycle,
+    write_state,
+)
+from releases import ReleaseHistory
+from rollups import METRICS, RollupEngine
+from search import SearchIndex
+from store import SnapStore, create_store
+from summary import REFRESH_INGESTS, REFRESH_SEC, Summary
+
+logger = logging.getLogger(__name__)
+
+# Environment written by the charm, read by each worker as it starts, so
+# workers replaced one at a time pick up changed settings
+SETTINGS_FILE = os.getenv("SETTINGS_FILE")
+if SETTINGS_FILE:
+    os.environ.update(read_settings(SETTINGS_FILE))
+
+SNAPSHOT_SEC = int(os.getenv("SNAPSHOT_SEC", "300"))  # 5 minutes default
+# Directory for the streaming models and lifecycle timings; defaults to the
+# directory of the snapshots or of the SQLite store
+STATE_DIR = os.getenv("STATE_DIR")
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
+MAX_PAGE_SIZE = 100
+MAX_FORECAST_DAYS = 365
+MAX_HISTORY_POINTS = 10000
+MAX_COMPARE_SNAPS = 500
+MAX_INGEST_BATCH = 500
+# Seconds between checks whether the summary is due for a rebuild
+SUMMARY_TICK = 1.0
+# Seconds between applying the ingests other workers accepted
+FEED_TICK = 1.0
+
+# Shared store, sharded by snap name (see store.py)
+snap_store: SnapStore = create_store()
+
+# Full-text index over snap metadata, fed by /ingest (see search.py)
+search_index = SearchIndex()
+
+# Streaming outlier detection on each snap/channel series (see anomalies.py)
+anomaly_detector = AnomalyDetector()
+
+# Holt-Winters download forecasts per series (see forecasting.py)
+forecaster = Forecaster()
+
+# Hourly, daily and weekly history per series (see rollups.py)
+rollups = RollupEngine()
+
+# Revisions and channel releases from the channel map (see releases.py)
+releases = ReleaseHistory()
+
+# Sorted catalogue values for percentile ranks (see compare.py)
+catalogue = Catalogue()
+
+# Landing page summary, rebuilt in the background (see summary.py)
+summary = Summary(
+    refresh_sec=float(os.getenv("SUMMARY_SEC", str(REFRESH_SEC))),
+    refresh_ingests=int(os.getenv("SUMMARY_INGESTS", str(REFRESH_INGESTS))),
+)
+
+# Models fed at ingest, persisted across restarts whatever the store backend
+STREAMING_MODELS = {
+    "search": search_index,
+    "anomalies": anomaly_detector,
+    "forecasts": forecaster,
+    "rollups": rollups,
+    "releases": releases,
+}
+
+# Recovery and last shutdown timings, reported by /metrics
+lifecycle: Dict[str, object] = {}
+
+# Ingests of every worker sharing the store, applied to the models above in
+# order; None while the store belongs to this process alone (see feed.py)
+ingest_feed: Optional[IngestFeed] = None
+
+
+async def read_store(method, *args):
+    """Call a store read, in a worker thread when the backend blocks on the
+    network (see ``SnapStore.blocking``)."""
+    if snap_store.blocking:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+async def snapshot_loop(stopping: asyncio.Event):
+    """Periodically snapshot the store so the write-ahead log stays short."""
+    while True:
+        try:
+            await asyncio.wait_for(stopping.wait(), SNAPSHOT_SEC)
+            # Shutting down; a snapshot in progress has already finished
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await asyncio.to_thread(snap_store.checkpoint)
+        except Exception as e:
+            logger.error(f"Snapshot failed: {e}")
+
+
+async def summary_loop(stopping: asyncio.Event):
+    """Rebuild the summary whenever it is due."""
+    while True:
+        if summary.due():
+            try:
+                await asyncio.to_thread(summary.refresh, snap_store.records())
+            except Exception as e:
+                logger.error(f"Summary failed: {e}")
+        try:
+            await asyncio.wait_for(stopping.wait(), SUMMARY_TICK)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+
+async def feed_loop(stopping: asyncio.Event):
+    """Apply the ingests other workers accepted, so the models stay current
+    between the requests that read them."""
+    while True:
+        sync_models()
+        try:
+            await asyncio.wait_for(stopping.wait(), FEED_TICK)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+
+def state_directory() -> Optional[str]:
+    """Return where the streaming models and lifecycle timings are kept,
+    or None to keep them only in memory."""
+    if STATE_DIR:
+        return STATE_DIR
+    journal = getattr(snap_store, "journal", None)
+    if journal is not None:
+        return journal.directory
+    return getattr(snap_store, "directory", None)
+
+
+def restore_models(directory: str) -> None:
+    """Load the streaming models saved by the previous shutdown."""
+    state = read_state(os.path.join(directory, STATE_FILE))
+    if state is None:
+        return
+    for name, model in STREAMING_MODELS.items():
+        if name in state:
+            model.set_state(state[name])
+    if ingest_feed is not None:
+        ingest_feed.seq = state.get("feed", 0)
+    logger.info(f"Restored streaming models from {directory}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ingest_feed
+    journal = getattr(snap_store, "journal", None)
+    directory = state_directory()
+    stopping = asyncio.Event()
+    snapshot_task = None
+    feed_task = None
+    await snap_store.start()
+    started = time.monotonic()
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        if snap_store.shared:
+            ingest_feed = IngestFeed(directory)
+        restore_models(directory)
+        lifecycle.update(read_lifecycle(os.path.join(directory, LIFECYCLE_FILE)))
+    if ingest_feed is not None:
+        # Catch up on what the workers ingested since the saved models
+        sync_models()
+        feed_task = asyncio.create_task(feed_loop(stopping))
+    if journal is not None:
+        journal.recover(snap_store)
+        lifecycle["recovery_sec"] = round(time.monotonic() - started, 3)
+        # Index recovered records off the event loop; until then queries scan
+        index_task = asyncio.create_task(asyncio.to_thread(snap_store.ensure_index))
+        snapshot_task = asyncio.create_task(snapshot_loop(stopping))
+    summary_task = asyncio.create_task(summary_loop(stopping))
+    yield
+    # uvicorn has stopped accepting connections and drained the requests in
+    # flight, so nothing writes to the store or the models from here on
+    started = time.monotonic()
+    stopping.set()
+    await summary_task
+    if feed_task is not None:
+        await feed_task
+    if snapshot_task is not None:
+        await index_task
+        await snapshot_task
+        snap_store.checkpoint()
+    if directory is not None:
+        state = {name: model.get_state() for name, model in STREAMING_MODELS.items()}
+        if ingest_feed is not None:
+            state["feed"] = ingest_feed.seq
+        write_state(os.path.join(directory, STATE_FILE), state)
+    if ingest_feed is not None:
+        ingest_feed.trim(ingest_feed.seq)
+        ingest_feed.close()
+        ingest_feed = None
+    await snap_store.stop()
+    snap_store.close()
+    elapsed = round(time.monotonic() - started, 3)
+    logger.info(f"Shutdown completed in {elapsed} seconds")
+    if directory is not None:
+        write_lifecycle(
+            os.path.join(directory, LIFECYCLE_FILE),
+            {
+                "last_shutdown_sec": elapsed,
+                "last_shutdown_at": datetime.utcnow().isoformat(),
+            },
+        )
+
+
+app = FastAPI(
+    title="SnapPulse API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
-app = FastAPI(title="SnapPulse API", version="1.0.0")
+# Per-client rate limits and load shedding (see admission.py)
+admission = AdmissionController()
+app.add_middleware(AdmissionMiddleware, controller=admission)
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
+    allow_origins=CORS_ORIGINS,  # Set CORS_ORIGINS in production
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 
-# Data models
-class SnapData(BaseModel):
-    snap_name: str
-    channel: str
-    download_total: int
-    download_last_30_days: int
-    rating: float
-    version: str
-    last_updated: datetime
-    confinement: str
-    grade: str
-    publisher: str
-    trending_score: float
-
-
-class IngestData(BaseModel):
-    snap_name: str
-    channel: str
-    download_total: int
-    download_last_30_days: int
-    rating: float
-    version: str
-    confinement: str
-    grade: str
-    publisher: str
-
-
-# In-memory storage for demo (replace with OpenSearch in production)
-snap_data_store: Dict[str, Dict[str, SnapData]] = {}
-
-
 @app.get("/")
 async def root():
     return {"message": "SnapPulse API", "version": "1.0.0"}
@@ -61,26 +269,20 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Admission control counters and lifecycle timings."""
+    return {"admission": admission.metrics(), "lifecycle": lifecycle}
+
+
 @app.get("/stats/{snap_name}/{channel}")
 async def get_snap_stats(snap_name: str, channel: str = "stable"):
     """Get statistics for a specific snap and channel."""
     try:
-        # Check if we have real data
-        if snap_name in snap_data_store and channel in snap_data_store[snap_name]:
-            data = snap_data_store[snap_name][channel]
-            return {
-                "snap_name": data.snap_name,
-                "channel": data.channel,
-                "download_total": data.download_total,
-                "download_last_30_days": data.download_last_30_days,
-                "rating": data.rating,
-                "version": data.version,
-                "last_updated": data.last_updated.isoformat(),
-                "confinement": data.confinement,
-                "grade": data.grade,
-                "publisher": data.publisher,
-                "trending_score": data.trending_score,
-            }
+        # Check if we have real data, serialized at ingest time
+        payload = await read_store(snap_store.get_payload, snap_name, channel)
+        if payload is not None:
+            return RawJSONResponse(payload)
 
         # No real data available yet
         raise HTTPException(status_code=404, detail="No data yet – wait for collector")
@@ -93,39 +295,378 @@ async def get_snap_stats(snap_name: str, channel: str = "stable"):
 @app.get("/stats/{snap_name}")
 async def get_snap_all_channels(snap_name: str):
     """Get statistics for a snap across all channels."""
-    channels = ["stable", "candidate", "beta", "edge"]
-    results = {}
-
-    for channel in channels:
-        # Mock data for each channel
-        results[channel] = {
-            "download_total": 150000 - (channels.index(channel) * 20000),
-            "version": f"1.{channels.index(channel)}.0",
-            "last_updated": (
-                datetime.utcnow() - timedelta(days=channels.index(channel))
-            ).isoformat(),
-        }
+    summary = await read_store(snap_store.snap_summary, snap_name)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No data yet – wait for collector")
+    return summary
+
+
+@app.get("/snaps")
+async def query_snaps(
+    publisher: Optional[str] = None,
+    confinement: Optional[str] = None,
+    grade: Optional[str] = None,
+    channel: Optional[str] = None,
+    sort: str = "download_total",
+    order: str = "desc",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+):
+    """Query snaps by publisher, confinement, grade and channel.
+
+    Results are sorted on a numeric field and paginated with the opaque
+    ``next_cursor`` of the previous page.
+    """
+    if sort not in SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot sort on {sort}; use one of {', '.join(SORT_FIELDS)}",
+        )
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+        )
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filters = {
+        "publisher": publisher,
+        "confinement": confinement,
+        "grade": grade,
+        "channel": channel,
+    }
+    records, next_item = await read_store(
+        snap_store.query, filters, sort, order == "desc", limit, after
+    )
+    next_cursor = encode_cursor(next_item) if next_item is not None else None
+    # Stitch the stored payloads together instead of re-encoding each record
+    return RawJSONResponse(
+        b'{"snaps":['
+        + b",".join(record_payload(record) for record in records)
+        + b'],"next_cursor":'
+        + dumps(next_cursor)
+        + b"}"
+    )
+
+
+@app.get("/export")
+async def export_snaps(
+    format: str = "ndjson",
+    compression: str = "gzip",
+    publisher: Optional[str] = None,
+    confinement: Optional[str] = None,
+    grade: Optional[str] = None,
+    channel: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """Stream every stored record, or those matching the filters.
+
+    The export reflects the store when streaming starts. To resume an
+    interrupted download, pass ``after=<snap_name>/<channel>`` of the last
+    record received.
+    """
+    if format not in FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of {', '.join(FORMATS)}"
+        )
+    if compression not in COMPRESSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"compression must be one of {', '.join(COMPRESSIONS)}",
+        )
+    resume = None
+    if after is not None:
+        snap_name, _, after_channel = after.partition("/")
+        if not snap_name or not after_channel:
+            raise HTTPException(
+                status_code=400, detail="after must be <snap_name>/<channel>"
+            )
+        resume = (snap_name, after_channel)
+
+    filters = {
+        "publisher": publisher,
+        "confinement": confinement,
+        "grade": grade,
+        "channel": channel,
+    }
+    try:
+        chunks = export_chunks(snap_store.export(filters, resume), format, compression)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=media_type(format, compression),
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{filename(format, compression)}"'
+            )
+        },
+    )
+
+
+@app.get("/search")
+async def search_snaps(q: str, limit: int = 10):
+    """Search snap names and metadata, with prefix and typo tolerance."""
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+        )
+    sync_models()
+    results = search_index.search(q, limit)
+    return {
+        "query": q,
+        "results": [
+            {"snap_name": snap_name, "score": score, **fields}
+            for snap_name, score, fields in results
+        ],
+    }
+
+
+@app.get("/anomalies")
+async def get_anomalies(cursor: int = 0, limit: int = 100):
+    """Tail anomalies in download rates and ratings.
+
+    Pass the ``next_cursor`` of the previous response to receive only newer
+    events.
+    """
+    if cursor < 0:
+        raise HTTPException(status_code=400, detail="cursor must not be negative")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+        )
+    sync_models()
+    events, next_cursor = anomaly_detector.events_after(cursor, limit)
+    return {"anomalies": events, "next_cursor": next_cursor}
+
+
+@app.get("/history/{snap_name}/{channel}")
+async def get_history(
+    snap_name: str,
+    channel: str = "stable",
+    metric: str = "downloads",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    step: int = 3600,
+):
+    """Aggregate a metric of a snap channel over time.
+
+    Each point covers ``step`` seconds between ``start`` and ``end``
+    (default: the last 7 days), served from the coarsest rollup that fits.
+    """
+    if metric not in METRICS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metric {metric}; use one of {', '.join(METRICS)}",
+        )
+    end_ts = end.timestamp() if end else datetime.now().timestamp()
+    start_ts = start.timestamp() if start else end_ts - 7 * 86400
+    if step <= 0 or start_ts >= end_ts:
+        raise HTTPException(
+            status_code=400, detail="step must be positive and start before end"
+        )
+    if (end_ts - start_ts) / step > MAX_HISTORY_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_HISTORY_POINTS} points; use a larger step",
+        )
+    sync_models()
+    try:
+        # The level serving the step must still hold the start of the range
+        rollups.resolution_for(step, start_ts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = rollups.query(snap_name, channel, metric, start_ts, end_ts, step)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No data yet – wait for collector")
+    resolution, points = result
+    for point in points:
+        point["start"] = datetime.fromtimestamp(point["start"]).isoformat()
+    return {
+        "snap_name": snap_name,
+        "channel": channel,
+        "metric": metric,
+        "step": step,
+        "resolution": resolution,
+        "points": points,
+    }
+
 
+@app.get("/releases/{snap_name}/sizes")
+async def get_size_growth(snap_name: str, architecture: str = "amd64"):
+    """Download size of every revision of a snap architecture, with the
+    change from the previous revision."""
+    sync_models()
+    result = releases.size_growth(snap_name, architecture)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No releases seen yet")
+    return {"snap_name": snap_name, "architecture": architecture, **result}
+
+
+@app.get("/releases/{snap_name}/cadence")
+async def get_release_cadence(
+    snap_name: str, channel: str = "latest/stable", architecture: str = "amd64"
+):
+    """Number of releases to a channel and the days between them."""
+    sync_models()
+    result = releases.cadence(snap_name, channel, architecture)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No releases seen yet")
+    for field in ("first_release", "last_release"):
+        result[field] = datetime.fromtimestamp(result[field]).isoformat()
     return {
         "snap_name": snap_name,
-        "channels": results,
-        "total_downloads": sum(ch["download_total"] for ch in results.values()),
+        "channel": channel,
+        "architecture": architecture,
+        **result,
+    }
+
+
+@app.post("/compare")
+async def compare_snaps(request: CompareRequest):
+    """Compare many snaps on one channel.
+
+    Returns their series for each requested metric aligned on shared
+    windows, and a rank table with catalogue-wide percentiles for each
+    current value metric.
+    """
+    unknown = set(request.metrics) - set(SERIES_AGGREGATES) - set(RANK_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown metrics: {', '.join(sorted(unknown))}"
+        )
+    if not 1 <= len(request.snaps) <= MAX_COMPARE_SNAPS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Compare between 1 and {MAX_COMPARE_SNAPS} snaps",
+        )
+    end_ts = request.end.timestamp() if request.end else datetime.now().timestamp()
+    start_ts = request.start.timestamp() if request.start else end_ts - 30 * 86400
+    if request.step <= 0 or start_ts >= end_ts:
+        raise HTTPException(
+            status_code=400, detail="step must be positive and start before end"
+        )
+    if (end_ts - start_ts) / request.step > MAX_HISTORY_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_HISTORY_POINTS} points; use a larger step",
+        )
+    sync_models()
+    if set(request.metrics) & set(SERIES_AGGREGATES):
+        try:
+            rollups.resolution_for(request.step, start_ts)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    names = list(dict.fromkeys(request.snaps))
+    keys = [(name, request.channel) for name in names]
+    timestamps = None
+    series = {}
+    for metric in request.metrics:
+        if metric in SERIES_AGGREGATES:
+            timestamps, aggregates = rollups.aggregate(
+                keys, metric, start_ts, end_ts, request.step
+            )
+            series[metric] = series_lists(aggregates[SERIES_AGGREGATES[metric]], names)
+
+    if catalogue.stale():
+        await asyncio.to_thread(catalogue.refresh, snap_store.records())
+    records = await read_store(
+        snap_store.get_records, [(name, request.channel) for name in names]
+    )
+    found = [i for i, record in enumerate(records) if record is not None]
+    ranks = {}
+    for metric in request.metrics:
+        if metric in RANK_FIELDS:
+            # Snaps without a published value for the metric are not ranked
+            ranked = [i for i in found if getattr(records[i], metric) is not None]
+            values = np.array(
+                [getattr(records[i], metric) for i in ranked], dtype=float
+            )
+            percentiles = catalogue.percentiles(request.channel, metric, values)
+            ranks[metric] = rank_table([names[i] for i in ranked], values, percentiles)
+
+    return {
+        "channel": request.channel,
+        "step": request.step,
+        "timestamps": [
+            datetime.fromtimestamp(t).isoformat()
+            for t in ([] if timestamps is None else timestamps)
+        ],
+        "series": series,
+        "ranks": ranks,
+        "missing": [name for name, record in zip(names, records) if record is None],
+    }
+
+
+def check_forecast_days(days: int):
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"days must be between 1 and {MAX_FORECAST_DAYS}",
+        )
+
+
+@app.get("/forecast/{snap_name}/{channel}")
+async def get_forecast(snap_name: str, channel: str = "stable", days: int = 30):
+    """Forecast daily downloads of a snap channel for the next ``days``."""
+    check_forecast_days(days)
+    sync_models()
+    forecast = forecaster.forecast(snap_name, channel, days)
+    if forecast is None:
+        raise HTTPException(
+            status_code=404, detail="Not enough download history to forecast"
+        )
+    return forecast
+
+
+@app.post("/forecast")
+async def get_forecasts(request: ForecastRequest):
+    """Forecast many snap channels in one call.
+
+    Series without enough history are listed under ``missing``.
+    """
+    check_forecast_days(request.days)
+    if len(request.series) > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_PAGE_SIZE} series per request"
+        )
+    keys = [(key.snap_name, key.channel) for key in request.series]
+    sync_models()
+    forecasts = forecaster.forecast_many(keys, request.days)
+    return {
+        "forecasts": [f for f in forecasts if f is not None],
+        "missing": [
+            {"snap_name": key[0], "channel": key[1]}
+            for key, forecast in zip(keys, forecasts)
+            if forecast is None
+        ],
     }
 
 
 @app.get("/trending")
 async def get_trending_snaps(limit: int = 10):
-    """Get trending snaps."""
-    # Mock trending data
-    trending_snaps = [
-        {"name": "firefox", "downloads_growth": 15.2, "rating": 4.3},
-        {"name": "discord", "downloads_growth": 12.8, "rating": 4.1},
-        {"name": "code", "downloads_growth": 10.5, "rating": 4.5},
-        {"name": "slack", "downloads_growth": 8.3, "rating": 4.0},
-        {"name": "spotify", "downloads_growth": 7.9, "rating": 4.2},
-    ]
+    """Get the snaps with the highest trending score."""
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+        )
+    return {"trending": await read_store(snap_store.trending, limit)}
 
-    return {"trending": trending_snaps[:limit]}
+
+@app.get("/summary")
+async def get_summary():
+    """Totals, top movers, channel mix and recent updates of the
+    catalogue, as of the last background build."""
+    if summary.payload is None:
+        # Not built yet, e.g. before the first tick of the background task
+        await asyncio.to_thread(summary.refresh, snap_store.records())
+    return RawJSONResponse(summary.payload)
 
 
 @app.post("/webhook/github")
@@ -134,6 +675,8 @@ async def github_webhook_handler(payload: dict):
     try:
         # Forward to copilot service
         copilot_url = os.environ.get("COPILOT_ENDPOINT", "http://localhost:8001")
+        # Imported here: only this route talks to another service
+        import httpx
 
         async with httpx.AsyncClient() as client:
             response = await client.post(f"{copilot_url}/github-webhook", json=payload)
@@ -144,41 +687,136 @@ async def github_webhook_handler(payload: dict):
         )
 
 
+def store_record(data: IngestData) -> float:
+    """Store one collected record and return its ingest timestamp."""
+    snap_data = SnapData(
+        snap_name=data.snap_name,
+        channel=data.channel,
+        download_total=data.download_total,
+        download_last_30_days=data.download_last_30_days,
+        rating=data.rating,
+        version=data.version,
+        last_updated=datetime.now(),
+        confinement=data.confinement,
+        grade=data.grade,
+        publisher=data.publisher,
+        trending_score=calculate_trending_score(data),
+    )
+    snap_store.put(snap_data)
+    return snap_data.last_updated.timestamp()
+
+
+def observe_record(data: IngestData, timestamp: float) -> None:
+    """Feed one ingested record to the search index and streaming models."""
+    # Series the Snap Store does not publish are not modelled, rather than
+    # fed zeros
+    if data.download_total is not None and data.rating is not None:
+        anomaly_detector.observe(
+            data.snap_name, data.channel, data.download_total, data.rating, timestamp
+        )
+        rollups.observe(
+            data.snap_name, data.channel, data.download_total, data.rating, timestamp
+        )
+    if data.download_total is not None:
+        forecaster.observe(data.snap_name, data.channel, data.download_total, timestamp)
+    if data.channel_map:
+        releases.observe(
+            data.snap_name,
+            (
+                (
+                    row.channel,
+                    row.architecture,
+                    row.revision,
+                    row.version,
+                    row.size,
+                    row.released_at.timestamp() if row.released_at else None,
+                )
+                for row in data.channel_map
+            ),
+            timestamp,
+        )
+    search_index.add(
+        data.snap_name,
+        {
+            "title": data.title,
+            "summary": data.summary,
+            "description": data.description,
+            "categories": data.categories,
+            "publisher": data.publisher,
+        },
+    )
+    summary.ingested()
+
+
+def ingest_records(batch: List[IngestData]) -> None:
+    """Store collected records and feed them to the models, through the
+    ingest feed when other workers share the store."""
+    timestamps = [store_record(data) for data in batch]
+    if ingest_feed is None:
+        for data, timestamp in zip(batch, timestamps):
+            observe_record(data, timestamp)
+        return
+    ingest_feed.append(
+        [
+            (timestamp, data.model_dump_json())
+            for data, timestamp in zip(batch, timestamps)
+        ]
+    )
+    sync_models()
+
+
+def sync_models() -> None:
+    """Apply the ingests accepted by any worker since the last call."""
+    if ingest_feed is None:
+        return
+    while True:
+        rows = ingest_feed.after(ingest_feed.seq)
+        if not rows:
+            return
+        for seq, timestamp, data in rows:
+            try:
+                observe_record(IngestData.model_validate_json(data), timestamp)
+            except Exception as e:
+                # Retrying would stall the feed behind the same row
+                logger.error(f"Skipping ingest {seq} of the feed: {e}")
+            ingest_feed.seq = seq
+
+
 @app.post("/ingest")
 async def ingest_snap_data(data: IngestData):
     """Ingest snap data from collector"""
     try:
-        snap_data = SnapData(
-            snap_name=data.snap_name,
-            channel=data.channel,
-            download_total=data.download_total,
-            download_last_30_days=data.download_last_30_days,
-            rating=data.rating,
-            version=data.version,
-            last_updated=datetime.now(),
-            confinement=data.confinement,
-            grade=data.grade,
-            publisher=data.publisher,
-            trending_score=calculate_trending_score(data),
-        )
-
-        # Store data
-        if data.snap_name not in snap_data_store:
-            snap_data_store[data.snap_name] = {}
-        snap_data_store[data.snap_name][data.channel] = snap_data
-
+        ingest_records([data])
         return {"status": "success", "message": "Data ingested successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to ingest data: {str(e)}")
 
 
+@app.post("/ingest/batch")
+async def ingest_snap_batch(batch: List[IngestData]):
+    """Ingest a batch of records from the collector in one request"""
+    if len(batch) > MAX_INGEST_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_INGEST_BATCH} records per batch",
+        )
+    try:
+        ingest_records(batch)
+        return {"status": "success", "ingested": len(batch)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to ingest data: {str(e)}")
+
+
 def calculate_trending_score(data: IngestData) -> float:
     """Calculate trending score based on downloads and rating"""
-    # Simple algorithm: weight recent downloads more heavily
-    base_score = data.rating * 10
-    download_boost = min(data.download_last_30_days / 1000, 50)  # Cap at 50
+    # Simple algorithm: weight recent downloads more heavily. Figures the
+    # Snap Store does not publish add nothing
+    base_score = (data.rating or 0.0) * 10
+    download_boost = min((data.download_last_30_days or 0) / 1000, 50)  # Cap at 50
     return round(base_score + download_boost, 1)
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,71 @@
+"""Data models shared by the SnapPulse API and its storage backends."""
+
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class SnapData(BaseModel):
+    snap_name: str
+    channel: str
+    # None where the Snap Store does not publish the figure
+    download_total: Optional[int] = None
+    download_last_30_days: Optional[int] = None
+    rating: Optional[float] = None
+    version: str
+    last_updated: datetime
+    confinement: str
+    grade: str
+    publisher: str
+    trending_score: float
+
+
+class ChannelRelease(BaseModel):
+    """One (channel, architecture) row of the Snap Store channel map."""
+
+    channel: str
+    architecture: str
+    revision: int
+    version: str = ""
+    size: int = 0
+    released_at: Optional[datetime] = None
+
+
+class IngestData(BaseModel):
+    snap_name: str
+    channel: str
+    # Left out by the collector, which has no source for them yet
+    download_total: Optional[int] = None
+    download_last_30_days: Optional[int] = None
+    rating: Optional[float] = None
+    version: str
+    confinement: str
+    grade: str
+    publisher: str
+    # Searchable metadata, as gathered by the collector
+    title: str = ""
+    summary: str = ""
+    description: str = ""
+    categories: List[str] = []
+    # Channel map rows, stored only when a revision changes
+    channel_map: List[ChannelRelease] = []
+
+
+class SeriesKey(BaseModel):
+    snap_name: str
+    channel: str = "stable"
+
+
+class ForecastRequest(BaseModel):
+    series: List[SeriesKey]
+    days: int = 30
+
+
+class CompareRequest(BaseModel):
+    snaps: List[str]
+    channel: str = "stable"
+    metrics: List[str] = ["downloads", "download_total", "rating"]
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    step: int = 86400
@@ -0,0 +1,256 @@
+"""
+In-process stand-in for a single-node OpenSearch cluster.
+
+``MockOpenSearch`` answers the part of the REST API ``OpenSearchStore``
+uses: index creation and settings, ``_refresh``, ``_bulk``, ``_doc`` gets,
+``_mget``, ``_count``, and ``_search`` with term filters, sorting, ``search_after``
+(honouring ``missing`` on sort fields), points in time and ``terms``, ``sum``, ``avg`` and ``max`` aggregations.
+Like the real thing, gets by id see every indexed document while searches
+only see those indexed before the last refresh; an index whose
+``refresh_interval`` is not ``-1`` is refreshed after every ``_bulk``.
+
+Use it through httpx:
+
+    store = OpenSearchStore(
+        "http://opensearch", transport=httpx.MockTransport(MockOpenSearch())
+    )
+
+Tests and scripts/bench_store_opensearch.py run against it when no cluster
+is available.
+"""
+
+import itertools
+import json
+import threading
+from functools import cmp_to_key
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+
+import httpx
+
+
+class MockIndex:
+    def __init__(self, settings: dict):
+        self.refresh_interval = settings.get("refresh_interval", "1s")
+        self.documents: Dict[str, dict] = {}
+        # Documents as of the last refresh
+        self.searchable: Dict[str, dict] = {}
+
+    def refresh(self) -> None:
+        self.searchable = dict(self.documents)
+
+
+class MockOpenSearch:
+    """Request handler for ``httpx.MockTransport``."""
+
+    def __init__(self):
+        self.indices: Dict[str, MockIndex] = {}
+        self.pits: Dict[str, List[dict]] = {}
+        # Requests served, by endpoint, e.g. counts["_bulk"]
+        self.counts: Dict[str, int] = {}
+        # Every refresh_interval set through _settings, in order
+        self.refresh_intervals: List[str] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.raw_path.decode("ascii").partition("?")[0]
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        body = request.content
+        with self._lock:
+            endpoint = next((p for p in parts if p.startswith("_")), "index")
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            return self._route(request, parts, body)
+
+    def _route(
+        self, request: httpx.Request, parts: List[str], body: bytes
+    ) -> httpx.Response:
+        method = request.method
+        if parts == ["_search"]:
+            query = json.loads(body)
+            return self._search(self.pits[query["pit"]["id"]], query)
+        if parts == ["_search", "point_in_time"] and method == "DELETE":
+            for pit_id in json.loads(body)["pit_id"]:
+                self.pits.pop(pit_id, None)
+            return httpx.Response(200, json={"pits": []})
+
+        name, rest = parts[0], parts[1:]
+        if not rest and method == "PUT":
+            if name in self.indices:
+                return error(400, "resource_already_exists_exception")
+            settings = json.loads(body).get("settings", {}).get("index", {})
+            self.indices[name] = MockIndex(settings)
+            return httpx.Response(200, json={"acknowledged": True, "index": name})
+        index = self.indices.get(name)
+        if index is None:
+            return error(404, "index_not_found_exception")
+
+        if rest == ["_settings"]:
+            interval = json.loads(body)["index"]["refresh_interval"]
+            index.refresh_interval = interval
+            self.refresh_intervals.append(interval)
+            return httpx.Response(200, json={"acknowledged": True})
+        if rest == ["_refresh"]:
+            index.refresh()
+            return httpx.Response(200, json={"_shards": {"failed": 0}})
+        if rest == ["_bulk"]:
+            return self._bulk(index, body)
+        if rest[:1] == ["_doc"]:
+            document = index.documents.get("/".join(rest[1:]))
+            if document is None:
+                return httpx.Response(404, json={"found": False})
+            return httpx.Response(200, json={"found": True, "_source": document})
+        if rest == ["_mget"]:
+            docs = []
+            for doc_id in json.loads(body)["ids"]:
+                document = index.documents.get(doc_id)
+                if document is None:
+                    docs.append({"_id": doc_id, "found": False})
+                else:
+                    fields = request.url.params.get("_source")
+                    source = select(document, fields.split(",") if fields else None)
+                    docs.append({"_id": doc_id, "found": True, "_source": source})
+            return httpx.Response(200, json={"docs": docs})
+        if rest == ["_count"]:
+            query = json.loads(body).get("query") if body else None
+            documents = index.searchable.values()
+            return httpx.Response(
+                200, json={"count": sum(1 for d in documents if matches(d, query))}
+            )
+        if rest == ["_search"]:
+            return self._search(list(index.searchable.values()), json.loads(body))
+        if rest == ["_search", "point_in_time"]:
+            pit_id = f"pit-{next(self._ids)}"
+            self.pits[pit_id] = list(index.searchable.values())
+            return httpx.Response(200, json={"pit_id": pit_id})
+        return error(400, f"unsupported request {method} {'/'.join(parts)}")
+
+    def _bulk(self, index: MockIndex, body: bytes) -> httpx.Response:
+        lines = body.decode("utf-8").splitlines()
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            doc_id = json.loads(action)["index"]["_id"]
+            index.documents[doc_id] = json.loads(source)
+            items.append({"index": {"_id": doc_id, "status": 201}})
+        if index.refresh_interval != "-1":
+            index.refresh()
+        return httpx.Response(200, json={"took": 1, "errors": False, "items": items})
+
+    def _search(self, documents: List[dict], query: dict) -> httpx.Response:
+        hits = [d for d in documents if matches(d, query.get("query"))]
+        sort = [next(iter(s.items())) for s in query.get("sort", [])]
+        sort = [
+            (f, o["order"], o.get("missing")) if isinstance(o, dict) else (f, o, None)
+            for f, o in sort
+        ]
+        if sort:
+            hits.sort(key=cmp_to_key(lambda a, b: compare(a, b, sort)))
+            after = query.get("search_after")
+            if after is not None:
+                hits = [h for h in hits if compare_values(h, after, sort) > 0]
+        result = {
+            "hits": {
+                "total": {"value": len(hits), "relation": "eq"},
+                "hits": [
+                    {
+                        "_id": f"{h.get('snap_name')}/{h.get('channel')}",
+                        "_source": select(h, query.get("_source")),
+                        "sort": [sort_key(h, f, m) for f, _, m in sort],
+                    }
+                    for h in hits[: query.get("size", 10)]
+                ],
+            }
+        }
+        if "aggs" in query:
+            result["aggregations"] = aggregate(hits, query["aggs"])
+        return httpx.Response(200, json=result)
+
+
+def bucket_value(bucket: dict, field: str):
+    if field == "_key":
+        return bucket["key"]
+    if field == "_count":
+        return bucket["doc_count"]
+    return bucket[field]["value"]
+
+
+def error(status: int, kind: str) -> httpx.Response:
+    return httpx.Response(status, json={"error": {"type": kind}, "status": status})
+
+
+def matches(document: dict, query: Optional[dict]) -> bool:
+    if not query or "match_all" in query:
+        return True
+    if "term" in query:
+        field, value = next(iter(query["term"].items()))
+        return document.get(field) == value
+    if "bool" in query:
+        return all(matches(document, q) for q in query["bool"].get("filter", []))
+    raise ValueError(f"unsupported query {query}")
+
+
+def sort_key(document: dict, field: str, missing):
+    value = document.get(field)
+    return missing if value is None else value
+
+
+def compare_values(document: dict, values: list, sort: list) -> int:
+    """Compare a document with sort values; positive if it sorts after."""
+    for (field, order, missing), value in zip(sort, values):
+        a = sort_key(document, field, missing)
+        if a != value:
+            result = 1 if a > value else -1
+            return -result if order == "desc" else result
+    return 0
+
+
+def compare(a: dict, b: dict, sort: list) -> int:
+    return compare_values(a, [sort_key(b, f, m) for f, _, m in sort], sort)
+
+
+def select(document: dict, fields: Optional[list]) -> dict:
+    if fields is None:
+        return document
+    return {f: document[f] for f in fields if f in document}
+
+
+def aggregate(documents: List[dict], aggs: dict) -> dict:
+    result = {}
+    for name, spec in aggs.items():
+        if "terms" in spec:
+            result[name] = terms(documents, spec)
+            continue
+        kind, options = next(iter(spec.items()))
+        values = [
+            d[options["field"]]
+            for d in documents
+            if d.get(options["field"]) is not None
+        ]
+        if kind == "sum":
+            value = float(sum(values))
+        elif kind == "avg":
+            value = sum(values) / len(values) if values else None
+        elif kind == "max":
+            value = float(max(values)) if values else None
+        else:
+            raise ValueError(f"unsupported aggregation {kind}")
+        result[name] = {"value": value}
+    return result
+
+
+def terms(documents: List[dict], spec: dict) -> dict:
+    options = spec["terms"]
+    groups: Dict[str, List[dict]] = {}
+    for document in documents:
+        groups.setdefault(document[options["field"]], []).append(document)
+    buckets = []
+    for key, members in groups.items():
+        bucket = {"key": key, "doc_count": len(members)}
+        bucket.update(aggregate(members, spec.get("aggs", {})))
+        buckets.append(bucket)
+    order = options.get("order", {"_count": "desc"})
+    # Least significant criterion first, relying on a stable sort
+    for criterion in reversed(order if isinstance(order, list) else [order]):
+        ((field, direction),) = criterion.items()
+        buckets.sort(key=lambda b: bucket_value(b, field), reverse=direction == "desc")
+    return {"buckets": buckets[: options.get("size", 10)]}
@@ -0,0 +1,527 @@
+"""
+OpenSearch backend for the snap store.
+
+Records are documents of one index, with id ``<snap_name>/<channel>``. The
+filter and sort fields are mapped as keyword and numeric fields, and the
+serialized ``/stats`` payload is kept in ``_source`` without being indexed,
+so a read returns it as stored.
+
+Writes are indexed in the background. ``put`` only records the latest
+version of each snap channel as pending; a flusher task on the event loop
+sends pending records in ``_bulk`` requests of up to ``batch_size``
+documents, as soon as a batch is full or every ``flush_interval`` seconds.
+Records that are pending or being sent are served from memory by
+``get_record`` and ``get_payload``, so an ingested record is readable at
+once. Searches, exports and aggregations see it after the next refresh.
+
+Refreshing makes new documents searchable but costs a segment per refresh.
+The index refreshes every ``refresh_interval``; while a backlog of more
+than ``BULK_REFRESH_BATCHES`` batches is sent, for instance when the
+collector forwards its spool, refresh is turned off and the index is
+refreshed once at the end.
+
+``/trending`` runs as an aggregation in the cluster rather than over
+records read back into the API, and ``/stats/{snap_name}`` reads only the
+fields it reports. Exports read from a point in time, so they see the
+index as of the call.
+
+Reads use a synchronous client and wait on the cluster, so the store is
+``blocking``: main.py calls them in a worker thread, keeping the event
+loop, and the flusher on it, free.
+
+The REST API is spoken through httpx, which the API already uses, rather
+than the opensearch-py client.
+"""
+
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+import httpx
+
+from encoding import decode_stats, dumps, encode_stats, loads
+from indexes import MISSING, SORT_FIELDS
+from models import SnapData
+from records import SnapRecord
+from store import SnapStore, check_filters, trending_entry
+
+logger = logging.getLogger(__name__)
+
+# Send pending records with refresh turned off above this many batches
+BULK_REFRESH_BATCHES = 4
+# Documents per page of an export
+EXPORT_PAGE = 1000
+# Upper bound on the channels of one snap
+MAX_CHANNELS = 1000
+PIT_KEEP_ALIVE = "5m"
+# Item statuses of a _bulk response that are worth sending again
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+MAPPINGS = {
+    "dynamic": "strict",
+    "properties": {
+        "snap_name": {"type": "keyword"},
+        "channel": {"type": "keyword"},
+        "publisher": {"type": "keyword"},
+        "confinement": {"type": "keyword"},
+        "grade": {"type": "keyword"},
+        "download_total": {"type": "long"},
+        "download_last_30_days": {"type": "long"},
+        "rating": {"type": "double"},
+        "trending_score": {"type": "double"},
+        "last_updated": {"type": "double"},
+        "version": {"type": "keyword", "index": False},
+        "payload": {"type": "text", "index": False},
+    },
+}
+
+Key = Tuple[str, str]
+
+
+def document_id(snap_name: str, channel: str) -> str:
+    return f"{snap_name}/{channel}"
+
+
+def bulk_body(records: List[SnapRecord]) -> bytes:
+    """Return the NDJSON ``_bulk`` body indexing ``records``."""
+    lines = []
+    for record in records:
+        lines.append(
+            dumps({"index": {"_id": document_id(record.snap_name, record.channel)}})
+        )
+        lines.append(
+            dumps(
+                {
+                    "snap_name": record.snap_name,
+                    "channel": record.channel,
+                    "publisher": record.publisher,
+                    "confinement": record.confinement,
+                    "grade": record.grade,
+                    "download_total": record.download_total,
+                    "download_last_30_days": record.download_last_30_days,
+                    "rating": record.rating,
+                    "trending_score": record.trending_score,
+                    "last_updated": record.last_updated,
+                    "version": record.version,
+                    "payload": record.payload.decode("utf-8"),
+                }
+            )
+        )
+    return b"\n".join(lines) + b"\n"
+
+
+def filter_query(filters: Dict[str, str]) -> dict:
+    if not filters:
+        return {"match_all": {}}
+    return {
+        "bool": {
+            "filter": [{"term": {field: value}} for field, value in filters.items()]
+        }
+    }
+
+
+class OpenSearchStore(SnapStore):
+    """Store backed by an OpenSearch index, written with batched ``_bulk``
+    requests."""
+
+    blocking = True
+    shared = True
+
+    def __init__(
+        self,
+        url: str,
+        index: str = "snaps",
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        refresh_interval: str = "1s",
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        # Reads come from request handlers, in worker threads, through the
+        # synchronous store interface; bulk writes from the flusher on the
+        # event loop
+        self._client = httpx.Client(base_url=url, timeout=30.0, transport=transport)
+        self._async_client = httpx.AsyncClient(
+            base_url=url, timeout=30.0, transport=transport
+        )
+        self._lock = threading.Lock()
+        self._pending: Dict[Key, SnapRecord] = {}
+        self._in_flight: Dict[Key, SnapRecord] = {}
+        self._flush_lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self) -> None:
+        """Create the index if needed and start the flusher."""
+        response = await self._async_client.put(
+            f"/{self.index}",
+            json={
+                "settings": {"index": {"refresh_interval": self.refresh_interval}},
+                "mappings": MAPPINGS,
+            },
+        )
+        if response.is_error and b"resource_already_exists" not in response.content:
+            response.raise_for_status()
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the flusher and send every pending record."""
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        await self._async_client.aclose()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"OpenSearch bulk indexing failed: {e}")
+
+    def put(self, data: SnapData) -> None:
+        record = SnapRecord.from_model(data)
+        record.payload = encode_stats(record)
+        with self._lock:
+            # A newer record for the same channel replaces the pending one
+            self._pending[(record.snap_name, record.channel)] = record
+            full = len(self._pending) >= self.batch_size
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def flush(self) -> int:
+        """Index every pending record; return how many were indexed.
+
+        Records the cluster could not take for now are pending again
+        afterwards, unless a newer version of them is.
+        """
+        async with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+            if not batch:
+                return 0
+            records = list(batch.values())
+            backlog = len(records) > self.batch_size * BULK_REFRESH_BATCHES
+            indexed: Set[Key] = set()
+            try:
+                if backlog:
+                    await self._set_refresh_interval("-1")
+                for start in range(0, len(records), self.batch_size):
+                    chunk = records[start : start + self.batch_size]
+                    response = await self._async_client.post(
+                        f"/{self.index}/_bulk",
+                        content=bulk_body(chunk),
+                        headers={"Content-Type": "application/x-ndjson"},
+                    )
+                    indexed.update(self._bulk_result(chunk, response))
+            finally:
+                with self._lock:
+                    for key, record in batch.items():
+                        if key not in indexed:
+                            self._pending.setdefault(key, record)
+                    self._in_flight = {}
+                if backlog:
+                    await self._set_refresh_interval(self.refresh_interval)
+                    await self._async_client.post(f"/{self.index}/_refresh")
+            return len(indexed)
+
+    def _bulk_result(
+        self, records: List[SnapRecord], response: httpx.Response
+    ) -> List[Key]:
+        """Return the keys ``response`` indexed or rejected for good."""
+        response.raise_for_status()
+        result = response.json()
+        keys = [(r.snap_name, r.channel) for r in records]
+        if not result.get("errors"):
+            return keys
+        done = []
+        for key, item in zip(keys, result["items"]):
+            status = item["index"]["status"]
+            if status in RETRY_STATUSES:
+                continue
+            if status >= 300:
+                logger.error(
+                    f"OpenSearch rejected {document_id(*key)}: "
+                    f"{item['index'].get('error')}"
+                )
+            done.append(key)
+        return done
+
+    async def _set_refresh_interval(self, interval: str) -> None:
+        response = await self._async_client.put(
+            f"/{self.index}/_settings",
+            json={"index": {"refresh_interval": interval}},
+        )
+        response.raise_for_status()
+
+    def _unflushed(self, snap_name: str, channel: str) -> Optional[SnapRecord]:
+        key = (snap_name, channel)
+        with self._lock:
+            return self._pending.get(key) or self._in_flight.get(key)
+
+    def _search(self, body: dict, path: Optional[str] = None) -> dict:
+        response = self._client.post(
+            path or f"/{self.index}/_search",
+            content=dumps(body),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        return loads(response.content)
+
+    def get_record(self, snap_name: str, channel: str) -> Optional[SnapRecord]:
+        payload = self.get_payload(snap_name, channel)
+        return decode_stats(payload) if payload else None
+
+    def get_payload(self, snap_name: str, channel: str) -> Optional[bytes]:
+        record = self._unflushed(snap_name, channel)
+        if record is not None:
+            return record.payload
+        # Gets by id are real time; they do not wait for a refresh
+        response = self._client.get(
+            f"/{self.index}/_doc/{quote(document_id(snap_name, channel), safe='')}",
+            params={"_source": "payload"},
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return loads(response.content)["_source"]["payload"].encode("utf-8")
+
+    def get_records(self, keys: List[Key]) -> List[Optional[SnapRecord]]:
+        records: List[Optional[SnapRecord]] = [self._unflushed(*key) for key in keys]
+        missing = [i for i, record in enumerate(records) if record is None]
+        if not missing:
+            return records
+        # One multi-get for every record not held in memory
+        response = self._client.post(
+            f"/{self.index}/_mget",
+            params={"_source": "payload"},
+            content=dumps({"ids": [document_id(*keys[i]) for i in missing]}),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        for i, doc in zip(missing, loads(response.content)["docs"]):
+            if doc.get("found"):
+                records[i] = decode_stats(doc["_source"]["payload"].encode("utf-8"))
+        return records
+
+    def _unflushed_channels(self, snap_name: str) -> List[SnapRecord]:
+        """Return the pending and in-flight records of a snap, newest last."""
+        with self._lock:
+            return [
+                record
+                for records in (self._in_flight, self._pending)
+                for (name, _), record in records.items()
+                if name == snap_name
+            ]
+
+    def channels(self, snap_name: str) -> Dict[str, SnapData]:
+        result = self._search(
+            {
+                "query": filter_query({"snap_name": snap_name}),
+                "size": MAX_CHANNELS,
+                "_source": ["payload"],
+            }
+        )
+        channels = {}
+        for hit in result["hits"]["hits"]:
+            record = decode_stats(hit["_source"]["payload"].encode("utf-8"))
+            channels[record.channel] = record.to_model()
+        for record in self._unflushed_channels(snap_name):
+            channels[record.channel] = record.to_model()
+        return channels
+
+    def records(self) -> Iterator[SnapRecord]:
+        return self.export({})
+
+    def query(
+        self,
+        filters: Dict[str, Optional[str]],
+        sort: str = "download_total",
+        descending: bool = True,
+        limit: int = 20,
+        after: Optional[tuple] = None,
+    ) -> Tuple[List[SnapRecord], Optional[tuple]]:
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort on {sort}")
+        order = "desc" if descending else "asc"
+        body = {
+            "query": filter_query(check_filters(filters)),
+            # Unpublished figures sort as in the other stores
+            "sort": [
+                {sort: {"order": order, "missing": MISSING}},
+                {"snap_name": {"order": order}},
+                {"channel": {"order": order}},
+            ],
+            "size": limit + 1,
+            "_source": ["payload"],
+            "track_total_hits": False,
+        }
+        if after is not None:
+            body["search_after"] = list(after)
+        hits = self._search(body)["hits"]["hits"]
+        records = [
+            decode_stats(hit["_source"]["payload"].encode("utf-8"))
+            for hit in hits[:limit]
+        ]
+        next_item = tuple(hits[limit - 1]["sort"]) if len(hits) > limit else None
+        return records, next_item
+
+    def export(
+        self,
+        filters: Dict[str, Optional[str]],
+        after: Optional[Tuple[str, str]] = None,
+    ) -> Iterator[SnapRecord]:
+        return self._export(check_filters(filters), after)
+
+    def _export(
+        self, filters: Dict[str, str], after: Optional[Tuple[str, str]]
+    ) -> Iterator[SnapRecord]:
+        # Every page reads the same point in time, whatever is indexed since
+        response = self._client.post(
+            f"/{self.index}/_search/point_in_time",
+            params={"keep_alive": PIT_KEEP_ALIVE},
+        )
+        response.raise_for_status()
+        pit_id = response.json()["pit_id"]
+        search_after = list(after) if after else None
+        try:
+            while True:
+                body = {
+                    "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                    "query": filter_query(filters),
+                    "sort": [{"snap_name": "asc"}, {"channel": "asc"}],
+                    "size": EXPORT_PAGE,
+                    "_source": ["payload"],
+                    "track_total_hits": False,
+                }
+                if search_after is not None:
+                    body["search_after"] = search_after
+                hits = self._search(body, "/_search")["hits"]["hits"]
+                for hit in hits:
+                    yield decode_stats(hit["_source"]["payload"].encode("utf-8"))
+                if len(hits) < EXPORT_PAGE:
+                    return
+                search_after = hits[-1]["sort"]
+        finally:
+            self._client.request(
+                "DELETE", "/_search/point_in_time", json={"pit_id": [pit_id]}
+            )
+
+    def trending(self, limit: int = 10) -> List[dict]:
+        result = self._search(
+            {
+                "size": 0,
+                "aggs": {
+                    "snaps": {
+                        "terms": {
+                            "field": "snap_name",
+                            "size": limit,
+                            # Ties by name, as the sorted index of the
+                            # other stores orders them
+                            "order": [{"score": "desc"}, {"_key": "desc"}],
+                        },
+                        "aggs": {
+                            "score": {"max": {"field": "trending_score"}},
+                            "recent": {"sum": {"field": "download_last_30_days"}},
+                            "total": {"sum": {"field": "download_total"}},
+                            "rating": {"avg": {"field": "rating"}},
+                        },
+                    }
+                },
+            }
+        )
+        return [
+            trending_entry(
+                bucket["key"],
+                bucket["score"]["value"],
+                int(bucket["recent"]["value"]),
+                int(bucket["total"]["value"]),
+                bucket["rating"]["value"],
+            )
+            for bucket in result["aggregations"]["snaps"]["buckets"]
+        ]
+
+    def snap_summary(self, snap_name: str) -> Optional[dict]:
+        result = self._search(
+            {
+                "query": filter_query({"snap_name": snap_name}),
+                "size": MAX_CHANNELS,
+                "_source": ["channel", "download_total", "version", "last_updated"],
+            }
+        )
+        channels = {
+            hit["_source"]["channel"]: (
+                hit["_source"].get("download_total"),
+                hit["_source"]["version"],
+                hit["_source"]["last_updated"],
+            )
+            for hit in result["hits"]["hits"]
+        }
+        # Records not indexed yet are newer than their documents
+        for record in self._unflushed_channels(snap_name):
+            channels[record.channel] = (
+                record.download_total,
+                record.version,
+                record.last_updated,
+            )
+        if not channels:
+            return None
+        return {
+            "snap_name": snap_name,
+            "channels": {
+                channel: {
+                    "download_total": total,
+                    "version": version,
+                    "last_updated": datetime.fromtimestamp(updated).isoformat(),
+                }
+                for channel, (total, version, updated) in channels.items()
+            },
+            "total_downloads": sum(total or 0 for total, _, _ in channels.values()),
+        }
+
+    def refresh(self) -> None:
+        """Make every indexed record searchable now."""
+        self._client.post(f"/{self.index}/_refresh").raise_for_status()
+
+    def __len__(self) -> int:
+        response = self._client.get(f"/{self.index}/_count")
+        response.raise_for_status()
+        return response.json()["count"]
+
+    def close(self) -> None:
+        # Records put after stop, or without the flusher ever running
+        with self._lock:
+            records = list(self._pending.values())
+            self._pending = {}
+        for start in range(0, len(records), self.batch_size):
+            chunk = records[start : start + self.batch_size]
+            self._bulk_result(
+                chunk,
+                self._client.post(
+                    f"/{self.index}/_bulk",
+                    content=bulk_body(chunk),
+                    headers={"Content-Type": "application/x-ndjson"},
+                ),
+            )
+        self._client.close()
@@ -0,0 +1,419 @@
+"""
+Snapshot and write-ahead log persistence for the in-memory snap store.
+
+Every ingest is appended to the current log segment before it is visible in
+memory. A checkpoint starts a new segment, writes a compact binary snapshot
+of the whole store and then deletes the segments the snapshot covers. On
+startup the snapshot is memory-mapped and decoded in place, then the
+remaining segments are replayed in order.
+
+Log segments hold ``<II`` (body length, crc32) frames around a struct-packed
+record. A torn frame at the end of a segment is ignored, since it was never
+acknowledged to the collector.
+
+Snapshots are columnar, so recovery decodes whole columns at C speed rather
+than one record at a time::
+
+    magic, <Q record count
+    one int64/float64 array per numeric field
+    per string field: <QQ unique count and blob size, uint32 end offsets,
+        the unique strings as one UTF-8 blob, uint32 codes per record
+    <I crc32 of everything after the magic
+
+Every section is padded to 8 bytes. Download counts and ratings the Snap
+Store does not publish are stored as -1 and NaN respectively, in both
+formats, and read back as None.
+
+The streaming models fed at ingest (search, anomalies, forecasts, rollups,
+releases) keep history the store does not, so they cannot be rebuilt from
+the log. Whatever the store backend, main.py pickles them to
+``STATE_FILE`` on shutdown, after the final checkpoint, and loads them on
+startup; a missing or unreadable file just starts them empty.
+Timings of the last shutdown are kept in ``LIFECYCLE_FILE`` as JSON.
+"""
+
+import gc
+import glob
+import json
+import logging
+import math
+import mmap
+import os
+import pickle
+import struct
+import threading
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from records import SnapRecord
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"SPSNAP02"
+SNAPSHOT_FILE = "snapshot.bin"
+STATE_FILE = "state.pickle"
+LIFECYCLE_FILE = "lifecycle.json"
+
+_FRAME = struct.Struct("<II")
+_COUNT = struct.Struct("<Q")
+_STRING_TABLE = struct.Struct("<QQ")
+_CRC = struct.Struct("<I")
+_NUMERIC_FIELDS = (
+    ("download_total", "q"),
+    ("download_last_30_days", "q"),
+    ("rating", "d"),
+    ("trending_score", "d"),
+    ("last_updated", "d"),
+)
+_STRING_FIELDS = (
+    "snap_name",
+    "channel",
+    "version",
+    "confinement",
+    "grade",
+    "publisher",
+)
+# Numeric fields followed by the byte length of every string field
+_HEADER = struct.Struct("<qqddd" + "H" * len(_STRING_FIELDS))
+_MISSING_COUNT = -1
+
+
+def _count(value: Optional[int]) -> int:
+    return _MISSING_COUNT if value is None else value
+
+
+def _rating(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+
+def _counts(column: list) -> list:
+    """Return a column of download counts with the missing ones as None."""
+    if not column or min(column) >= 0:
+        return column
+    return [None if value < 0 else value for value in column]
+
+
+def _ratings(column: list) -> list:
+    """Return a column of ratings with the missing ones as None."""
+    if not math.isnan(sum(column)):
+        return column
+    return [None if value != value else value for value in column]
+
+
+def encode_record(data: SnapRecord) -> bytes:
+    """Encode a record as a framed binary body."""
+    strings = [getattr(data, field).encode("utf-8") for field in _STRING_FIELDS]
+    body = _HEADER.pack(
+        _count(data.download_total),
+        _count(data.download_last_30_days),
+        _rating(data.rating),
+        data.trending_score,
+        data.last_updated,
+        *(len(raw) for raw in strings),
+    ) + b"".join(strings)
+    return _FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_record(buffer, offset: int, end: int) -> SnapRecord:
+    """Decode the record body stored in ``buffer[offset:end]``."""
+    header = _HEADER.unpack_from(buffer, offset)
+    offset += _HEADER.size
+    values = []
+    for length in header[5:]:
+        values.append(str(buffer[offset : offset + length], "utf-8"))
+        offset += length
+    if offset != end:
+        raise ValueError("record body length mismatch")
+    snap_name, channel, version, confinement, grade, publisher = values
+    return SnapRecord(
+        snap_name,
+        channel,
+        None if header[0] < 0 else header[0],
+        None if header[1] < 0 else header[1],
+        None if header[2] != header[2] else header[2],
+        version,
+        header[4],
+        confinement,
+        grade,
+        publisher,
+        header[3],
+    )
+
+
+def iter_frames(buffer, offset: int = 0) -> Iterator[Tuple[int, int]]:
+    """Yield ``(start, end)`` of every intact frame body in ``buffer``."""
+    size = len(buffer)
+    while offset + _FRAME.size <= size:
+        length, crc = _FRAME.unpack_from(buffer, offset)
+        start = offset + _FRAME.size
+        end = start + length
+        if end > size or zlib.crc32(buffer[start:end]) != crc:
+            break
+        yield start, end
+        offset = end
+
+
+def _pad(f) -> None:
+    f.write(b"\0" * (-f.tell() % 8))
+
+
+def write_snapshot(path: str, records: Iterable[SnapRecord]) -> int:
+    """Write ``records`` to ``path`` atomically and return their count."""
+    numbers = {field: array(typecode) for field, typecode in _NUMERIC_FIELDS}
+    codes = {field: array("I") for field in _STRING_FIELDS}
+    uniques: Dict[str, Dict[str, int]] = {field: {} for field in _STRING_FIELDS}
+    count = 0
+    for data in records:
+        numbers["download_total"].append(_count(data.download_total))
+        numbers["download_last_30_days"].append(_count(data.download_last_30_days))
+        numbers["rating"].append(_rating(data.rating))
+        numbers["trending_score"].append(data.trending_score)
+        numbers["last_updated"].append(data.last_updated)
+        for field in _STRING_FIELDS:
+            table = uniques[field]
+            value = getattr(data, field)
+            code = table.get(value)
+            if code is None:
+                code = table[value] = len(table)
+            codes[field].append(code)
+        count += 1
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w+b") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_COUNT.pack(count))
+        for field, _ in _NUMERIC_FIELDS:
+            f.write(numbers[field].tobytes())
+        for field in _STRING_FIELDS:
+            encoded = [value.encode("utf-8") for value in uniques[field]]
+            offsets = array("I")
+            position = 0
+            for raw in encoded:
+                position += len(raw)
+                offsets.append(position)
+            f.write(_STRING_TABLE.pack(len(encoded), position))
+            f.write(offsets.tobytes())
+            f.write(b"".join(encoded))
+            _pad(f)
+            f.write(codes[field].tobytes())
+            _pad(f)
+        f.flush()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            crc = zlib.crc32(memoryview(mm)[len(SNAPSHOT_MAGIC) :])
+        f.write(_CRC.pack(crc))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_snapshot(path: str) -> Iterator[SnapRecord]:
+    """Memory-map the snapshot at ``path`` and yield its records."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                columns = _read_columns(path, view)
+            finally:
+                view.release()
+    (
+        download_total,
+        download_last_30_days,
+        rating,
+        trending_score,
+        last_updated,
+        snap_name,
+        channel,
+        version,
+        confinement,
+        grade,
+        publisher,
+    ) = columns
+    yield from map(
+        SnapRecord,
+        snap_name,
+        channel,
+        _counts(download_total),
+        _counts(download_last_30_days),
+        _ratings(rating),
+        version,
+        last_updated,
+        confinement,
+        grade,
+        publisher,
+        trending_score,
+    )
+
+
+def _read_columns(path: str, view: memoryview) -> List[list]:
+    magic_size = len(SNAPSHOT_MAGIC)
+    if bytes(view[:magic_size]) != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a SnapPulse snapshot")
+    (crc,) = _CRC.unpack_from(view, len(view) - _CRC.size)
+    if zlib.crc32(view[magic_size : len(view) - _CRC.size]) != crc:
+        raise ValueError(f"{path} is corrupt")
+
+    (count,) = _COUNT.unpack_from(view, magic_size)
+    offset = magic_size + _COUNT.size
+    columns = []
+    for _, typecode in _NUMERIC_FIELDS:
+        columns.append(view[offset : offset + count * 8].cast(typecode).tolist())
+        offset += count * 8
+    for _ in _STRING_FIELDS:
+        unique_count, blob_size = _STRING_TABLE.unpack_from(view, offset)
+        offset += _STRING_TABLE.size
+        ends = view[offset : offset + unique_count * 4].cast("I").tolist()
+        offset += unique_count * 4
+        blob = view[offset : offset + blob_size]
+        values = [str(blob[start:end], "utf-8") for start, end in zip([0] + ends, ends)]
+        offset += blob_size + (-(offset + blob_size) % 8)
+        codes = view[offset : offset + count * 4].cast("I")
+        columns.append([values[code] for code in codes])
+        codes.release()
+        blob.release()
+        offset += count * 4 + (-(offset + count * 4) % 8)
+    return columns
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Workers sharing a directory each write their own temporary file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_state(path: str, state: dict) -> None:
+    """Pickle ``state`` to ``path`` atomically."""
+    _write_atomic(path, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def read_state(path: str) -> Optional[dict]:
+    """Return the state pickled at ``path``, or None if there is none."""
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Ignoring unreadable state {path}: {e}")
+        return None
+
+
+def write_lifecycle(path: str, metrics: dict) -> None:
+    """Write lifecycle ``metrics`` to ``path`` as JSON."""
+    _write_atomic(path, json.dumps(metrics).encode("utf-8"))
+
+
+def read_lifecycle(path: str) -> dict:
+    """Return the lifecycle metrics at ``path``, or an empty dict."""
+    try:
+        with open(path, "rb") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def read_settings(path: str) -> Dict[str, str]:
+    """Return the environment variables saved at ``path`` as a JSON object."""
+    with open(path, "rb") as f:
+        return {str(name): str(value) for name, value in json.load(f).items()}
+
+
+class Journal:
+    """Write-ahead log and snapshot files for a ``MemoryStore``."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        segments = self._segments()
+        self._segment = self._segment_number(segments[-1]) + 1 if segments else 1
+        self._fd = self._open_segment(self._segment)
+        self.appended = 0
+
+    def _segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "wal-*.log")))
+
+    @staticmethod
+    def _segment_number(path: str) -> int:
+        return int(os.path.basename(path)[4:-4])
+
+    def _open_segment(self, number: int) -> int:
+        path = os.path.join(self.directory, f"wal-{number:08d}.log")
+        return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def append(self, data: SnapRecord) -> None:
+        """Append one ingested record to the current log segment."""
+        frame = encode_record(data)
+        with self._lock:
+            os.write(self._fd, frame)
+            self.appended += 1
+
+    def rotate(self) -> int:
+        """Start a new log segment and return the number of the one closed.
+
+        The caller must hold off appends whose records are not yet visible
+        to the snapshot, so that it covers every closed segment.
+        """
+        with self._lock:
+            covered = self._segment
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._segment += 1
+            self._fd = self._open_segment(self._segment)
+            self.appended = 0
+        return covered
+
+    def checkpoint(self, records: Iterable[SnapRecord], covered: int) -> int:
+        """Write a snapshot of ``records`` and drop the log it replaces.
+
+        ``covered`` is the segment ``rotate`` closed when ``records`` was
+        taken; ingests that race with the snapshot land in later segments
+        and are replayed on top of it.
+        """
+        count = write_snapshot(os.path.join(self.directory, SNAPSHOT_FILE), records)
+        for segment in self._segments():
+            if self._segment_number(segment) <= covered:
+                os.remove(segment)
+        logger.info(f"Wrote snapshot with {count} records")
+        return count
+
+    def recover(self, store) -> int:
+        """Load the snapshot and replay the log into ``store``."""
+        # Records hold no reference cycles, and collections triggered by
+        # millions of new objects would otherwise dominate recovery time
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            count = self._recover(store)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        logger.info(f"Recovered {count} records from {self.directory}")
+        return count
+
+    def _recover(self, store) -> int:
+        count = 0
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(path):
+            for data in read_snapshot(path):
+                store.restore(data)
+                count += 1
+
+        for segment in self._segments():
+            if self._segment_number(segment) == self._segment:
+                continue
+            with open(segment, "rb") as f:
+                buffer = f.read()
+            for start, end in iter_frames(buffer):
+                store.restore(decode_record(buffer, start, end))
+                count += 1
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            os.close(self._fd)
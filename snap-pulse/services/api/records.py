@@ -0,0 +1,97 @@
+"""
+Compact internal record type for stored snaps.
+
+A pydantic ``SnapData`` carries an instance ``__dict__``, a fields-set and a
+``datetime`` per record. ``SnapRecord`` uses ``__slots__``, keeps
+``last_updated`` as a float timestamp and interns the categorical strings
+(channel, version, confinement, grade, publisher) so every record with the
+same value shares one string object. Records are converted to ``SnapData``
+only at the API boundary.
+"""
+
+import sys
+from datetime import datetime
+from typing import Optional
+
+from models import SnapData
+
+
+class SnapRecord:
+    __slots__ = (
+        "snap_name",
+        "channel",
+        "download_total",
+        "download_last_30_days",
+        "rating",
+        "version",
+        "last_updated",
+        "confinement",
+        "grade",
+        "publisher",
+        "trending_score",
+        "payload",
+    )
+
+    def __init__(
+        self,
+        snap_name: str,
+        channel: str,
+        download_total: Optional[int],
+        download_last_30_days: Optional[int],
+        rating: Optional[float],
+        version: str,
+        last_updated: float,
+        confinement: str,
+        grade: str,
+        publisher: str,
+        trending_score: float,
+        payload: Optional[bytes] = None,
+    ):
+        self.snap_name = snap_name
+        self.channel = sys.intern(channel)
+        self.download_total = download_total
+        self.download_last_30_days = download_last_30_days
+        self.rating = rating
+        self.version = sys.intern(version)
+        self.last_updated = last_updated
+        self.confinement = sys.intern(confinement)
+        self.grade = sys.intern(grade)
+        self.publisher = sys.intern(publisher)
+        self.trending_score = trending_score
+        # Serialized /stats response, filled in by the store
+        self.payload = payload
+
+    @classmethod
+    def from_model(cls, data: SnapData) -> "SnapRecord":
+        return cls(
+            data.snap_name,
+            data.channel,
+            data.download_total,
+            data.download_last_30_days,
+            data.rating,
+            data.version,
+            data.last_updated.timestamp(),
+            data.confinement,
+            data.grade,
+            data.publisher,
+            data.trending_score,
+        )
+
+    def updated_at(self) -> datetime:
+        return datetime.fromtimestamp(self.last_updated)
+
+    def to_model(self) -> SnapData:
+        # Records were validated at ingest, so skip validation on the way out
+        return SnapData.model_construct(
+            snap_name=self.snap_name,
+            channel=self.channel,
+            download_total=self.download_total,
+            download_last_30_days=self.download_last_30_days,
+            rating=self.rating,
+            version=self.version,
+            last_updated=self.updated_at(),
+            confinement=self.confinement,
+            grade=self.grade,
+            publisher=self.publisher,
+            trending_score=self.trending_score,
+        )
@@ -0,0 +1,189 @@
+"""
+Release history from the Snap Store channel map.
+
+Each ingested record may carry the snap's channel map: one row per
+(channel, architecture) naming the revision released there, its version,
+download size and release time. ``ReleaseHistory`` keeps
+
+- every revision once per snap and architecture, with its version and
+  size, in revision order (``RevisionLog``), and
+- per (channel, architecture), the times its current revision changed and
+  the revision released each time (``ChannelLog``).
+
+The collector sends the whole channel map every time it changes, but a
+row whose revision is already current in its channel stores nothing, and a
+revision promoted from one channel to the next only adds a release time to
+the second channel. History therefore grows with releases, not with polls.
+Logs are flat arrays, so the size-growth and cadence queries are NumPy over
+a single array.
+"""
+
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+
+# (channel, architecture, revision, version, size, released_at or None)
+Row = Tuple[str, str, int, str, int, Optional[float]]
+
+
+class RevisionLog:
+    """Revisions of one snap architecture, sorted by revision number."""
+
+    __slots__ = ("revisions", "sizes", "versions")
+
+    def __init__(self):
+        self.revisions = array("q")
+        self.sizes = array("q")
+        self.versions: List[str] = []
+
+    def add(self, revision: int, version: str, size: int) -> bool:
+        """Record a revision; return False if it is already known."""
+        i = bisect_left(self.revisions, revision)
+        if i < len(self.revisions) and self.revisions[i] == revision:
+            return False
+        self.revisions.insert(i, revision)
+        self.sizes.insert(i, size)
+        self.versions.insert(i, version)
+        return True
+
+
+class ChannelLog:
+    """Release times and revisions of one channel and architecture."""
+
+    __slots__ = ("times", "revisions")
+
+    def __init__(self):
+        self.times = array("d")
+        self.revisions = array("q")
+
+    def add(self, revision: int, released_at: float) -> bool:
+        """Record a release; return False if ``revision`` is already
+        current."""
+        if self.revisions and self.revisions[-1] == revision:
+            return False
+        self.times.append(released_at)
+        self.revisions.append(revision)
+        return True
+
+
+class ReleaseHistory:
+    """Revisions and channel releases of every snap."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revisions: Dict[Tuple[str, str], RevisionLog] = {}
+        self._channels: Dict[Tuple[str, str, str], ChannelLog] = {}
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def get_state(self) -> dict:
+        """Return the logs, to persist across restarts."""
+        with self._lock:
+            return {
+                "revisions": dict(self._revisions),
+                "channels": dict(self._channels),
+            }
+
+    def set_state(self, state: dict) -> None:
+        """Replace the logs with a saved ``get_state``."""
+        with self._lock:
+            self._revisions = state["revisions"]
+            self._channels = state["channels"]
+
+    def observe(self, snap_name: str, rows: Iterable[Row], timestamp: float) -> int:
+        """Add a snap's channel map and return the number of rows that
+        changed something.
+
+        Rows without a release time are taken as released at ``timestamp``.
+        """
+        changed = 0
+        with self._lock:
+            for channel, arch, revision, version, size, released_at in rows:
+                log = self._revisions.get((snap_name, arch))
+                if log is None:
+                    log = self._revisions[(snap_name, arch)] = RevisionLog()
+                new_revision = log.add(revision, version, size)
+
+                key = (snap_name, channel, arch)
+                releases = self._channels.get(key)
+                if releases is None:
+                    releases = self._channels[key] = ChannelLog()
+                released = releases.add(
+                    revision, released_at if released_at is not None else timestamp
+                )
+                changed += new_revision or released
+        return changed
+
+    def size_growth(self, snap_name: str, arch: str) -> Optional[dict]:
+        """Return the download size of every revision of ``arch`` with its
+        change from the previous revision, or None if there are none."""
+        with self._lock:
+            log = self._revisions.get((snap_name, arch))
+            if log is None:
+                return None
+            revisions = log.revisions.tolist()
+            sizes = np.array(log.sizes, dtype=np.int64)
+            versions = list(log.versions)
+
+        changes = np.diff(sizes, prepend=sizes[0])
+        previous = np.concatenate((sizes[:1], sizes[:-1]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percents = np.where(previous > 0, changes / previous * 100, 0.0)
+        first, last = int(sizes[0]), int(sizes[-1])
+        return {
+            "revisions": [
+                {
+                    "revision": revision,
+                    "version": version,
+                    "size": size,
+                    "change": change,
+                    "change_pct": round(percent, 2),
+                }
+                for revision, version, size, change, percent in zip(
+                    revisions,
+                    versions,
+                    sizes.tolist(),
+                    changes.tolist(),
+                    percents.tolist(),
+                )
+            ],
+            "first_size": first,
+            "last_size": last,
+            "growth": last - first,
+            "growth_pct": round((last - first) / first * 100, 2) if first else 0.0,
+        }
+
+    def cadence(self, snap_name: str, channel: str, arch: str) -> Optional[dict]:
+        """Return release count and interval statistics of one channel, or
+        None if it was never seen."""
+        with self._lock:
+            log = self._channels.get((snap_name, channel, arch))
+            if log is None:
+                return None
+            times = np.array(log.times, dtype=np.float64)
+
+        times.sort()
+        intervals = np.diff(times) / SECONDS_PER_DAY
+        result = {
+            "releases": len(times),
+            "first_release": float(times[0]),
+            "last_release": float(times[-1]),
+            "mean_interval_days": None,
+            "median_interval_days": None,
+            "min_interval_days": None,
+            "max_interval_days": None,
+        }
+        if len(intervals):
+            result.update(
+                mean_interval_days=round(float(intervals.mean()), 2),
+                median_interval_days=round(float(np.median(intervals)), 2),
+                min_interval_days=round(float(intervals.min()), 2),
+                max_interval_days=round(float(intervals.max()), 2),
+            )
+        return result
@@ -0,0 +1,350 @@
+"""
+Multi-resolution history of every snap/channel series.
+
+The store keeps only the latest record per snap/channel. ``RollupEngine``
+also keeps its history, updated at ingest:
+
+- the raw points of the last ``RETENTION["raw"]`` seconds, and
+- hourly, daily and weekly buckets holding the count, sum, min, max and
+  last value of each metric in ``METRICS``.
+
+Each level ages out on its own retention, so raw points expire long before
+the rollups built from them. Buckets are stored as flat ``array('d')``
+columns, about a hundred bytes per bucket, rather than as objects.
+
+A range query picks the coarsest level whose buckets nest in the requested
+step and merges its buckets into windows of that step, counted from the
+start of the range. Steps that are not a whole number of hours are served
+from raw points. The endpoints reject a range that starts before the chosen
+level's retention, rather than silently cutting it short.
+``aggregate`` does the same for many series at once with NumPy.
+"""
+
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# ``downloads`` is the increase of ``download_total`` since the previous point
+METRICS = ("downloads", "download_total", "rating")
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+# Name and bucket size of each level, finest first
+RESOLUTIONS = (("hour", HOUR), ("day", DAY), ("week", WEEK))
+# Weeks start on Monday; the epoch was a Thursday
+WEEK_OFFSET = 4 * DAY
+
+RETENTION = {
+    "raw": 2 * DAY,
+    "hour": 14 * DAY,
+    "day": 400 * DAY,
+    "week": 520 * WEEK,
+}
+
+# Bucket layout: count, then sum, min, max and last of each metric
+STRIDE = 1 + 4 * len(METRICS)
+AGGREGATES = ("count", "sum", "min", "max", "last")
+
+Key = Tuple[str, str]
+
+
+def bucket_start(timestamp: float, size: int) -> float:
+    offset = WEEK_OFFSET if size % WEEK == 0 else 0
+    return (timestamp - offset) // size * size + offset
+
+
+class Level:
+    """Buckets of one resolution, ordered by start time."""
+
+    __slots__ = ("size", "starts", "values")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.starts = array("d")
+        self.values = array("d")
+
+    def add(self, timestamp: float, point: Tuple[float, ...]) -> None:
+        start = bucket_start(timestamp, self.size)
+        starts = self.starts
+        if starts and starts[-1] == start:
+            _add_point(self.values, len(self.values) - STRIDE, point)
+        elif not starts or starts[-1] < start:
+            starts.append(start)
+            self.values.extend(_bucket(point))
+        else:
+            # Points normally arrive in order; handle the rest by searching
+            position = bisect_left(starts, start)
+            if starts[position] == start:
+                _add_point(self.values, position * STRIDE, point)
+            else:
+                starts.insert(position, start)
+                base = position * STRIDE
+                self.values[base:base] = _bucket(point)
+
+    def expire(self, cutoff: float) -> None:
+        """Drop buckets that end at or before ``cutoff``."""
+        count = bisect_right(self.starts, cutoff - self.size)
+        if count:
+            del self.starts[:count]
+            del self.values[: count * STRIDE]
+
+    def buckets(self, start: float, end: float) -> Iterable[Tuple[float, array]]:
+        first = bisect_left(self.starts, bucket_start(start, self.size))
+        last = bisect_left(self.starts, end)
+        for position in range(first, last):
+            base = position * STRIDE
+            yield self.starts[position], self.values[base : base + STRIDE]
+
+
+def _bucket(point: Tuple[float, ...]) -> array:
+    values = array("d", [1.0])
+    for value in point:
+        values.extend((value, value, value, value))
+    return values
+
+
+def _add_point(values: array, base: int, point: Tuple[float, ...]) -> None:
+    """Add a point to the bucket at ``values[base]`` in place."""
+    values[base] += 1
+    for offset, value in enumerate(point):
+        i = base + 1 + 4 * offset
+        values[i] += value
+        if value < values[i + 1]:
+            values[i + 1] = value
+        if value > values[i + 2]:
+            values[i + 2] = value
+        values[i + 3] = value
+
+
+def _merge(left: array, right: array) -> array:
+    """Combine two buckets, ``right`` being the later one."""
+    merged = array("d", [left[0] + right[0]])
+    for base in range(1, STRIDE, 4):
+        merged.extend(
+            (
+                left[base] + right[base],
+                min(left[base + 1], right[base + 1]),
+                max(left[base + 2], right[base + 2]),
+                right[base + 3],
+            )
+        )
+    return merged
+
+
+class SeriesRollups:
+    __slots__ = ("raw", "levels", "last_total")
+
+    def __init__(self):
+        # (timestamp, point) pairs, oldest first
+        self.raw: deque = deque()
+        self.levels = [Level(size) for _, size in RESOLUTIONS]
+        self.last_total: Optional[int] = None
+
+
+class RollupEngine:
+    """Raw points and hourly, daily and weekly rollups per series."""
+
+    def __init__(self, retention: Optional[Dict[str, int]] = None):
+        self._lock = threading.Lock()
+        self._series: Dict[Key, SeriesRollups] = {}
+        self.retention = {**RETENTION, **(retention or {})}
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def get_state(self) -> dict:
+        """Return the series, to persist across restarts."""
+        with self._lock:
+            return {"series": dict(self._series)}
+
+    def set_state(self, state: dict) -> None:
+        """Replace the series with a saved ``get_state``; expired points are
+        dropped at their next update."""
+        with self._lock:
+            self._series = state["series"]
+
+    def observe(
+        self,
+        snap_name: str,
+        channel: str,
+        download_total: int,
+        rating: float,
+        timestamp: float,
+    ) -> None:
+        """Add an ingested point to its series and expire old data."""
+        with self._lock:
+            series = self._series.get((snap_name, channel))
+            if series is None:
+                series = self._series[(snap_name, channel)] = SeriesRollups()
+            previous = series.last_total
+            downloads = 0 if previous is None else max(download_total - previous, 0)
+            series.last_total = download_total
+            point = (float(downloads), float(download_total), float(rating))
+
+            series.raw.append((timestamp, point))
+            cutoff = timestamp - self.retention["raw"]
+            while series.raw[0][0] <= cutoff:
+                series.raw.popleft()
+            for (name, _), level in zip(RESOLUTIONS, series.levels):
+                level.add(timestamp, point)
+                level.expire(timestamp - self.retention[name])
+
+    def _level(self, series: SeriesRollups, resolution: str) -> Level:
+        return series.levels[[n for n, _ in RESOLUTIONS].index(resolution)]
+
+    def resolution_for(
+        self, step: int, start: Optional[float] = None, now: Optional[float] = None
+    ) -> str:
+        """Return the coarsest resolution whose buckets nest in ``step``.
+
+        With ``start``, raises ``ValueError`` if that resolution is not
+        retained back to ``start`` as of ``now`` (default: the current
+        time), naming a step that is.
+        """
+        resolution = next(
+            (name for name, size in reversed(RESOLUTIONS) if step % size == 0), "raw"
+        )
+        if start is None:
+            return resolution
+        now = time.time() if now is None else now
+        if start >= now - self.retention[resolution]:
+            return resolution
+        for name, size in RESOLUTIONS:
+            if start >= now - self.retention[name]:
+                raise ValueError(
+                    f"A step of {step} seconds reaches back "
+                    f"{self.retention[resolution] // HOUR} hours; use a multiple "
+                    f"of {size} seconds for this range"
+                )
+        raise ValueError(
+            f"History reaches back {max(self.retention.values()) // DAY} days"
+        )
+
+    def query(
+        self,
+        snap_name: str,
+        channel: str,
+        metric: str,
+        start: float,
+        end: float,
+        step: int,
+    ) -> Optional[Tuple[str, List[dict]]]:
+        """Aggregate ``metric`` over ``[start, end)`` in windows of ``step``
+        seconds.
+
+        Returns the resolution used and one ``{"start", "count", "sum",
+        "min", "max", "last"}`` dict per non-empty window, or None for an
+        unknown series.
+        """
+        base = 1 + 4 * METRICS.index(metric)
+        resolution = self.resolution_for(step)
+        with self._lock:
+            series = self._series.get((snap_name, channel))
+            if series is None:
+                return None
+            if resolution == "raw":
+                buckets = [
+                    (timestamp, _bucket(point))
+                    for timestamp, point in series.raw
+                    if start <= timestamp < end
+                ]
+            else:
+                level = self._level(series, resolution)
+                buckets = list(level.buckets(start, end))
+
+        # Windows start from the first bucket of the range
+        size = 1 if resolution == "raw" else dict(RESOLUTIONS)[resolution]
+        origin = bucket_start(start, size)
+        windows: List[Tuple[float, array]] = []
+        for timestamp, values in buckets:
+            window = origin + (timestamp - origin) // step * step
+            if windows and windows[-1][0] == window:
+                windows[-1] = (window, _merge(windows[-1][1], values))
+            else:
+                windows.append((window, values))
+        return resolution, [
+            {
+                "start": window,
+                "count": int(values[0]),
+                "sum": values[base],
+                "min": values[base + 1],
+                "max": values[base + 2],
+                "last": values[base + 3],
+            }
+            for window, values in windows
+        ]
+
+    def aggregate(
+        self,
+        keys: Sequence[Key],
+        metric: str,
+        start: float,
+        end: float,
+        step: int,
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Aggregate ``metric`` of many series over aligned windows.
+
+        Returns the window start times and, for each of ``count``, ``sum``,
+        ``min``, ``max`` and ``last``, a matrix with one row per key and one
+        column per window. Empty windows and unknown series are NaN.
+        """
+        columns = [0] + [1 + 4 * METRICS.index(metric) + i for i in range(4)]
+        resolution = self.resolution_for(step)
+        size = 1 if resolution == "raw" else dict(RESOLUTIONS)[resolution]
+        origin = bucket_start(start, size)
+        window_count = max(int(-(-(end - origin) // step)), 0)
+
+        rows, starts, blocks = [], [], []
+        with self._lock:
+            for row, key in enumerate(keys):
+                series = self._series.get(key)
+                if series is None:
+                    continue
+                if resolution == "raw":
+                    points = [(t, p) for t, p in series.raw if start <= t < end]
+                    if not points:
+                        continue
+                    times = np.array([t for t, _ in points])
+                    values = np.array([_bucket(p) for _, p in points])
+                else:
+                    level = self._level(series, resolution)
+                    first = bisect_left(level.starts, origin)
+                    last = bisect_left(level.starts, end)
+                    if first == last:
+                        continue
+                    # Copy the slices, so the stored arrays can still grow
+                    times = np.frombuffer(level.starts[first:last])
+                    values = np.frombuffer(
+                        level.values[first * STRIDE : last * STRIDE]
+                    ).reshape(-1, STRIDE)
+                rows.append(np.full(len(times), row))
+                starts.append(times)
+                blocks.append(values[:, columns])
+
+        shape = (len(keys), window_count)
+        result = {name: np.full(shape, np.nan) for name in AGGREGATES}
+        if blocks:
+            windows = ((np.concatenate(starts) - origin) // step).astype(np.int64)
+            flat = np.concatenate(rows) * window_count + windows
+            values = np.concatenate(blocks)
+            # Keys and times are ascending, so each window is one run of rows
+            run_starts = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+            run_ends = np.r_[run_starts[1:], len(flat)] - 1
+            cells = flat[run_starts]
+            for name, column, reduce in (
+                ("count", 0, np.add),
+                ("sum", 1, np.add),
+                ("min", 2, np.minimum),
+                ("max", 3, np.maximum),
+            ):
+                result[name].flat[cells] = reduce.reduceat(
+                    values[:, column], run_starts
+                )
+            result["last"].flat[cells] = values[run_ends, 4]
+        return origin + step * np.arange(window_count), result
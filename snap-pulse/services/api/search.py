@@ -0,0 +1,335 @@
+"""
+Full-text search over snap metadata.
+
+``SearchIndex`` is an in-process inverted index with one document per snap,
+built from its name, title, summary, description, categories and publisher.
+It is updated incrementally as the collector ingests records, and ranks
+matches with BM25.
+
+Query terms are matched three ways:
+
+- exactly,
+- as a prefix, for the last term of the query (autocomplete), and
+- within one edit of a known term (typos), using a deletion index: every
+  vocabulary term is stored under each string made by deleting one of its
+  characters, so candidates are found with a handful of dict lookups.
+
+Prefix and fuzzy matches score lower than exact ones.
+
+``get_state`` and ``set_state`` save and restore the postings, so the
+index survives restarts; the vocabulary and deletion index are rebuilt
+from them, and the caches below on first use.
+
+To bound query latency, each term keeps a cached impact list: its top
+``MAX_POSTINGS`` postings ordered by BM25 term weight, which is all a query
+scores. Impact lists are built on first use and then maintained in place
+as documents are added and removed.
+"""
+
+import heapq
+import math
+import re
+import threading
+import zlib
+from bisect import insort
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+from indexes import SortedList
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Field weights, applied as term frequency multipliers
+FIELD_WEIGHTS = {
+    "snap_name": 3.0,
+    "title": 3.0,
+    "summary": 2.0,
+    "categories": 1.5,
+    "publisher": 1.5,
+    "description": 1.0,
+}
+
+K1 = 1.2
+B = 0.75
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+MAX_EXPANSIONS = 10
+MAX_POSTINGS = 1000
+MIN_FUZZY_LENGTH = 4
+# Completions of prefixes up to this length are cached, since they are the
+# slowest to enumerate and the most common while typing
+CACHED_PREFIX_LENGTH = 2
+DISPLAY_FIELDS = ("title", "summary", "publisher")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _deletes(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1 :] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if ``a`` and ``b`` differ by at most one insert, delete,
+    substitution or adjacent transposition."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1 :] == b[i + 1 :] or (
+            a[i + 2 :] == b[i + 2 :] and a[i : i + 2] == b[i : i + 2][::-1]
+        )
+    return a[i:] == b[i + 1 :]
+
+
+class SearchIndex:
+    """BM25 inverted index with prefix and typo-tolerant matching."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # term -> {snap_name: weighted term frequency}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._doc_fields: Dict[str, Dict[str, object]] = {}
+        self._doc_versions: Dict[str, int] = {}
+        # term -> [(-impact, snap_name)], ascending, so best matches first
+        self._impacts: Dict[str, List[Tuple[float, str]]] = {}
+        self._total_length = 0.0
+        self._vocabulary = SortedList()
+        self._deletes: Dict[str, Set[str]] = {}
+        self._completions: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, snap_name: str, fields: Dict[str, object]) -> None:
+        """Index or re-index the document for ``snap_name``.
+
+        ``fields`` maps names in ``FIELD_WEIGHTS`` to text, or to a list of
+        strings for ``categories``. Unchanged documents are skipped.
+        """
+        fields = {**fields, "snap_name": snap_name}
+        # Stable across processes, unlike hash(), so restored documents
+        # are still skipped when unchanged
+        version = zlib.crc32(repr(sorted(fields.items())).encode("utf-8"))
+        if self._doc_versions.get(snap_name) == version:
+            return
+        terms: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            value = fields.get(field) or ""
+            if isinstance(value, (list, tuple)):
+                value = " ".join(value)
+            for token in tokenize(value):
+                terms[token] += weight
+        # Hyphenated snap names are also searchable as a single term
+        terms[snap_name.lower()] += FIELD_WEIGHTS["snap_name"]
+
+        with self._lock:
+            self._remove(snap_name)
+            for term, frequency in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._add_term(term)
+                postings[snap_name] = frequency
+            self._doc_terms[snap_name] = dict(terms)
+            self._doc_versions[snap_name] = version
+            self._doc_fields[snap_name] = {
+                field: fields.get(field, "") for field in DISPLAY_FIELDS
+            }
+            length = sum(terms.values())
+            self._doc_lengths[snap_name] = length
+            self._total_length += length
+
+            average_length = self._total_length / len(self._doc_terms)
+            for term, frequency in terms.items():
+                impacts = self._impacts.get(term)
+                if impacts is not None:
+                    impact = self._impact(frequency, length, average_length)
+                    insort(impacts, (-impact, snap_name))
+                    if len(impacts) > MAX_POSTINGS:
+                        impacts.pop()
+
+    def remove(self, snap_name: str) -> None:
+        with self._lock:
+            self._remove(snap_name)
+
+    def get_state(self) -> dict:
+        """Return the indexed documents, to persist across restarts."""
+        with self._lock:
+            return {
+                "postings": {t: dict(p) for t, p in self._postings.items()},
+                "doc_terms": dict(self._doc_terms),
+                "doc_lengths": dict(self._doc_lengths),
+                "doc_fields": dict(self._doc_fields),
+                "doc_versions": dict(self._doc_versions),
+            }
+
+    def set_state(self, state: dict) -> None:
+        """Replace the documents with a saved ``get_state``."""
+        with self._lock:
+            self._postings = state["postings"]
+            self._doc_terms = state["doc_terms"]
+            self._doc_lengths = state["doc_lengths"]
+            self._doc_fields = state["doc_fields"]
+            self._doc_versions = state["doc_versions"]
+            self._total_length = sum(self._doc_lengths.values())
+            self._impacts = {}
+            self._completions = {}
+            self._vocabulary = SortedList(self._postings)
+            self._deletes = {}
+            for term in self._postings:
+                if len(term) >= MIN_FUZZY_LENGTH:
+                    for deleted in _deletes(term):
+                        self._deletes.setdefault(deleted, set()).add(term)
+
+    def _remove(self, snap_name: str) -> None:
+        terms = self._doc_terms.pop(snap_name, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[snap_name]
+            impacts = self._impacts.get(term)
+            if impacts is not None:
+                self._unlist(term, impacts, snap_name)
+            if not postings:
+                del self._postings[term]
+                self._remove_term(term)
+        self._total_length -= self._doc_lengths.pop(snap_name)
+        del self._doc_fields[snap_name]
+        del self._doc_versions[snap_name]
+
+    def _unlist(self, term: str, impacts: List[Tuple[float, str]], snap_name: str):
+        for position, (_, name) in enumerate(impacts):
+            if name == snap_name:
+                del impacts[position]
+                break
+        # A truncated list that has shrunk too far may be missing postings
+        # beyond its old cut-off, so rebuild it on next use
+        postings = self._postings[term]
+        if len(impacts) < min(len(postings), MAX_POSTINGS // 2):
+            del self._impacts[term]
+
+    def _add_term(self, term: str) -> None:
+        self._vocabulary.add(term)
+        # A new term is rarer than the cached completions, so it only joins
+        # lists that are not full yet
+        for length in range(1, min(len(term), CACHED_PREFIX_LENGTH) + 1):
+            completions = self._completions.get(term[:length])
+            if completions is not None and len(completions) < MAX_EXPANSIONS:
+                completions.append(term)
+        if len(term) >= MIN_FUZZY_LENGTH:
+            for deleted in _deletes(term):
+                self._deletes.setdefault(deleted, set()).add(term)
+
+    def _remove_term(self, term: str) -> None:
+        self._vocabulary.remove(term)
+        self._impacts.pop(term, None)
+        for length in range(1, min(len(term), CACHED_PREFIX_LENGTH) + 1):
+            completions = self._completions.get(term[:length])
+            if completions is not None and term in completions:
+                del self._completions[term[:length]]
+        if len(term) >= MIN_FUZZY_LENGTH:
+            for deleted in _deletes(term):
+                terms = self._deletes[deleted]
+                terms.discard(term)
+                if not terms:
+                    del self._deletes[deleted]
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        cacheable = len(prefix) <= CACHED_PREFIX_LENGTH
+        if cacheable and prefix in self._completions:
+            return self._completions[prefix]
+        matches = []
+        for term in self._vocabulary.iter_after(prefix):
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        # Expand to the most common completions only, to bound query cost
+        if len(matches) > MAX_EXPANSIONS:
+            matches = heapq.nlargest(
+                MAX_EXPANSIONS, matches, key=lambda t: len(self._postings[t])
+            )
+        if cacheable:
+            self._completions[prefix] = matches
+        return matches
+
+    def _fuzzy_terms(self, token: str) -> List[str]:
+        if len(token) < MIN_FUZZY_LENGTH:
+            return []
+        candidates: Set[str] = set(self._deletes.get(token, ()))
+        for deleted in _deletes(token):
+            if deleted in self._postings:
+                candidates.add(deleted)
+            candidates.update(self._deletes.get(deleted, ()))
+        candidates.discard(token)
+        return [term for term in candidates if _within_one_edit(token, term)]
+
+    def _expand(self, token: str, is_last: bool) -> List[Tuple[str, float]]:
+        expansions = []
+        if token in self._postings:
+            expansions.append((token, 1.0))
+        if is_last:
+            expansions.extend(
+                (term, PREFIX_WEIGHT)
+                for term in self._prefix_terms(token)
+                if term != token
+            )
+        if not expansions:
+            expansions.extend((term, FUZZY_WEIGHT) for term in self._fuzzy_terms(token))
+        return expansions
+
+    @staticmethod
+    def _impact(frequency: float, length: float, average_length: float) -> float:
+        norm = K1 * (1 - B + B * length / average_length)
+        return frequency * (K1 + 1) / (frequency + norm)
+
+    def _impact_list(self, term: str, average_length: float) -> List[Tuple[float, str]]:
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            impacts = sorted(
+                (
+                    -self._impact(frequency, self._doc_lengths[name], average_length),
+                    name,
+                )
+                for name, frequency in self._postings[term].items()
+            )
+            impacts = self._impacts[term] = impacts[:MAX_POSTINGS]
+        return impacts
+
+    def search(
+        self, query: str, limit: int = 10
+    ) -> List[Tuple[str, float, Dict[str, object]]]:
+        """Return ``(snap_name, score, display fields)`` of the best matches."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if doc_count == 0:
+                return []
+            average_length = self._total_length / doc_count
+            scores: Dict[str, float] = {}
+            for position, token in enumerate(tokens):
+                is_last = position == len(tokens) - 1 and not query[-1:].isspace()
+                for term, weight in self._expand(token, is_last):
+                    df = len(self._postings[term])
+                    idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                    for impact, snap_name in self._impact_list(term, average_length):
+                        scores[snap_name] = (
+                            scores.get(snap_name, 0.0) - weight * idf * impact
+                        )
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [
+                (snap_name, round(score, 4), self._doc_fields[snap_name])
+                for snap_name, score in best
+            ]
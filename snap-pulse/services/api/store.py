@@ -0,0 +1,677 @@
+"""
+Snap data storage for the SnapPulse API.
+
+Records are sharded by snap name. Every shard has its own write lock, so
+ingests for different snaps never contend and reads never take a lock.
+Each record is stored together with its serialized ``/stats`` payload, so
+reads can return the bytes without encoding them again.
+
+Three backends are available:
+
+- ``MemoryStore`` keeps the shards in process memory. It is the default and
+  is only correct when the API runs as a single process. With a ``Journal``
+  (see persistence.py) it survives restarts.
+- ``SqliteStore`` keeps one SQLite database per shard in WAL mode under a
+  shared directory. Every uvicorn worker opens the same files, so all of them
+  see the same data. WAL gives concurrent readers, and SQLite's file lock
+  together with the per-shard lock gives a single writer per shard.
+- ``OpenSearchStore`` (see opensearch_store.py) indexes records in an
+  OpenSearch cluster with batched ``_bulk`` requests and answers
+  ``/trending`` and ``/stats/{snap_name}`` with aggregations.
+"""
+
+import heapq
+import os
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from encoding import decode_stats, encode_stats, record_payload
+from indexes import FILTER_FIELDS, SORT_FIELDS, SnapIndex, sort_value
+from models import SnapData
+from persistence import Journal
+from records import SnapRecord
+
+DEFAULT_SHARDS = 16
+# Records read per query page while looking for trending snaps
+TRENDING_PAGE = 100
+
+
+def shard_for(snap_name: str, shard_count: int) -> int:
+    """Return the shard index that owns ``snap_name``."""
+    return zlib.crc32(snap_name.encode("utf-8")) % shard_count
+
+
+def check_filters(filters: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """Return the filters that are set, rejecting unknown fields."""
+    for field in filters:
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter on {field}")
+    return {field: value for field, value in filters.items() if value is not None}
+
+
+class SnapStore:
+    """Interface shared by all storage backends.
+
+    Backends hold compact ``SnapRecord`` objects. ``get`` and ``channels``
+    convert to ``SnapData`` for the API boundary; internal consumers use
+    ``get_record`` and ``records``.
+    """
+
+    # Whether reads wait on the network; main.py then runs them off the
+    # event loop
+    blocking = False
+    # Whether other processes see the same records; the API workers then
+    # feed their models through the shared ingest feed (see feed.py)
+    shared = False
+
+    def put(self, data: SnapData) -> None:
+        raise NotImplementedError
+
+    def get_record(self, snap_name: str, channel: str) -> Optional[SnapRecord]:
+        raise NotImplementedError
+
+    def get_records(self, keys: List[Tuple[str, str]]) -> List[Optional[SnapRecord]]:
+        """Return the record of each ``(snap_name, channel)``, or None."""
+        return [self.get_record(snap_name, channel) for snap_name, channel in keys]
+
+    def get(self, snap_name: str, channel: str) -> Optional[SnapData]:
+        record = self.get_record(snap_name, channel)
+        return record.to_model() if record is not None else None
+
+    def get_payload(self, snap_name: str, channel: str) -> Optional[bytes]:
+        """Return the serialized ``/stats`` response for a record."""
+        raise NotImplementedError
+
+    def channels(self, snap_name: str) -> Dict[str, SnapData]:
+        raise NotImplementedError
+
+    def records(self) -> Iterator[SnapRecord]:
+        raise NotImplementedError
+
+    def query(
+        self,
+        filters: Dict[str, Optional[str]],
+        sort: str = "download_total",
+        descending: bool = True,
+        limit: int = 20,
+        after: Optional[tuple] = None,
+    ) -> Tuple[List[SnapRecord], Optional[tuple]]:
+        """Return a page of records matching ``filters``, ordered by ``sort``.
+
+        ``filters`` maps fields in ``FILTER_FIELDS`` to a value, or to None
+        for no filter; ``sort`` must be in ``SORT_FIELDS``. Also returns the
+        ``(value, snap_name, channel)`` item to resume after, or None on the
+        last page.
+        """
+        raise NotImplementedError
+
+    def export(
+        self,
+        filters: Dict[str, Optional[str]],
+        after: Optional[Tuple[str, str]] = None,
+    ) -> Iterator[SnapRecord]:
+        """Yield the records matching ``filters`` as of the call.
+
+        Records come in store order: by shard, then snap name and channel.
+        ``after`` resumes a previous export after the ``(snap_name,
+        channel)`` it ended with. Records ingested while the export runs
+        are not included.
+        """
+        raise NotImplementedError
+
+    def trending(self, limit: int = 10) -> List[dict]:
+        """Return the ``limit`` snaps with the highest trending score on any
+        channel, with their download growth and rating over all channels."""
+        names: Dict[str, None] = {}
+        after = None
+        while len(names) < limit:
+            records, after = self.query(
+                {}, "trending_score", True, TRENDING_PAGE, after
+            )
+            for record in records:
+                names.setdefault(record.snap_name)
+            if after is None:
+                break
+        entries = []
+        for name in list(names)[:limit]:
+            channels = list(self.channels(name).values())
+            ratings = [c.rating for c in channels if c.rating is not None]
+            entries.append(
+                trending_entry(
+                    name,
+                    max(c.trending_score for c in channels),
+                    sum(c.download_last_30_days or 0 for c in channels),
+                    sum(c.download_total or 0 for c in channels),
+                    sum(ratings) / len(ratings) if ratings else None,
+                )
+            )
+        return entries
+
+    def snap_summary(self, snap_name: str) -> Optional[dict]:
+        """Return the channels of a snap and its downloads over all of them,
+        or None if it has no records."""
+        channels = self.channels(snap_name)
+        if not channels:
+            return None
+        return {
+            "snap_name": snap_name,
+            "channels": {
+                channel: {
+                    "download_total": data.download_total,
+                    "version": data.version,
+                    "last_updated": data.last_updated.isoformat(),
+                }
+                for channel, data in channels.items()
+            },
+            "total_downloads": sum(d.download_total or 0 for d in channels.values()),
+        }
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        """Start background work, for backends that need it."""
+
+    async def stop(self) -> None:
+        """Finish background work before ``close``."""
+
+    def checkpoint(self) -> int:
+        """Persist a snapshot, for backends that need one."""
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+def trending_entry(
+    snap_name: str, score: float, recent: int, total: int, rating: Optional[float]
+) -> dict:
+    """Return the ``/trending`` entry of a snap from its channel totals.
+
+    Download growth is the last 30 days against the downloads before them.
+    Totals count the channels with published downloads only, and ``rating``
+    is None when no channel has one.
+    """
+    before = total - recent
+    return {
+        "name": snap_name,
+        "downloads_growth": round(recent / before * 100, 1) if before > 0 else 0.0,
+        "rating": round(rating, 2) if rating is not None else None,
+        "trending_score": score,
+    }
+
+
+class MemoryStore(SnapStore):
+    """Lock-striped in-process store, optionally backed by a journal.
+
+    Secondary indexes (see indexes.py) are updated on every ``put``. Records
+    loaded through ``restore`` are indexed in bulk by ``ensure_index``
+    instead. Until that build completes, puts queue their index updates for
+    it to apply afterwards and queries scan the shards, so neither waits for
+    the build.
+    """
+
+    def __init__(self, shards: int = DEFAULT_SHARDS, journal: Optional[Journal] = None):
+        self.shard_count = shards
+        self.journal = journal
+        self.index = SnapIndex()
+        self._index_ready = True
+        # Records put while the index is not ready, applied after the build
+        self._index_pending: List[SnapRecord] = []
+        self._index_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._shards: List[Dict[str, Dict[str, SnapRecord]]] = [
+            {} for _ in range(shards)
+        ]
+        # One dict per running export, holding the records replaced since it
+        # started (None for keys that did not exist yet)
+        self._exports: Tuple[Dict[Tuple[str, str], Optional[SnapRecord]], ...] = ()
+        self._exports_lock = threading.Lock()
+
+    def put(self, data: SnapData) -> None:
+        record = SnapRecord.from_model(data)
+        record.payload = encode_stats(record)
+        index = shard_for(record.snap_name, self.shard_count)
+        with self._locks[index]:
+            if self.journal is not None:
+                self.journal.append(record)
+            channels = self._shards[index].setdefault(record.snap_name, {})
+            for replaced in self._exports:
+                replaced.setdefault(
+                    (record.snap_name, record.channel), channels.get(record.channel)
+                )
+            channels[record.channel] = record
+            if not self._index_ready:
+                with self._index_lock:
+                    if not self._index_ready:
+                        self._index_pending.append(record)
+                        return
+            self.index.update(record)
+
+    def restore(self, record: SnapRecord) -> None:
+        """Insert a recovered record without writing it to the journal again.
+
+        The payload is encoded and the record indexed on first use, which
+        keeps recovery short.
+        """
+        index = shard_for(record.snap_name, self.shard_count)
+        self._shards[index].setdefault(record.snap_name, {})[record.channel] = record
+        self._index_ready = False
+
+    def ensure_index(self) -> None:
+        """Build the secondary indexes if restored records are not in them.
+
+        Puts keep going during the build; the records they queue are indexed
+        once it is done, replacing whatever version the build saw.
+        """
+        with self._build_lock:
+            if self._index_ready:
+                return
+            self.index.build(self.records())
+            with self._index_lock:
+                for record in self._index_pending:
+                    self.index.update(record)
+                self._index_pending = []
+                self._index_ready = True
+
+    def checkpoint(self) -> int:
+        if self.journal is None:
+            return 0
+        # Rotate while no put is half done, so every record appended to the
+        # segments the snapshot replaces is already in the shards, and
+        # snapshot the store as of that moment
+        with self._all_shards():
+            covered = self.journal.rotate()
+            replaced = self._start_export()
+        try:
+            return self.journal.checkpoint(self._exported(replaced, {}, None), covered)
+        finally:
+            self._end_export(replaced)
+
+    def get_record(self, snap_name: str, channel: str) -> Optional[SnapRecord]:
+        shard = self._shards[shard_for(snap_name, self.shard_count)]
+        return shard.get(snap_name, {}).get(channel)
+
+    def get_payload(self, snap_name: str, channel: str) -> Optional[bytes]:
+        record = self.get_record(snap_name, channel)
+        return record_payload(record) if record is not None else None
+
+    def channels(self, snap_name: str) -> Dict[str, SnapData]:
+        shard = self._shards[shard_for(snap_name, self.shard_count)]
+        records = list(shard.get(snap_name, {}).items())
+        return {channel: record.to_model() for channel, record in records}
+
+    def records(self) -> Iterator[SnapRecord]:
+        for shard in self._shards:
+            for channels in list(shard.values()):
+                yield from list(channels.values())
+
+    def query(
+        self,
+        filters: Dict[str, Optional[str]],
+        sort: str = "download_total",
+        descending: bool = True,
+        limit: int = 20,
+        after: Optional[tuple] = None,
+    ) -> Tuple[List[SnapRecord], Optional[tuple]]:
+        if not self._index_ready:
+            return self._scan(check_filters(filters), sort, descending, limit, after)
+        return self.index.query(filters, sort, descending, limit, after)
+
+    def _scan(
+        self,
+        filters: Dict[str, str],
+        sort: str,
+        descending: bool,
+        limit: int,
+        after: Optional[tuple],
+    ) -> Tuple[List[SnapRecord], Optional[tuple]]:
+        """Answer a query without the indexes, while they are being built."""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort on {sort}")
+        items = (
+            ((sort_value(r, sort), r.snap_name, r.channel), r)
+            for r in self.records()
+            if all(getattr(r, f) == v for f, v in filters.items())
+        )
+        if after is not None:
+            items = (i for i in items if (i[0] < after if descending else i[0] > after))
+        select = heapq.nlargest if descending else heapq.nsmallest
+        best = select(limit + 1, items, key=lambda item: item[0])
+        next_item = best[limit - 1][0] if len(best) > limit else None
+        return [record for _, record in best[:limit]], next_item
+
+    def export(
+        self,
+        filters: Dict[str, Optional[str]],
+        after: Optional[Tuple[str, str]] = None,
+    ) -> Iterator[SnapRecord]:
+        return self._export(check_filters(filters), after)
+
+    def _export(
+        self, filters: Dict[str, str], after: Optional[Tuple[str, str]]
+    ) -> Iterator[SnapRecord]:
+        # Start recording replaced records while no put is half done, so the
+        # export sees the store as of this moment without copying it
+        with self._all_shards():
+            replaced = self._start_export()
+        try:
+            yield from self._exported(replaced, filters, after)
+        finally:
+            self._end_export(replaced)
+
+    @contextmanager
+    def _all_shards(self) -> Iterator[None]:
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    def _start_export(self) -> Dict[Tuple[str, str], Optional[SnapRecord]]:
+        replaced: Dict[Tuple[str, str], Optional[SnapRecord]] = {}
+        with self._exports_lock:
+            self._exports += (replaced,)
+        return replaced
+
+    def _end_export(self, replaced: Dict[Tuple[str, str], Optional[SnapRecord]]):
+        with self._exports_lock:
+            self._exports = tuple(e for e in self._exports if e is not replaced)
+
+    def _exported(
+        self,
+        replaced: Dict[Tuple[str, str], Optional[SnapRecord]],
+        filters: Dict[str, str],
+        after: Optional[Tuple[str, str]],
+    ) -> Iterator[SnapRecord]:
+        first = shard_for(after[0], self.shard_count) if after else 0
+        for index in range(first, self.shard_count):
+            shard = self._shards[index]
+            for snap_name in sorted(list(shard)):
+                if index == first and after and snap_name < after[0]:
+                    continue
+                channels = shard[snap_name]
+                for channel in sorted(list(channels)):
+                    key = (snap_name, channel)
+                    if index == first and after and key <= after:
+                        continue
+                    # Read the live record first: a put saves the record it
+                    # replaces before storing the new one
+                    record = channels.get(channel)
+                    record = replaced.get(key, record)
+                    if record is not None and all(
+                        getattr(record, f) == v for f, v in filters.items()
+                    ):
+                        yield record
+
+    def __len__(self) -> int:
+        return sum(
+            len(channels) for shard in self._shards for channels in shard.values()
+        )
+
+    def close(self) -> None:
+        if self.journal is not None:
+            self.journal.close()
+
+
+class SqliteStore(SnapStore):
+    """Store backed by one SQLite WAL database per shard.
+
+    Filter and sort fields are stored as indexed columns next to the payload,
+    so queries run on SQLite indexes in every shard and are merged here.
+    Sort columns hold ``sort_value``, so unpublished figures sort as in the
+    other stores; reads decode the payload.
+    Connections are opened per thread, since a SQLite connection must not be
+    shared between threads.
+    """
+
+    shared = True
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS snaps (
+            snap_name TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            publisher TEXT NOT NULL,
+            confinement TEXT NOT NULL,
+            grade TEXT NOT NULL,
+            download_total INTEGER NOT NULL,
+            download_last_30_days INTEGER NOT NULL,
+            rating REAL NOT NULL,
+            trending_score REAL NOT NULL,
+            last_updated REAL NOT NULL,
+            payload BLOB NOT NULL,
+            PRIMARY KEY (snap_name, channel)
+        ) WITHOUT ROWID
+        """]
+    SCHEMA += [
+        f"CREATE INDEX IF NOT EXISTS snaps_{field} ON snaps ({field})"
+        for field in FILTER_FIELDS
+    ]
+    SCHEMA += [
+        f"CREATE INDEX IF NOT EXISTS snaps_by_{field} "
+        f"ON snaps ({field}, snap_name, channel)"
+        for field in SORT_FIELDS
+    ]
+
+    def __init__(self, directory: str, shards: int = DEFAULT_SHARDS):
+        self.directory = directory
+        self.shard_count = shards
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+        for index in range(shards):
+            for statement in self.SCHEMA:
+                self._connection(index).execute(statement)
+
+    def _path(self, index: int) -> str:
+        return os.path.join(self.directory, f"shard-{index:03d}.db")
+
+    def _connection(self, index: int) -> sqlite3.Connection:
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(index)
+        if conn is None:
+            conn = sqlite3.connect(
+                self._path(index), timeout=30.0, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            connections[index] = conn
+        return conn
+
+    def put(self, data: SnapData) -> None:
+        record = SnapRecord.from_model(data)
+        index = shard_for(record.snap_name, self.shard_count)
+        with self._locks[index]:
+            self._connection(index).execute(
+                "INSERT OR REPLACE INTO snaps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record.snap_name,
+                    record.channel,
+                    record.publisher,
+                    record.confinement,
+                    record.grade,
+                    sort_value(record, "download_total"),
+                    sort_value(record, "download_last_30_days"),
+                    sort_value(record, "rating"),
+                    record.trending_score,
+                    record.last_updated,
+                    encode_stats(record),
+                ),
+            )
+
+    def get_record(self, snap_name: str, channel: str) -> Optional[SnapRecord]:
+        payload = self.get_payload(snap_name, channel)
+        return decode_stats(payload) if payload else None
+
+    def get_payload(self, snap_name: str, channel: str) -> Optional[bytes]:
+        index = shard_for(snap_name, self.shard_count)
+        row = (
+            self._connection(index)
+            .execute(
+                "SELECT payload FROM snaps WHERE snap_name = ? AND channel = ?",
+                (snap_name, channel),
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def channels(self, snap_name: str) -> Dict[str, SnapData]:
+        index = shard_for(snap_name, self.shard_count)
+        rows = self._connection(index).execute(
+            "SELECT channel, payload FROM snaps WHERE snap_name = ?", (snap_name,)
+        )
+        return {channel: decode_stats(p).to_model() for channel, p in rows}
+
+    def records(self) -> Iterator[SnapRecord]:
+        for index in range(self.shard_count):
+            rows = self._connection(index).execute("SELECT payload FROM snaps")
+            for (payload,) in rows.fetchall():
+                yield decode_stats(payload)
+
+    def query(
+        self,
+        filters: Dict[str, Optional[str]],
+        sort: str = "download_total",
+        descending: bool = True,
+        limit: int = 20,
+        after: Optional[tuple] = None,
+    ) -> Tuple[List[SnapRecord], Optional[tuple]]:
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort on {sort}")
+        clauses, params = [], []
+        for field, value in filters.items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on {field}")
+            if value is not None:
+                clauses.append(f"{field} = ?")
+                params.append(value)
+        if after is not None:
+            clauses.append(
+                f"({sort}, snap_name, channel) {'<' if descending else '>'} (?, ?, ?)"
+            )
+            params.extend(after)
+        order = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT {sort}, snap_name, channel, payload FROM snaps"
+            + (" WHERE " + " AND ".join(clauses) if clauses else "")
+            + f" ORDER BY {sort} {order}, snap_name {order}, channel {order} LIMIT ?"
+        )
+        params.append(limit + 1)
+
+        shard_rows = [
+            self._connection(index).execute(sql, params).fetchall()
+            for index in range(self.shard_count)
+        ]
+        rows = list(
+            islice(
+                heapq.merge(*shard_rows, key=lambda row: row[:3], reverse=descending),
+                limit + 1,
+            )
+        )
+        records = [decode_stats(row[3]) for row in rows[:limit]]
+        next_item = tuple(rows[limit - 1][:3]) if len(rows) > limit else None
+        return records, next_item
+
+    def export(
+        self,
+        filters: Dict[str, Optional[str]],
+        after: Optional[Tuple[str, str]] = None,
+    ) -> Iterator[SnapRecord]:
+        return self._export(check_filters(filters), after)
+
+    def _export(
+        self, filters: Dict[str, str], after: Optional[Tuple[str, str]]
+    ) -> Iterator[SnapRecord]:
+        # Dedicated connections, since the export may be resumed on another
+        # thread. A read transaction is opened on every shard up front, so
+        # WAL keeps each one at the same point while the export runs.
+        connections = [
+            sqlite3.connect(
+                self._path(index),
+                timeout=30.0,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            for index in range(self.shard_count)
+        ]
+        first = shard_for(after[0], self.shard_count) if after else 0
+        try:
+            for conn in connections:
+                conn.execute("BEGIN")
+                conn.execute("SELECT 1 FROM snaps LIMIT 1").fetchall()
+            for index in range(first, self.shard_count):
+                clauses = [f"{field} = ?" for field in filters]
+                params: list = list(filters.values())
+                if index == first and after:
+                    clauses.append("(snap_name, channel) > (?, ?)")
+                    params.extend(after)
+                rows = connections[index].execute(
+                    "SELECT payload FROM snaps"
+                    + (" WHERE " + " AND ".join(clauses) if clauses else "")
+                    + " ORDER BY snap_name, channel",
+                    params,
+                )
+                while True:
+                    batch = rows.fetchmany(1000)
+                    if not batch:
+                        break
+                    for (payload,) in batch:
+                        yield decode_stats(payload)
+        finally:
+            for conn in connections:
+                conn.close()
+
+    def __len__(self) -> int:
+        return sum(
+            self._connection(index).execute("SELECT COUNT(*) FROM snaps").fetchone()[0]
+            for index in range(self.shard_count)
+        )
+
+    def close(self) -> None:
+        for conn in getattr(self._local, "connections", {}).values():
+            conn.close()
+        self._local.connections = {}
+
+
+def create_store() -> SnapStore:
+    """Build the store configured by ``OPENSEARCH_URL``, ``STORE_DIR``,
+    ``STORE_SHARDS`` and ``SNAPSHOT_DIR``.
+
+    ``OPENSEARCH_URL`` selects the OpenSearch store, configured further by
+    ``OPENSEARCH_INDEX``, ``OPENSEARCH_BATCH`` and ``OPENSEARCH_REFRESH``.
+
+    ``STORE_DIR`` selects the SQLite store. ``SNAPSHOT_DIR`` makes the
+    in-memory store persistent; the SQLite store is already durable and
+    ignores it.
+
+    The SQLite and OpenSearch stores can be shared by several API workers,
+    which keep their models in step through the ingest feed in the state
+    directory (see feed.py); OpenSearch has one only with ``STATE_DIR``.
+    The in-memory store belongs to a single worker.
+    """
+    url = os.getenv("OPENSEARCH_URL")
+    if url:
+        from opensearch_store import OpenSearchStore
+
+        return OpenSearchStore(
+            url,
+            index=os.getenv("OPENSEARCH_INDEX", "snaps"),
+            batch_size=int(os.getenv("OPENSEARCH_BATCH", "500")),
+            refresh_interval=os.getenv("OPENSEARCH_REFRESH", "1s"),
+        )
+    shards = int(os.getenv("STORE_SHARDS", str(DEFAULT_SHARDS)))
+    directory = os.getenv("STORE_DIR")
+    if directory:
+        return SqliteStore(directory, shards=shards)
+    snapshot_dir = os.getenv("SNAPSHOT_DIR")
+    journal = Journal(snapshot_dir) if snapshot_dir else None
+    return MemoryStore(shards=shards, journal=journal)
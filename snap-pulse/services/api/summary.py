@@ -0,0 +1,137 @@
+"""
+Catalogue summary for the dashboard's landing page.
+
+``/summary`` returns totals, the top movers by download growth, the mix of
+channels and the most recently updated records in one response. Building
+it reads every record, so it is not built per request: a background task
+in main.py rebuilds it every ``refresh_sec`` seconds, or sooner once
+``refresh_ingests`` records have been ingested since the last build, and
+requests are answered with the JSON encoded by the last build.
+"""
+
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from encoding import dumps
+from records import SnapRecord
+from store import trending_entry
+
+REFRESH_SEC = 60.0
+REFRESH_INGESTS = 1000
+# Entries in each of the top movers and recent updates
+TOP = 10
+
+
+class Summary:
+    """The last built summary, encoded, and when to build the next."""
+
+    def __init__(
+        self,
+        refresh_sec: float = REFRESH_SEC,
+        refresh_ingests: int = REFRESH_INGESTS,
+        top: int = TOP,
+    ):
+        self._lock = threading.Lock()
+        self._payload: Optional[bytes] = None
+        self._refreshed: Optional[float] = None
+        self._ingests = 0
+        self.refresh_sec = refresh_sec
+        self.refresh_ingests = refresh_ingests
+        self.top = top
+
+    @property
+    def payload(self) -> Optional[bytes]:
+        """The JSON of the last build, or None before the first."""
+        return self._payload
+
+    def ingested(self, count: int = 1) -> None:
+        with self._lock:
+            self._ingests += count
+
+    def due(self) -> bool:
+        with self._lock:
+            return (
+                self._refreshed is None
+                or self._ingests >= self.refresh_ingests
+                or time.monotonic() - self._refreshed >= self.refresh_sec
+            )
+
+    def refresh(self, records: Iterable[SnapRecord]) -> None:
+        # Ingests from here on are not all in the build; count them for the next
+        with self._lock:
+            self._ingests = 0
+        payload = dumps(build_summary(records, self.top))
+        with self._lock:
+            self._payload = payload
+            self._refreshed = time.monotonic()
+
+
+def build_summary(records: Iterable[SnapRecord], top: int = TOP) -> dict:
+    """Summarize the catalogue in one pass over its records."""
+    # Per snap: downloads over the last 30 days and in total, rating sum,
+    # count of rated channels and best trending score. Figures the Snap
+    # Store does not publish are left out of the sums
+    snaps: Dict[str, list] = {}
+    channels: Dict[str, List[int]] = {}
+    publishers = set()
+    recent: List[tuple] = []
+    for record in records:
+        snap = snaps.get(record.snap_name)
+        if snap is None:
+            snap = snaps[record.snap_name] = [0, 0, 0.0, 0, record.trending_score]
+        snap[0] += record.download_last_30_days or 0
+        snap[1] += record.download_total or 0
+        if record.rating is not None:
+            snap[2] += record.rating
+            snap[3] += 1
+        snap[4] = max(snap[4], record.trending_score)
+        channel = channels.setdefault(record.channel, [0, 0])
+        channel[0] += 1
+        channel[1] += record.download_total or 0
+        publishers.add(record.publisher)
+        item = (record.last_updated, record.snap_name, record.channel, record.version)
+        if len(recent) < top:
+            heapq.heappush(recent, item)
+        elif item > recent[0]:
+            heapq.heapreplace(recent, item)
+
+    downloads = sum(channel[1] for channel in channels.values())
+    movers = [
+        trending_entry(name, score, last_30, total, rating / count if count else None)
+        for name, (last_30, total, rating, count, score) in snaps.items()
+    ]
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "totals": {
+            "snaps": len(snaps),
+            "records": sum(channel[0] for channel in channels.values()),
+            "publishers": len(publishers),
+            "download_total": downloads,
+            "download_last_30_days": sum(snap[0] for snap in snaps.values()),
+        },
+        "top_movers": heapq.nlargest(
+            top, movers, key=lambda m: (m["downloads_growth"], m["name"])
+        ),
+        "channel_mix": {
+            name: {
+                "records": count,
+                "download_total": total,
+                "download_share": (
+                    round(total / downloads * 100, 1) if downloads else 0.0
+                ),
+            }
+            for name, (count, total) in sorted(channels.items())
+        },
+        "recent_updates": [
+            {
+                "snap_name": snap_name,
+                "channel": channel,
+                "version": version,
+                "last_updated": datetime.fromtimestamp(updated).isoformat(),
+            }
+            for updated, snap_name, channel, version in sorted(recent, reverse=True)
+        ],
+    }
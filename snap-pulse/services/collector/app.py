@@ -10,112 +10,328 @@ import datetime as dt
 import json
 import os
 import logging
-from typing import Dict, Any
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
 
 import httpx
 
+from httpcache import HttpCache
+from lifecycle import Shutdown, Spool, read_lifecycle, serve_metrics, write_lifecycle
+from partition import claim
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration
 SNAP_NAME = os.getenv("SNAP_NAME", "firefox")
+# Comma-separated snaps to track; defaults to SNAP_NAME alone
+SNAP_NAMES = [
+    name.strip()
+    for name in os.getenv("SNAP_NAMES", SNAP_NAME).split(",")
+    if name.strip()
+]
+# This unit and all collector units, set by the charm from its peer relation
+COLLECTOR_UNIT = os.getenv("COLLECTOR_UNIT", "collector/0")
+COLLECTOR_PEERS = [
+    unit for unit in os.getenv("COLLECTOR_PEERS", COLLECTOR_UNIT).split(",") if unit
+]
 INTERVAL = int(os.getenv("POLL_SEC", "1800"))  # 30 minutes default
+# Snap Store requests in flight at once
+CONCURRENCY = int(os.getenv("COLLECTOR_CONCURRENCY", "8"))
+# Records forwarded to the API per request, at most the API's
+# MAX_INGEST_BATCH: it rejects larger batches
+MAX_BATCH_SIZE = 500
+BATCH_SIZE = max(1, min(int(os.getenv("BATCH_SIZE", "50")), MAX_BATCH_SIZE))
+# Seconds after SIGTERM to finish forwarding records before spooling them
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "20"))
+# Directory for records awaiting delivery; unset drops them instead
+SPOOL_DIR = os.getenv("SPOOL_DIR")
+# Port serving /metrics, with the last shutdown timing; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8002"))
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
+# Directory for Snap Store validators and records; unset keeps them in memory
+CACHE_DIR = os.getenv("CACHE_DIR")
+CACHE_ENTRIES = int(os.getenv("CACHE_ENTRIES", "10000"))
+# Seconds after which a record the store reports unchanged is forwarded
+# again, in case the API has lost it
+CACHE_RESEND_SEC = float(os.getenv("CACHE_RESEND_SEC", "21600"))
+
 # Snap Store API base URL
-SNAP_STORE_API = "https://api.snapcraft.io/v2"
+SNAP_STORE_API = os.getenv("SNAP_STORE_API", "https://api.snapcraft.io/v2")
 
+# Returned by get_snap_info for a snap unchanged since the last cycle
+NOT_MODIFIED: Dict[str, Any] = {}
 
-async def get_snap_info(snap_name: str) -> Dict[str, Any]:
-    """Get snap information from the Snap Store API."""
-    async with httpx.AsyncClient() as client:
-        try:
-            # Get snap details
-            response = await client.get(
-                f"{SNAP_STORE_API}/snaps/info/{snap_name}",
-                headers={
-                    "Snap-Device-Series": "16",
-                    "User-Agent": "SnapPulse/1.0",
-                },
-            )
-            response.raise_for_status()
-
-            snap_data = response.json()
-            logger.info(f"Retrieved data for snap: {snap_name}")
-
-            return {
-                "snap_name": snap_name,
-                "title": snap_data.get("name", snap_name),
-                "summary": snap_data.get("summary", ""),
-                "description": snap_data.get("description", ""),
-                "publisher": snap_data.get("publisher", {}).get("display-name", ""),
-                "license": snap_data.get("license", ""),
-                "website": snap_data.get("website", ""),
-                "contact": snap_data.get("contact", ""),
-                "categories": [
-                    cat.get("name", "") for cat in snap_data.get("categories", [])
-                ],
-                "channels": list(snap_data.get("channels", {}).keys()),
-                "timestamp": dt.datetime.utcnow().isoformat(),
-                "download_size": snap_data.get("download", {}).get("size", 0),
-                "installed_size": snap_data.get("installed-size", 0),
+
+@dataclass
+class Fetched:
+    """A record to forward, and the validators to cache once it is
+    delivered."""
+
+    record: Dict[str, Any]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # A cached record forwarded again; its validators are already cached
+    resent: bool = False
+
+
+def channel_rows(snap_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten the Store's channel map into one row per (channel, arch)."""
+    rows = []
+    for entry in snap_data.get("channel-map", []):
+        channel = entry.get("channel", {})
+        track = channel.get("track", "latest")
+        name = channel.get("name", "")
+        rows.append(
+            {
+                # Qualify with the track, so "stable" reads "latest/stable"
+                "channel": name if name.startswith(f"{track}/") else f"{track}/{name}",
+                "architecture": channel.get("architecture", ""),
+                "revision": entry.get("revision", 0),
+                "version": entry.get("version", ""),
+                "size": entry.get("download", {}).get("size", 0),
+                "released_at": channel.get("released-at"),
             }
+        )
+    return rows
 
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error getting snap info: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Error getting snap info: {e}")
-            return None
 
+def primary_release(snap_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the channel-map entry that stands for the snap as a whole:
+    stable on the default track, on amd64 where there is a choice."""
+    track = snap_data.get("default-track") or "latest"
 
-async def send_to_api(data: Dict[str, Any]) -> bool:
-    """Send collected data to the API service."""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(f"{API_URL}/ingest", json=data, timeout=30.0)
-            response.raise_for_status()
-            logger.info(f"Successfully sent data to API: {data['snap_name']}")
-            return True
-
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error sending to API: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Error sending to API: {e}")
-            return False
+    def rank(entry: Dict[str, Any]):
+        channel = entry.get("channel", {})
+        return (
+            channel.get("track", "latest") != track,
+            channel.get("risk") != "stable",
+            channel.get("architecture") != "amd64",
+        )
+
+    return min(snap_data.get("channel-map", []), key=rank, default={})
+
+
+async def get_snap_info(
+    client: httpx.AsyncClient, snap_name: str, cache: HttpCache
+) -> Union[Fetched, Dict[str, Any], None]:
+    """Get snap information from the Snap Store API.
+
+    Returns ``NOT_MODIFIED`` when the store confirms the cached record is
+    still current and it was delivered less than ``CACHE_RESEND_SEC`` ago,
+    and None on errors. The caller caches the validators of a fetched
+    record once it has been delivered.
+    """
+    try:
+        # Get snap details, unless unchanged since the cached response
+        response = await client.get(
+            f"{SNAP_STORE_API}/snaps/info/{snap_name}",
+            headers={
+                "Snap-Device-Series": "16",
+                "User-Agent": "SnapPulse/1.0",
+                **cache.conditional_headers(snap_name),
+            },
+        )
+        if response.status_code == 304:
+            cache.touch(snap_name)
+            logger.info(f"Snap unchanged: {snap_name}")
+            if cache.resend_due(snap_name, CACHE_RESEND_SEC):
+                return Fetched(cache.get(snap_name), resent=True)
+            return NOT_MODIFIED
+        response.raise_for_status()
 
+        snap_data = response.json()
+        logger.info(f"Retrieved data for snap: {snap_name}")
+        channel_map = channel_rows(snap_data)
+        primary = primary_release(snap_data)
+        risk = primary.get("channel", {}).get("risk", "stable")
 
-async def collect_and_send():
-    """Main collection function - get snap data and send to API."""
-    logger.info(f"Collecting data for snap: {SNAP_NAME}")
+        record = {
+            "snap_name": snap_name,
+            "title": snap_data.get("name", snap_name),
+            "summary": snap_data.get("summary", ""),
+            "description": snap_data.get("description", ""),
+            "publisher": snap_data.get("publisher", {}).get("display-name", ""),
+            "license": snap_data.get("license", ""),
+            "website": snap_data.get("website", ""),
+            "contact": snap_data.get("contact", ""),
+            "categories": [
+                cat.get("name", "") for cat in snap_data.get("categories", [])
+            ],
+            # The release the API keeps per snap channel
+            "channel": risk,
+            "version": primary.get("version", ""),
+            "confinement": primary.get("confinement", "strict"),
+            "grade": "stable" if risk == "stable" else "devel",
+            # The public info endpoint publishes no download counts or
+            # ratings, so the record leaves them out
+            "channels": sorted({row["channel"] for row in channel_map}),
+            "channel_map": channel_map,
+            "timestamp": dt.datetime.utcnow().isoformat(),
+            "download_size": snap_data.get("download", {}).get("size", 0),
+            "installed_size": snap_data.get("installed-size", 0),
+        }
+        return Fetched(
+            record,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
 
-    snap_data = await get_snap_info(SNAP_NAME)
-    if snap_data:
-        success = await send_to_api(snap_data)
-        if success:
-            logger.info(f"Collection cycle completed successfully for {SNAP_NAME}")
-        else:
-            logger.error(f"Failed to send data for {SNAP_NAME}")
-    else:
-        logger.error(f"Failed to get data for {SNAP_NAME}")
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error getting snap info: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error getting snap info: {e}")
+        return None
+
+
+async def send_batch(
+    client: httpx.AsyncClient, batch: List[Dict[str, Any]], timeout: float = 30.0
+) -> bool:
+    """Send a batch of collected records to the API service."""
+    try:
+        response = await client.post(
+            f"{API_URL}/ingest/batch", json=batch, timeout=timeout
+        )
+        response.raise_for_status()
+        logger.info(f"Successfully sent {len(batch)} records to API")
+        return True
+
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error sending to API: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Error sending to API: {e}")
+        return False
+
+
+async def collect_and_send(
+    snap_names: List[str], shutdown: Shutdown, spool: Spool, cache: HttpCache
+):
+    """Main collection function - get snap data and send to API.
+
+    Up to ``CONCURRENCY`` snaps are fetched at once, and the records are
+    forwarded in batches of ``BATCH_SIZE``, after any spooled by an earlier
+    cycle. Snaps the store reports unchanged are not forwarded again; the
+    validators that let the store report that are only cached once their
+    record has been sent or durably spooled. Once
+    shutdown is requested no new fetch starts, and batches are
+    sent only until the shutdown deadline; the rest are spooled.
+    """
+    # One client per cycle, so fetches and batches reuse its connections
+    limits = httpx.Limits(
+        max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY
+    )
+    async with httpx.AsyncClient(limits=limits) as client:
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def fetch(snap_name: str):
+            async with semaphore:
+                if shutdown.requested:
+                    return None
+                logger.info(f"Collecting data for snap: {snap_name}")
+                return await get_snap_info(client, snap_name, cache)
+
+        results = await asyncio.gather(*(fetch(name) for name in snap_names))
+        records = spool.take()
+        # Fetched this cycle, by the id of their record
+        fetched: Dict[int, Fetched] = {}
+        unchanged = 0
+        for snap_name, snap_data in zip(snap_names, results):
+            if snap_data is NOT_MODIFIED:
+                unchanged += 1
+            elif snap_data:
+                fetched[id(snap_data.record)] = snap_data
+                records.append(snap_data.record)
+            elif not shutdown.requested:
+                logger.error(f"Failed to get data for {snap_name}")
+
+        def delivered(batch: List[Dict[str, Any]]) -> None:
+            for record in batch:
+                result = fetched.pop(id(record), None)
+                if result is None:
+                    continue
+                if result.resent:
+                    cache.delivered(record["snap_name"])
+                else:
+                    cache.put(
+                        record["snap_name"], result.etag, result.last_modified, record
+                    )
+
+        def spool_batch(batch: List[Dict[str, Any]]) -> None:
+            spool.append(batch)
+            if spool.durable:
+                delivered(batch)
+
+        sent = 0
+        for start in range(0, len(records), BATCH_SIZE):
+            batch = records[start : start + BATCH_SIZE]
+            remaining = shutdown.remaining()
+            if remaining == 0:
+                spool_batch(records[start:])
+                break
+            if await send_batch(client, batch, timeout=min(30.0, remaining or 30.0)):
+                sent += len(batch)
+                delivered(batch)
+            else:
+                logger.error(f"Failed to send a batch of {len(batch)} records")
+                spool_batch(batch)
+        # Every record taken from the spool is now delivered or spooled again
+        spool.release()
+        logger.info(
+            f"Collection cycle completed: {sent} of {len(records)} records sent, "
+            f"{unchanged} snaps unchanged"
+        )
 
 
 async def main():
     """Main collector loop."""
+    # Every unit collects its own slice of the tracked snaps
+    snap_names = claim(SNAP_NAMES, COLLECTOR_UNIT, COLLECTOR_PEERS)
+    shutdown = Shutdown(SHUTDOWN_TIMEOUT)
+    shutdown.install()
+    spool = Spool(SPOOL_DIR)
+    cache = HttpCache(CACHE_DIR, CACHE_ENTRIES)
+    # Last shutdown timings, reported by /metrics
+    lifecycle = read_lifecycle(SPOOL_DIR)
+    server = None
+    if METRICS_PORT:
+        server = await serve_metrics(METRICS_PORT, lambda: {"lifecycle": lifecycle})
+
     logger.info(f"Starting SnapPulse Collector")
-    logger.info(f"Monitoring snap: {SNAP_NAME}")
+    logger.info(
+        f"Unit {COLLECTOR_UNIT} of {len(COLLECTOR_PEERS)}: monitoring "
+        f"{len(snap_names)} of {len(SNAP_NAMES)} snaps: {', '.join(snap_names)}"
+    )
     logger.info(f"Collection interval: {INTERVAL} seconds")
+    logger.info(f"Concurrency: {CONCURRENCY}, batch size: {BATCH_SIZE}")
     logger.info(f"API endpoint: {API_URL}")
 
-    while True:
+    while not shutdown.requested:
         try:
-            await collect_and_send()
+            await collect_and_send(snap_names, shutdown, spool, cache)
         except Exception as e:
             logger.error(f"Error in collection cycle: {e}")
 
-        logger.info(f"Waiting {INTERVAL} seconds until next collection...")
-        await asyncio.sleep(INTERVAL)
+        if not shutdown.requested:
+            logger.info(f"Waiting {INTERVAL} seconds until next collection...")
+            await shutdown.sleep(INTERVAL)
+
+    cache.close()
+    elapsed = round(shutdown.elapsed(), 3)
+    logger.info(f"Shutdown completed in {elapsed} seconds")
+    if SPOOL_DIR:
+        write_lifecycle(
+            SPOOL_DIR,
+            {
+                "last_shutdown_sec": elapsed,
+                "last_shutdown_at": dt.datetime.utcnow().isoformat(),
+            },
+        )
+    if server is not None:
+        server.close()
+        await server.wait_closed()
 
 
 if __name__ == "__main__":
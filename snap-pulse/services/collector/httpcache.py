@@ -0,0 +1,136 @@
+"""
+Conditional requests to the Snap Store.
+
+``HttpCache`` keeps, per snap, the ``ETag`` and ``Last-Modified``
+validators of the last full response together with the record parsed from
+it. The next request for the snap sends them back as ``If-None-Match`` and
+``If-Modified-Since``; a 304 answer has no body, so nothing is parsed and
+the record, which the API already has, is not forwarded again.
+
+Entries are only stored once their record was delivered to the API, or
+spooled for delivery, so a 304 never hides a record the API never got.
+Each entry remembers when its record was last delivered; ``resend_due``
+tells when to forward the cached record again anyway, in case the API has
+lost it since.
+
+Entries live in one SQLite file so they survive restarts, and are bounded
+to ``max_entries``: the least recently used are evicted first. Without a
+directory the cache is kept in memory.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+CACHE_FILE = "http-cache.db"
+
+
+class HttpCache:
+    """Validators and parsed records per snap, least recently used evicted."""
+
+    def __init__(self, directory: Optional[str], max_entries: int = 10000):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, CACHE_FILE)
+        else:
+            path = ":memory:"
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "snap_name TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+            "record TEXT NOT NULL, used REAL NOT NULL, delivered REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+        if "delivered" not in columns:
+            # Caches written before delivery times were kept
+            self._conn.execute(
+                "ALTER TABLE entries ADD COLUMN delivered REAL NOT NULL DEFAULT 0"
+            )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def conditional_headers(self, snap_name: str) -> Dict[str, str]:
+        """Return the validator headers to send for ``snap_name``."""
+        row = self._conn.execute(
+            "SELECT etag, last_modified FROM entries WHERE snap_name = ?",
+            (snap_name,),
+        ).fetchone()
+        headers = {}
+        if row is not None:
+            etag, last_modified = row
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def get(self, snap_name: str) -> Optional[Dict[str, Any]]:
+        """Return the cached record of ``snap_name``, if any."""
+        row = self._conn.execute(
+            "SELECT record FROM entries WHERE snap_name = ?", (snap_name,)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def touch(self, snap_name: str) -> None:
+        """Mark ``snap_name`` as used, after a 304."""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE entries SET used = ? WHERE snap_name = ?",
+                (time.time(), snap_name),
+            )
+
+    def resend_due(self, snap_name: str, max_age: float) -> bool:
+        """Whether the record of ``snap_name`` was last delivered more than
+        ``max_age`` seconds ago."""
+        row = self._conn.execute(
+            "SELECT delivered FROM entries WHERE snap_name = ?", (snap_name,)
+        ).fetchone()
+        return row is not None and time.time() - row[0] >= max_age
+
+    def delivered(self, snap_name: str) -> None:
+        """Mark the cached record of ``snap_name`` as delivered again."""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE entries SET delivered = ? WHERE snap_name = ?",
+                (time.time(), snap_name),
+            )
+
+    def put(
+        self,
+        snap_name: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        record: Dict[str, Any],
+    ) -> None:
+        """Store the validators and record of a full response, once the
+        record has been delivered.
+
+        A response without validators cannot be revalidated, so any older
+        entry for the snap is dropped instead.
+        """
+        with self._conn:
+            if not etag and not last_modified:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE snap_name = ?", (snap_name,)
+                )
+                return
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (snap_name, etag, last_modified, "
+                "record, used, delivered) VALUES (?, ?, ?, ?, ?, ?)",
+                (snap_name, etag, last_modified, json.dumps(record), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM entries WHERE snap_name IN (SELECT snap_name "
+                "FROM entries ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def close(self) -> None:
+        self._conn.close()
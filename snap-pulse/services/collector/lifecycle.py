@@ -0,0 +1,192 @@
+"""
+Graceful shutdown for the collector.
+
+Pebble stops the collector with SIGTERM and kills it ``kill-delay`` later.
+On the signal, ``Shutdown`` is requested: the collector schedules no new
+fetches and stops waiting for the next cycle, lets the fetches in flight
+finish, and keeps forwarding records until ``timeout`` seconds after the
+signal. Records it could not forward by then, or that the API refused, are
+appended to the ``Spool`` and forwarded first in the next cycle, by this
+process or the next one.
+
+A cycle takes the spooled records by renaming the spool file to an
+in-progress file, which is only deleted once every record in it has been
+delivered or spooled again; a process killed mid-cycle leaves it to the
+next ``take``, so records may be sent twice but are not lost.
+
+How long the last shutdown took is saved next to the spool and served,
+with the other ``/metrics``, by ``serve_metrics``.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SPOOL_FILE = "spool.ndjson"
+# Spooled records taken by a cycle that has not delivered them yet
+TAKEN_FILE = "spool.ndjson.taken"
+# Last shutdown timing, kept in the spool directory
+LIFECYCLE_FILE = "lifecycle.json"
+
+
+class Shutdown:
+    """Shutdown request raised by SIGTERM or SIGINT, with a flush deadline."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.event = asyncio.Event()
+        self.started: Optional[float] = None
+
+    def install(self) -> None:
+        """Request shutdown on SIGTERM and SIGINT."""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.request)
+
+    def request(self) -> None:
+        if self.started is None:
+            logger.info("Shutdown requested")
+            self.started = time.monotonic()
+            self.event.set()
+
+    @property
+    def requested(self) -> bool:
+        return self.started is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left to flush records, or None while running."""
+        if self.started is None:
+            return None
+        return max(0.0, self.started + self.timeout - time.monotonic())
+
+    def elapsed(self) -> float:
+        """Seconds since shutdown was requested."""
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    async def sleep(self, seconds: float) -> None:
+        """Sleep for ``seconds``, waking early if shutdown is requested."""
+        try:
+            await asyncio.wait_for(self.event.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+class Spool:
+    """Records awaiting delivery, one JSON object per line in ``directory``.
+
+    With no directory the spool is disabled and spooled records are lost.
+    """
+
+    def __init__(self, directory: Optional[str]):
+        self.path = os.path.join(directory, SPOOL_FILE) if directory else None
+        self.taken_path = os.path.join(directory, TAKEN_FILE) if directory else None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def durable(self) -> bool:
+        """Whether spooled records are kept until delivered."""
+        return self.path is not None
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        if self.path is None:
+            logger.error(f"No spool directory: dropping {len(records)} records")
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        logger.info(f"Spooled {len(records)} records")
+
+    def take(self) -> List[Dict[str, Any]]:
+        """Return every spooled record, including those taken by a cycle
+        that never called ``release``. They stay on disk until it is."""
+        if self.path is None:
+            return []
+        if os.path.exists(self.path):
+            if os.path.exists(self.taken_path):
+                # Left by a killed cycle: add the newer records to it
+                with open(self.path, "rb") as src, open(self.taken_path, "ab") as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.taken_path)
+        if not os.path.exists(self.taken_path):
+            return []
+        records = []
+        with open(self.taken_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn last line from a process killed mid-write
+                    logger.warning("Skipping unreadable spooled record")
+        return records
+
+    def release(self) -> None:
+        """Forget the taken records, once each is delivered or spooled again."""
+        if self.taken_path is not None and os.path.exists(self.taken_path):
+            os.remove(self.taken_path)
+
+
+def write_lifecycle(directory: str, metrics: Dict[str, Any]) -> None:
+    """Write lifecycle ``metrics`` to ``directory`` as JSON, atomically."""
+    path = os.path.join(directory, LIFECYCLE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def read_lifecycle(directory: Optional[str]) -> Dict[str, Any]:
+    """Return the lifecycle metrics saved in ``directory``, or an empty dict."""
+    if not directory:
+        return {}
+    try:
+        with open(os.path.join(directory, LIFECYCLE_FILE), "rb") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+async def serve_metrics(port: int, metrics: Callable[[], Dict[str, Any]]):
+    """Answer ``GET /metrics`` on ``port`` with ``metrics()`` as JSON.
+
+    The collector has no web framework; this is all the HTTP it serves.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            # Skip the headers
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.decode("latin-1").split()
+            if parts[:2] == ["GET", "/metrics"]:
+                status, body = "200 OK", json.dumps(metrics()).encode("utf-8")
+            else:
+                status, body = "404 Not Found", b'{"detail": "Not Found"}'
+            head = (
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "0.0.0.0", port)
@@ -0,0 +1,33 @@
+"""
+Work partitioning between collector units.
+
+Each tracked snap is owned by exactly one collector unit, picked by
+rendezvous (highest random weight) hashing: every unit scores the snap with
+a hash of ``unit/snap`` and the highest score wins. Units therefore agree on
+ownership without talking to each other, from nothing more than the list of
+peer units. When a unit joins, only the snaps it now wins move to it; when
+one leaves, only its snaps move, spread over the remaining units.
+"""
+
+import hashlib
+from typing import Iterable, List, Sequence
+
+
+def _score(unit: str, snap_name: str) -> int:
+    digest = hashlib.blake2b(f"{unit}/{snap_name}".encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "big")
+
+
+def owner(snap_name: str, units: Sequence[str]) -> str:
+    """Return the unit that collects ``snap_name``."""
+    return max(units, key=lambda unit: _score(unit, snap_name))
+
+
+def claim(snap_names: Iterable[str], unit: str, units: Sequence[str]) -> List[str]:
+    """Return the snaps that ``unit`` collects, out of ``snap_names``.
+
+    ``units`` lists every collector unit; ``unit`` is always treated as one
+    of them. With no peers, the unit claims every snap.
+    """
+    units = sorted(set(units) | {unit})
+    return [name for name in snap_names if owner(name, units) == unit]
@@ -0,0 +1,226 @@
+"""
+Async access to the GitHub REST API for the copilot.
+
+One ``GitHubClient`` is shared by every request, so connections to the API
+are pooled and kept alive instead of being opened per ``/analyze`` call.
+
+The client follows the ``X-RateLimit-*`` headers of every response. Each
+request takes one unit of the remaining budget before it is sent; once
+only ``reserve`` units are left, requests queue until the window resets.
+A wait longer than ``max_wait`` raises ``RateLimitExceeded`` rather than
+holding the caller, and secondary rate limits (403/429 with
+``Retry-After``) are retried once after the advised delay.
+
+Repository metadata, such as the default branch, is cached for
+``REPO_TTL`` seconds.
+"""
+
+import asyncio
+import base64
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.github.com"
+REPO_TTL = 3600
+# Budget kept back for requests already in progress elsewhere
+RATE_LIMIT_RESERVE = 10
+MAX_WAIT = 60.0
+
+
+class GitHubError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"GitHub API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"GitHub rate limit exhausted for {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class RepoFile:
+    path: str
+    sha: str
+    content: str
+
+
+class RateLimit:
+    """Remaining request budget of the current rate limit window."""
+
+    def __init__(self, reserve: int = RATE_LIMIT_RESERVE, max_wait: float = MAX_WAIT):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.limit: Optional[int] = None
+        # Unknown until the first response
+        self.remaining: Optional[int] = None
+        self.reset = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Take one request from the budget, waiting for the window to
+        reset if it is down to the reserve."""
+        async with self._lock:
+            if self.remaining is not None and self.remaining <= self.reserve:
+                wait = self.reset - time.time()
+                if wait > self.max_wait:
+                    raise RateLimitExceeded(wait)
+                if wait > 0:
+                    logger.warning(f"GitHub rate limit low, pausing {wait:.1f}s")
+                    await asyncio.sleep(wait)
+                # A new window has started; its budget comes with the response
+                self.remaining = None
+            if self.remaining is not None:
+                self.remaining -= 1
+
+    def update(self, headers: httpx.Headers) -> None:
+        """Record the budget reported by a response."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        remaining, reset = int(remaining), float(reset)
+        if reset == self.reset and self.remaining is not None:
+            # Responses can arrive out of order; keep the lowest count
+            remaining = min(remaining, self.remaining)
+        self.remaining = remaining
+        self.reset = reset
+        self.limit = int(headers.get("X-RateLimit-Limit", self.limit or 0))
+
+
+class GitHubClient:
+    """Pooled, rate-limit aware client for the repository endpoints the
+    copilot uses."""
+
+    def __init__(
+        self,
+        token: str,
+        base_url: str = API_URL,
+        rate_limit: Optional[RateLimit] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.rate_limit = rate_limit or RateLimit()
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.github+json",
+                "User-Agent": "SnapPulse-Copilot/1.0",
+            },
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            transport=transport,
+        )
+        self._repos: Dict[str, Tuple[float, dict]] = {}
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request within the rate limit budget."""
+        for attempt in range(2):
+            await self.rate_limit.acquire()
+            response = await self._client.request(method, path, **kwargs)
+            self.rate_limit.update(response.headers)
+            retry_after = response.headers.get("Retry-After")
+            if response.status_code in (403, 429) and retry_after and not attempt:
+                wait = float(retry_after)
+                if wait > self.rate_limit.max_wait:
+                    raise RateLimitExceeded(wait)
+                logger.warning(f"GitHub secondary rate limit, retrying in {wait}s")
+                await asyncio.sleep(wait)
+                continue
+            break
+        if response.status_code in (403, 429) and self.rate_limit.remaining == 0:
+            raise RateLimitExceeded(max(0.0, self.rate_limit.reset - time.time()))
+        return response
+
+    async def _json(self, method: str, path: str, **kwargs) -> dict:
+        response = await self.request(method, path, **kwargs)
+        if response.is_error:
+            raise GitHubError(response.status_code, response.text)
+        return response.json()
+
+    async def repo(self, owner: str, name: str) -> dict:
+        """Return repository metadata, cached for ``REPO_TTL`` seconds."""
+        key = f"{owner}/{name}".lower()
+        cached = self._repos.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        data = await self._json("GET", f"/repos/{owner}/{name}")
+        self._repos[key] = (time.monotonic() + REPO_TTL, data)
+        return data
+
+    async def get_file(
+        self, owner: str, name: str, path: str, ref: str
+    ) -> Optional[RepoFile]:
+        """Return a file of the repository at ``ref``, or None if absent."""
+        response = await self.request(
+            "GET", f"/repos/{owner}/{name}/contents/{path}", params={"ref": ref}
+        )
+        if response.status_code == 404:
+            return None
+        if response.is_error:
+            raise GitHubError(response.status_code, response.text)
+        data = response.json()
+        if not isinstance(data, dict) or data.get("type") != "file":
+            return None
+        content = base64.b64decode(data["content"]).decode("utf-8")
+        return RepoFile(data["path"], data["sha"], content)
+
+    async def find_file(
+        self, owner: str, name: str, paths: Iterable[str], ref: str
+    ) -> Optional[RepoFile]:
+        """Fetch every candidate path at once and return the first, in the
+        order given, that exists."""
+        files = await asyncio.gather(
+            *(self.get_file(owner, name, path, ref) for path in paths)
+        )
+        return next((f for f in files if f is not None), None)
+
+    async def branch_sha(self, owner: str, name: str, branch: str) -> str:
+        data = await self._json("GET", f"/repos/{owner}/{name}/git/ref/heads/{branch}")
+        return data["object"]["sha"]
+
+    async def create_branch(self, owner: str, name: str, branch: str, sha: str) -> None:
+        await self._json(
+            "POST",
+            f"/repos/{owner}/{name}/git/refs",
+            json={"ref": f"refs/heads/{branch}", "sha": sha},
+        )
+
+    async def update_file(
+        self,
+        owner: str,
+        name: str,
+        repo_file: RepoFile,
+        content: str,
+        branch: str,
+        message: str,
+    ) -> None:
+        await self._json(
+            "PUT",
+            f"/repos/{owner}/{name}/contents/{repo_file.path}",
+            json={
+                "message": message,
+                "content": base64.b64encode(content.encode("utf-8")).decode("ascii"),
+                "sha": repo_file.sha,
+                "branch": branch,
+            },
+        )
+
+    async def create_pull(
+        self, owner: str, name: str, title: str, body: str, head: str, base: str
+    ) -> dict:
+        return await self._json(
+            "POST",
+            f"/repos/{owner}/{name}/pulls",
+            json={"title": title, "body": body, "head": head, "base": base},
+        )
@@ -1,58 +1,52 @@
 import os
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+from datetime import datetime, timezone
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from github import Github
-import yaml
-import tempfile
+from github_client import (
+    API_URL,
+    GitHubClient,
+    GitHubError,
+    RateLimitExceeded,
+    RepoFile,
+)
+from results import ResultStore, StoredAnalysis
+from rules import Analysis, analyze, score
 import logging
-from typing import Dict, Any
-import requests
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="SnapPulse Copilot", version="1.0.0")
+# Shared GitHub client, created on the first /analyze (see github_client.py)
+github: Optional[GitHubClient] = None
+# Past analyses by repository and snapcraft.yaml SHA (see results.py)
+results = ResultStore(os.getenv("RESULTS_DIR"))
 
-# Use a lighter model for better performance
-MODEL_NAME = "microsoft/DialoGPT-small"  # Smaller than medium, faster startup
 
-# Configure 4-bit quantization for efficiency
-bnb_config = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_quant_type="nf4",
-    bnb_4bit_compute_dtype=torch.float16,
-    bnb_4bit_use_double_quant=True,
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if github is not None:
+        await github.aclose()
+    results.close()
 
-# Load model and tokenizer (using a smaller model for demo)
-MODEL_NAME = "microsoft/DialoGPT-medium"  # Using a smaller model for demo purposes
-tokenizer = None
-model = None
 
+app = FastAPI(title="SnapPulse Copilot", version="1.0.0", lifespan=lifespan)
 
-def load_model():
-    global tokenizer, model
-    try:
-        logger.info("Loading model and tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-        tokenizer.pad_token = tokenizer.eos_token
-
-        # For demo purposes, we'll use CPU inference
-        model = AutoModelForCausalLM.from_pretrained(
-            MODEL_NAME,
-            torch_dtype=torch.float16,
-            device_map="auto" if torch.cuda.is_available() else None,
-        )
-        logger.info("Model loaded successfully")
-    except Exception as e:
-        logger.error(f"Error loading model: {e}")
-        # For demo, we'll continue without the model
-
+# Suggestions per analysis, as asked of the model in PROMPT_TEMPLATE
+MAX_SUGGESTIONS = 3
+# Analyses per page of /analyses/{owner}/{repo}
+DEFAULT_HISTORY = 20
+MAX_HISTORY = 100
 
-# Load model on startup
-load_model()
+# Locations snapcraft reads the project file from, in order of precedence
+SNAPCRAFT_PATHS = (
+    "snapcraft.yaml",
+    "snap/snapcraft.yaml",
+    "build-aux/snap/snapcraft.yaml",
+    ".snapcraft.yaml",
+)
 
 
 class SnapcraftAnalysisRequest(BaseModel):
@@ -66,6 +60,8 @@ class SnapcraftSuggestion(BaseModel):
     description: str
     yaml_patch: str
     reasoning: str
+    # Rule that produced the suggestion; None for the generic suggestions
+    rule: Optional[str] = None
 
 
 PROMPT_TEMPLATE = """You are SnapCraftCopilot, an expert in Snapcraft package optimization.
@@ -89,10 +85,11 @@ Respond with actionable YAML changes."""
 
 
 def generate_suggestions(snapcraft_yaml: str) -> list[SnapcraftSuggestion]:
-    """Generate optimization suggestions for a snapcraft.yaml file."""
+    """Generate optimization suggestions for a snapcraft.yaml file.
 
-    # For demo purposes, return mock suggestions
-    # In production, this would use the actual model
+    These are generic examples: no model answers PROMPT_TEMPLATE yet, so
+    none is loaded.
+    """
     suggestions = [
         SnapcraftSuggestion(
             title="Optimize build dependencies",
@@ -140,78 +137,117 @@ def generate_suggestions(snapcraft_yaml: str) -> list[SnapcraftSuggestion]:
     return suggestions
 
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "model_loaded": model is not None}
+def suggest(
+    snapcraft_yaml: str, analysis: Optional[Analysis] = None
+) -> List[SnapcraftSuggestion]:
+    """Suggest up to ``MAX_SUGGESTIONS`` changes to a snapcraft.yaml.
 
+    The rules in rules.py answer in milliseconds. Generic suggestions are
+    only added when they do not cover the file and found too few changes
+    themselves.
+    ``analysis`` is the rules' analysis of the file, if already run.
+    """
+    if analysis is None:
+        analysis = analyze(snapcraft_yaml)
+    suggestions = [
+        SnapcraftSuggestion(
+            title=finding.title,
+            description=finding.description,
+            yaml_patch=finding.yaml_patch,
+            reasoning=finding.reasoning,
+            rule=finding.rule,
+        )
+        for finding in analysis.findings
+    ]
+    if analysis.covered or len(suggestions) >= MAX_SUGGESTIONS:
+        return suggestions[:MAX_SUGGESTIONS]
+    return (suggestions + generate_suggestions(snapcraft_yaml))[:MAX_SUGGESTIONS]
 
-@app.post("/analyze")
-async def analyze_snapcraft(request: SnapcraftAnalysisRequest) -> dict:
-    """Analyze a snapcraft.yaml and generate optimization suggestions."""
-    try:
-        # Get GitHub token
-        github_token = os.environ.get("GITHUB_TOKEN")
-        if not github_token:
-            raise HTTPException(status_code=400, detail="GitHub token not configured")
-
-        # Initialize GitHub client
-        g = Github(github_token)
 
-        # Parse repository URL to get owner/repo
-        repo_parts = request.repository_url.replace("https://github.com/", "").split(
-            "/"
-        )
-        if len(repo_parts) < 2:
-            raise HTTPException(status_code=400, detail="Invalid repository URL")
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy"}
 
-        owner, repo_name = repo_parts[0], repo_parts[1]
-        repo = g.get_repo(f"{owner}/{repo_name}")
 
-        # Fetch current snapcraft.yaml
-        try:
-            snapcraft_file = repo.get_contents("snapcraft.yaml")
-            current_yaml = snapcraft_file.decoded_content.decode("utf-8")
-        except:
-            try:
-                snapcraft_file = repo.get_contents("snap/snapcraft.yaml")
-                current_yaml = snapcraft_file.decoded_content.decode("utf-8")
-            except:
-                raise HTTPException(
-                    status_code=404, detail="snapcraft.yaml not found in repository"
-                )
+def parse_repository(repository_url: str) -> Tuple[str, str]:
+    """Return the owner and name of a GitHub repository URL."""
+    repo_parts = repository_url.replace("https://github.com/", "").split("/")
+    if len(repo_parts) < 2 or not all(repo_parts[:2]):
+        raise HTTPException(status_code=400, detail="Invalid repository URL")
+    return repo_parts[0], repo_parts[1].removesuffix(".git")
 
-        # Generate suggestions
-        suggestions = generate_suggestions(current_yaml)
 
-        # Create a branch and PR with improvements
-        main_branch = repo.get_branch("main")
-        new_branch_name = f"snappulse-optimization-{request.issue_number}"
+def repository_key(owner: str, repo_name: str) -> str:
+    """Return the key analyses of a repository are stored under; GitHub
+    names are case-insensitive."""
+    return f"{owner}/{repo_name}".lower()
 
-        try:
-            # Create new branch
-            repo.create_git_ref(
-                ref=f"refs/heads/{new_branch_name}", sha=main_branch.commit.sha
-            )
 
-            # Apply the first suggestion as an example
-            if suggestions:
-                improved_yaml = apply_yaml_patch(
-                    current_yaml, suggestions[0].yaml_patch
-                )
+def timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-                # Update the file
-                repo.update_file(
-                    path=snapcraft_file.path,
-                    message=f"SnapPulse optimization: {suggestions[0].title}",
-                    content=improved_yaml,
-                    sha=snapcraft_file.sha,
-                    branch=new_branch_name,
-                )
 
-                # Create PR
-                pr = repo.create_pull(
-                    title=f"🚀 SnapPulse optimization suggestions (Issue #{request.issue_number})",
-                    body=f"""## SnapPulse Optimization Report
+def analysis_response(
+    stored: StoredAnalysis, repository_url: str, cached: bool
+) -> dict:
+    response = {
+        "suggestions": stored.suggestions,
+        "score": stored.score,
+        "repository_url": repository_url,
+        "snapcraft_path": stored.path,
+        "snapcraft_sha": stored.sha,
+        "analysis_timestamp": timestamp(stored.analyzed_at),
+        "cached": cached,
+    }
+    if stored.pr_url is not None:
+        response.update(status="success", pr_url=stored.pr_url)
+    return response
+
+
+def get_github() -> GitHubClient:
+    """Return the shared GitHub client, created on first use."""
+    global github
+    github_token = os.environ.get("GITHUB_TOKEN")
+    if not github_token:
+        raise HTTPException(status_code=400, detail="GitHub token not configured")
+    if github is None:
+        github = GitHubClient(
+            github_token, base_url=os.environ.get("GITHUB_API_URL", API_URL)
+        )
+    return github
+
+
+async def open_pull_request(
+    client: GitHubClient,
+    owner: str,
+    repo_name: str,
+    base: str,
+    snapcraft_file: RepoFile,
+    suggestions: List[SnapcraftSuggestion],
+    issue_number: int,
+) -> str:
+    """Commit the first suggestion to a new branch and open a PR for it."""
+    new_branch_name = f"snappulse-optimization-{issue_number}"
+    base_sha = await client.branch_sha(owner, repo_name, base)
+    await client.create_branch(owner, repo_name, new_branch_name, base_sha)
+
+    # Apply the first suggestion as an example
+    improved_yaml = apply_yaml_patch(snapcraft_file.content, suggestions[0].yaml_patch)
+    await client.update_file(
+        owner,
+        repo_name,
+        snapcraft_file,
+        improved_yaml,
+        branch=new_branch_name,
+        message=f"SnapPulse optimization: {suggestions[0].title}",
+    )
+
+    additional = "\n".join(f"- **{s.title}**: {s.description}" for s in suggestions[1:])
+    pr = await client.create_pull(
+        owner,
+        repo_name,
+        title=f"🚀 SnapPulse optimization suggestions (Issue #{issue_number})",
+        body=f"""## SnapPulse Optimization Report
 
 This PR contains optimization suggestions for your snapcraft.yaml:
 
@@ -221,35 +257,125 @@ This PR contains optimization suggestions for your snapcraft.yaml:
 **Reasoning:** {suggestions[0].reasoning}
 
 ### Additional Suggestions:
-"""
-                    + "\n".join(
-                        [f"- **{s.title}**: {s.description}" for s in suggestions[1:]]
-                    ),
-                    head=new_branch_name,
-                    base="main",
-                )
+{additional}""",
+        head=new_branch_name,
+        base=base,
+    )
+    return pr["html_url"]
+
+
+@app.post("/analyze")
+async def analyze_snapcraft(request: SnapcraftAnalysisRequest) -> dict:
+    """Analyze a snapcraft.yaml and generate optimization suggestions."""
+    try:
+        client = get_github()
+        owner, repo_name = parse_repository(request.repository_url)
+
+        # Find the snapcraft.yaml on the default branch, probing every
+        # location snapcraft accepts at once
+        repo = await client.repo(owner, repo_name)
+        default_branch = repo["default_branch"]
+        snapcraft_file = await client.find_file(
+            owner, repo_name, SNAPCRAFT_PATHS, default_branch
+        )
+        if snapcraft_file is None:
+            raise HTTPException(
+                status_code=404, detail="snapcraft.yaml not found in repository"
+            )
+
+        # An unchanged file keeps its SHA, and its last analysis still holds
+        key = repository_key(owner, repo_name)
+        stored = results.find(key, snapcraft_file.sha)
+        if stored is not None:
+            return analysis_response(stored, request.repository_url, cached=True)
+
+        # Generate suggestions
+        analysis = analyze(snapcraft_file.content)
+        suggestions = suggest(snapcraft_file.content, analysis)
 
-                return {
-                    "status": "success",
-                    "pr_url": pr.html_url,
-                    "suggestions": [s.dict() for s in suggestions],
-                    "repository_url": request.repository_url,
-                    "analysis_timestamp": "2025-07-11T00:00:00Z",
-                }
-        except Exception as git_error:
-            logger.error(f"Git operations failed: {git_error}")
-            # Fallback to just returning suggestions
-            pass
-
-        return {
-            "suggestions": [s.dict() for s in suggestions],
-            "repository_url": request.repository_url,
-            "analysis_timestamp": "2025-07-11T00:00:00Z",
-        }
+        # Create a branch and PR with improvements
+        pr_url = None
+        if suggestions:
+            try:
+                pr_url = await open_pull_request(
+                    client,
+                    owner,
+                    repo_name,
+                    default_branch,
+                    snapcraft_file,
+                    suggestions,
+                    request.issue_number,
+                )
+            except (GitHubError, RateLimitExceeded) as git_error:
+                logger.error(f"Git operations failed: {git_error}")
+                # Fallback to just returning suggestions
+
+        stored = results.add(
+            key,
+            snapcraft_file.path,
+            snapcraft_file.sha,
+            score(analysis.findings),
+            [s.model_dump() for s in suggestions],
+            pr_url,
+        )
+        return analysis_response(stored, request.repository_url, cached=False)
+    except HTTPException:
+        raise
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="GitHub rate limit exhausted",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
+    except GitHubError as e:
+        status_code = 404 if e.status_code == 404 else 502
+        raise HTTPException(status_code=status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@app.get("/analyses/{owner}/{repo_name}")
+async def analysis_history(
+    owner: str,
+    repo_name: str,
+    limit: int = DEFAULT_HISTORY,
+    before: Optional[int] = None,
+):
+    """Past analyses of a repository, newest first, with the trend of its
+    score. Pass ``next_before`` as ``before`` for the next page."""
+    if not 1 <= limit <= MAX_HISTORY:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be between 1 and {MAX_HISTORY}"
+        )
+    analyses, next_before = results.history(
+        repository_key(owner, repo_name), limit, before
+    )
+    if not analyses and before is None:
+        raise HTTPException(status_code=404, detail="Repository not analyzed yet")
+    trend = [
+        {"analysis_timestamp": timestamp(a.analyzed_at), "score": a.score}
+        for a in reversed(analyses)
+    ]
+    return {
+        "repository": f"{owner}/{repo_name}",
+        "analyses": [
+            {
+                "id": a.id,
+                "analysis_timestamp": timestamp(a.analyzed_at),
+                "snapcraft_path": a.path,
+                "snapcraft_sha": a.sha,
+                "score": a.score,
+                "suggestions": a.suggestions,
+                "pr_url": a.pr_url,
+            }
+            for a in analyses
+        ],
+        "score_trend": trend,
+        "score_change": trend[-1]["score"] - trend[0]["score"] if trend else 0,
+        "next_before": next_before,
+    }
+
+
 def apply_yaml_patch(original_yaml: str, patch: str) -> str:
     """Apply a YAML patch to the original content."""
     try:
@@ -309,8 +435,6 @@ async def root():
     return {
         "message": "SnapPulse Copilot",
         "version": "1.0.0",
-        "model": MODEL_NAME,
-        "model_loaded": model is not None,
     }
 
 
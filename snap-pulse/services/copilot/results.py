@@ -0,0 +1,138 @@
+"""
+Stored analyses per repository.
+
+Every ``/analyze`` result is kept with the repository, the path and blob
+SHA of the snapcraft.yaml it analyzed, its health score (see
+``rules.score``) and the pull request opened for it. GitHub gives each
+version of a file its own SHA, so an analysis found for the repository's
+current SHA is still valid and is returned instead of analyzing again.
+
+Results live in one SQLite file, indexed on (repository, SHA) for those
+lookups and on (repository, id) for the newest-first history of a
+repository. Without a directory the store is kept in memory.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+RESULTS_FILE = "analyses.db"
+
+
+@dataclass
+class StoredAnalysis:
+    id: int
+    repository: str
+    path: str
+    sha: str
+    analyzed_at: float
+    score: int
+    suggestions: List[Dict[str, Any]]
+    pr_url: Optional[str]
+
+
+class ResultStore:
+    """Analyses by repository and file SHA."""
+
+    def __init__(self, directory: Optional[str]):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, RESULTS_FILE)
+        else:
+            path = ":memory:"
+        # Handlers may run on different threads; the lock serializes them
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "id INTEGER PRIMARY KEY, repository TEXT NOT NULL, "
+                "path TEXT NOT NULL, sha TEXT NOT NULL, analyzed_at REAL NOT NULL, "
+                "score INTEGER NOT NULL, suggestions TEXT NOT NULL, pr_url TEXT)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_sha ON analyses (repository, sha)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_history "
+                "ON analyses (repository, id)"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def find(self, repository: str, sha: str) -> Optional[StoredAnalysis]:
+        """Return the latest analysis of ``repository`` at file ``sha``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM analyses WHERE repository = ? AND sha = ? "
+                "ORDER BY id DESC LIMIT 1",
+                (repository, sha),
+            ).fetchone()
+        return _analysis(row) if row is not None else None
+
+    def add(
+        self,
+        repository: str,
+        path: str,
+        sha: str,
+        score: int,
+        suggestions: List[Dict[str, Any]],
+        pr_url: Optional[str],
+    ) -> StoredAnalysis:
+        """Store an analysis and return it."""
+        analyzed_at = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO analyses (repository, path, sha, analyzed_at, score, "
+                "suggestions, pr_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    repository,
+                    path,
+                    sha,
+                    analyzed_at,
+                    score,
+                    json.dumps(suggestions),
+                    pr_url,
+                ),
+            )
+        return StoredAnalysis(
+            cursor.lastrowid,
+            repository,
+            path,
+            sha,
+            analyzed_at,
+            score,
+            suggestions,
+            pr_url,
+        )
+
+    def history(
+        self, repository: str, limit: int = 20, before: Optional[int] = None
+    ) -> Tuple[List[StoredAnalysis], Optional[int]]:
+        """Return up to ``limit`` analyses of ``repository``, newest first,
+        older than the analysis id ``before``; and the id to pass as
+        ``before`` for the next page, or None on the last page."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM analyses WHERE repository = ? AND id < ? "
+                "ORDER BY id DESC LIMIT ?",
+                (repository, before if before is not None else 2**63 - 1, limit + 1),
+            ).fetchall()
+        analyses = [_analysis(row) for row in rows[:limit]]
+        return analyses, analyses[-1].id if len(rows) > limit else None
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _analysis(row: tuple) -> StoredAnalysis:
+    id_, repository, path, sha, analyzed_at, score, suggestions, pr_url = row
+    return StoredAnalysis(
+        id_, repository, path, sha, analyzed_at, score, json.loads(suggestions), pr_url
+    )
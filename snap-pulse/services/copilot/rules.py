@@ -0,0 +1,365 @@
+"""
+Rule-based analysis of snapcraft.yaml.
+
+Most useful suggestions need no model: a build package the part's plugin
+already installs, a stage package the base snap already ships, or a plug
+granting far more than the app needs can be read straight off the parsed
+YAML. Each check is a function registered with ``@rule``; it receives the
+parsed project and yields ``Finding``s, whose ``yaml_patch`` is the
+corrected fragment of the file.
+
+Rules look packages up in tables built once at import:
+
+- ``BASE_PACKAGES``: packages shipped in each base snap, limited to those
+  projects commonly stage by mistake, and
+- ``PLUGIN_BUILD_PACKAGES``: packages each plugin installs for its build.
+
+YAML may put a list or mapping where a name belongs, or a single name or
+number where a list of names belongs. Rules read ``base`` and ``plugin``
+through ``_name`` and package and plug lists through ``_names``, which
+takes a single name as a list of one; the ``malformed-names`` rule reports
+the values neither accepts.
+
+``analyze`` reports whether the rules covered the file: it parsed, its
+base has a package table and every part uses a plugin the rules know. Only
+files that are not covered need the model. ``score`` rates a file from its
+findings, each rule taking off its registered weight.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+import yaml
+
+# libyaml when available; several times faster than the Python parser
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+_CORE_PACKAGES = frozenset(
+    {
+        "bash",
+        "ca-certificates",
+        "coreutils",
+        "libacl1",
+        "libapparmor1",
+        "libattr1",
+        "libblkid1",
+        "libbz2-1.0",
+        "libc6",
+        "libcap2",
+        "libgcrypt20",
+        "libgpg-error0",
+        "liblz4-1",
+        "liblzma5",
+        "libmount1",
+        "libseccomp2",
+        "libselinux1",
+        "libstdc++6",
+        "libsystemd0",
+        "libudev1",
+        "libuuid1",
+        "libzstd1",
+        "tzdata",
+        "zlib1g",
+    }
+)
+BASE_PACKAGES: Dict[str, frozenset] = {
+    "core18": _CORE_PACKAGES
+    | {"libffi6", "libgcc1", "libncursesw5", "libpcre3", "libssl1.1", "libtinfo5"},
+    "core20": _CORE_PACKAGES
+    | {
+        "libffi7",
+        "libgcc-s1",
+        "libncursesw6",
+        "libpcre2-8-0",
+        "libpcre3",
+        "libssl1.1",
+        "libtinfo6",
+    },
+    "core22": _CORE_PACKAGES
+    | {"libffi8", "libgcc-s1", "libncursesw6", "libpcre2-8-0", "libssl3", "libtinfo6"},
+    "core24": _CORE_PACKAGES
+    | {
+        "libffi8",
+        "libgcc-s1",
+        "libncursesw6",
+        "libpcre2-8-0",
+        "libssl3t64",
+        "libtinfo6",
+    },
+}
+
+PLUGIN_BUILD_PACKAGES: Dict[str, frozenset] = {
+    "autotools": frozenset({"autoconf", "automake", "autopoint", "gcc", "libtool"}),
+    "cmake": frozenset({"cmake", "gcc"}),
+    "dump": frozenset(),
+    "go": frozenset({"gcc"}),
+    "make": frozenset({"gcc", "make"}),
+    "nil": frozenset(),
+    "python": frozenset({"findutils", "python3-dev", "python3-venv"}),
+}
+
+# Interface -> narrower interface to use instead (None: drop it), and why
+BROAD_PLUGS: Dict[str, tuple] = {
+    "home": (
+        "personal-files",
+        "home gives access to every non-hidden file in the user's home; a "
+        "personal-files plug names only the paths the app uses",
+    ),
+    "network-control": (
+        "network",
+        "network-control can reconfigure the host's networking, while most "
+        "apps only need network",
+    ),
+    "system-files": (
+        "personal-files",
+        "system-files exposes host paths outside the snap; prefer per-user "
+        "files or a content interface",
+    ),
+    "process-control": (
+        None,
+        "process-control can signal and renice any process on the system",
+    ),
+    "kernel-module-control": (
+        None,
+        "kernel-module-control can load arbitrary kernel modules",
+    ),
+    "snapd-control": (
+        None,
+        "snapd-control can install and remove snaps and is rarely granted",
+    ),
+}
+
+
+@dataclass
+class Finding:
+    rule: str
+    title: str
+    description: str
+    yaml_patch: str
+    reasoning: str
+
+
+@dataclass
+class Analysis:
+    findings: List[Finding] = field(default_factory=list)
+    # Whether the rules understood the whole file
+    covered: bool = False
+
+
+Rule = Callable[[dict], Iterable[Finding]]
+RULES: Dict[str, Rule] = {}
+# Points a finding of each rule takes off the health score
+WEIGHTS: Dict[str, int] = {}
+DEFAULT_WEIGHT = 10
+MAX_SCORE = 100
+
+
+def rule(name: str, weight: int = DEFAULT_WEIGHT) -> Callable[[Rule], Rule]:
+    """Register a rule under ``name``; rules run in registration order.
+    Each finding of the rule takes ``weight`` points off the score."""
+
+    def register(check: Rule) -> Rule:
+        RULES[name] = check
+        WEIGHTS[name] = weight
+        return check
+
+    return register
+
+
+def _patch(fragment: dict) -> str:
+    return yaml.safe_dump(fragment, sort_keys=False, default_flow_style=False)
+
+
+def _name(value) -> Optional[str]:
+    """Return ``value`` if it is a string, which table lookups need."""
+    return value if isinstance(value, str) else None
+
+
+def _names(packages) -> List[str]:
+    """Return the names listed in ``packages``; a single name is a list of
+    one, and anything else lists none."""
+    if isinstance(packages, str):
+        return [packages]
+    if not isinstance(packages, list):
+        return []
+    # Entries may also be "on <arch>" / "to <arch>" mappings; leave those be
+    return [p for p in packages if isinstance(p, str)]
+
+
+def _is_names(value) -> bool:
+    """Whether ``value`` is absent or something ``_names`` reads."""
+    return value is None or isinstance(value, (str, list))
+
+
+def _parts(project: dict) -> Dict[str, dict]:
+    parts = project.get("parts")
+    if not isinstance(parts, dict):
+        return {}
+    return {name: part for name, part in parts.items() if isinstance(part, dict)}
+
+
+@rule("redundant-build-packages", weight=5)
+def redundant_build_packages(project: dict) -> Iterable[Finding]:
+    for name, part in _parts(project).items():
+        packages = _names(part.get("build-packages"))
+        provided = PLUGIN_BUILD_PACKAGES.get(_name(part.get("plugin")), frozenset())
+        kept, redundant = [], []
+        for package in packages:
+            (redundant if package in provided or package in kept else kept).append(
+                package
+            )
+        if redundant:
+            yield Finding(
+                "redundant-build-packages",
+                f"Remove redundant build packages from {name}",
+                f"Drop {', '.join(redundant)} from build-packages",
+                _patch({"parts": {name: {"build-packages": kept}}}),
+                f"The {part.get('plugin')} plugin already installs these, or "
+                "they are listed twice",
+            )
+
+
+@rule("base-stage-packages", weight=10)
+def base_stage_packages(project: dict) -> Iterable[Finding]:
+    shipped = BASE_PACKAGES.get(_name(project.get("base")))
+    if shipped is None:
+        return
+    for name, part in _parts(project).items():
+        packages = _names(part.get("stage-packages"))
+        redundant = [p for p in packages if p in shipped]
+        if redundant:
+            kept = [p for p in packages if p not in shipped]
+            yield Finding(
+                "base-stage-packages",
+                f"Stop staging packages {project['base']} already ships",
+                f"Drop {', '.join(redundant)} from the stage-packages of {name}",
+                _patch({"parts": {name: {"stage-packages": kept}}}),
+                f"{project['base']} provides these at runtime, so staging them "
+                "only grows the snap",
+            )
+
+
+@rule("broad-plugs", weight=25)
+def broad_plugs(project: dict) -> Iterable[Finding]:
+    apps = project.get("apps")
+    if not isinstance(apps, dict):
+        return
+    patched, found = {}, []
+    for name, app in apps.items():
+        plugs = _names(app.get("plugs") if isinstance(app, dict) else None)
+        broad = [p for p in plugs if p in BROAD_PLUGS]
+        if not broad:
+            continue
+        narrowed = []
+        for plug in plugs:
+            replacement = BROAD_PLUGS[plug][0] if plug in BROAD_PLUGS else plug
+            if replacement is not None and replacement not in narrowed:
+                narrowed.append(replacement)
+        patched[name] = {"plugs": narrowed}
+        found.extend(p for p in broad if p not in found)
+    if found:
+        yield Finding(
+            "broad-plugs",
+            "Tighten confinement with specific plugs",
+            f"Replace or drop the broad {', '.join(found)} "
+            f"plug{'s' if len(found) > 1 else ''}",
+            _patch({"apps": patched}),
+            "; ".join(BROAD_PLUGS[p][1] for p in found),
+        )
+
+
+@rule("devmode-stable", weight=30)
+def devmode_stable(project: dict) -> Iterable[Finding]:
+    if project.get("confinement") == "devmode" and project.get("grade") == "stable":
+        yield Finding(
+            "devmode-stable",
+            "Use strict confinement for a stable grade snap",
+            "Switch confinement from devmode to strict",
+            _patch({"confinement": "strict"}),
+            "Snaps in devmode cannot be released to the stable channel",
+        )
+
+
+@rule("malformed-names", weight=20)
+def malformed_names(project: dict) -> Iterable[Finding]:
+    base = project.get("base")
+    if base is not None and _name(base) is None:
+        yield _malformed_name("base", "", base, lambda name: {"base": name})
+    for name, part in _parts(project).items():
+        plugin = part.get("plugin")
+        if plugin is not None and _name(plugin) is None:
+            yield _malformed_name(
+                "plugin",
+                f" of {name}",
+                plugin,
+                lambda plugin, name=name: {"parts": {name: {"plugin": plugin}}},
+            )
+        for key in ("build-packages", "stage-packages"):
+            if not _is_names(part.get(key)):
+                yield _malformed_list(key, f" of {name}", part[key])
+    apps = project.get("apps")
+    for name, app in (apps if isinstance(apps, dict) else {}).items():
+        if isinstance(app, dict) and not _is_names(app.get("plugs")):
+            yield _malformed_list("plugs", f" of {name}", app["plugs"])
+
+
+def _malformed_name(
+    key: str, where: str, value, fragment: Callable[[str], dict]
+) -> Finding:
+    # A list most likely starts with the intended name; otherwise there is
+    # nothing to suggest
+    names = _names(value) if isinstance(value, list) else []
+    return Finding(
+        "malformed-names",
+        f"Set the {key}{where} to a single name",
+        f"The {key}{where} is a {type(value).__name__}, not a name",
+        _patch(fragment(names[0])) if names else "",
+        f"snapcraft expects the {key} to be one name and fails otherwise",
+    )
+
+
+def _malformed_list(key: str, where: str, value) -> Finding:
+    return Finding(
+        "malformed-names",
+        f"Set the {key}{where} to a list of names",
+        f"The {key}{where} is a {type(value).__name__}, not a list of names",
+        "",
+        f"snapcraft expects {key} to be a list of names and fails otherwise",
+    )
+
+
+def parse(snapcraft_yaml: str) -> Optional[dict]:
+    """Return the parsed project, or None if it is not a YAML mapping."""
+    try:
+        project = yaml.load(snapcraft_yaml, Loader=_Loader)
+    except yaml.YAMLError:
+        return None
+    return project if isinstance(project, dict) else None
+
+
+def is_covered(project: dict) -> bool:
+    parts = project.get("parts")
+    return (
+        _name(project.get("base")) in BASE_PACKAGES
+        and isinstance(parts, dict)
+        and all(
+            isinstance(part, dict)
+            and _name(part.get("plugin")) in PLUGIN_BUILD_PACKAGES
+            for part in parts.values()
+        )
+    )
+
+
+def score(findings: Iterable[Finding]) -> int:
+    """Return the health score of a file with ``findings``: ``MAX_SCORE``
+    less the weight of every finding, and never below zero."""
+    return max(0, MAX_SCORE - sum(WEIGHTS[f.rule] for f in findings))
+
+
+def analyze(snapcraft_yaml: str) -> Analysis:
+    """Run every registered rule over a snapcraft.yaml."""
+    project = parse(snapcraft_yaml)
+    if project is None:
+        return Analysis()
+    findings = [finding for check in RULES.values() for finding in check(project)]
+    return Analysis(findings, is_covered(project))
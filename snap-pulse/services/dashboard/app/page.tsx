@@ -128,7 +128,7 @@ export default function Dashboard() {
                       Total Downloads
                     </dt>
                     <dd className="text-lg font-medium text-gray-900">
-                      {snapStats?.download_total?.toLocaleString() || 'Loading...'}
+                      {snapStats ? snapStats.download_total?.toLocaleString() ?? 'N/A' : 'Loading...'}
                     </dd>
                   </dl>
                 </div>
@@ -234,7 +234,7 @@ export default function Dashboard() {
                       +{snap.downloads_growth}%
                     </div>
                     <div className="text-xs text-gray-500">
-                      ★ {snap.rating}
+                      ★ {snap.rating ?? 'N/A'}
                     </div>
                   </div>
                 </div>
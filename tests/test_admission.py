@@ -0,0 +1,76 @@
+import sys
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    RouteClass,
+    classify,
+)
+
+
+def make_controller(max_in_flight=4):
+    return AdmissionController(
+        {
+            "health": RouteClass("health", 0, None),
+            "ingest": RouteClass("ingest", 0, 100.0, 100.0),
+            "read": RouteClass("read", 1, 0.01, 2.0),
+            "heavy": RouteClass("heavy", 2, 100.0, 100.0),
+        },
+        max_in_flight,
+    )
+
+
+def test_classify_routes():
+    """Test that routes fall into the expected classes."""
+    assert classify("/health") == "health"
+    assert classify("/ingest") == "ingest"
+    assert classify("/compare") == "heavy"
+    assert classify("/forecast/firefox/stable") == "heavy"
+    assert classify("/stats/firefox/stable") == "read"
+
+
+def test_clients_are_rate_limited_separately():
+    """Test that a client over its burst gets a 429 with Retry-After."""
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=make_controller())
+
+    @app.get("/stats")
+    async def stats():
+        return {}
+
+    client = TestClient(app)
+    assert [client.get("/stats").status_code for _ in range(3)] == [200, 200, 429]
+    response = client.get("/stats")
+    assert int(response.headers["retry-after"]) >= 1
+    assert response.json() == {"detail": "Too many requests"}
+
+    other = TestClient(app, client=("10.0.0.2", 1234))
+    assert other.get("/stats").status_code == 200
+
+
+def test_low_priority_requests_are_shed_first():
+    """Test that heavy reads are shed before ingest when capacity is used."""
+    controller = make_controller(max_in_flight=4)
+    assert controller.admit("a", "heavy") == (True, 0.0)
+    assert controller.admit("b", "heavy") == (True, 0.0)
+    # Heavy reads may use half of the capacity, ingest all of it
+    assert controller.admit("c", "heavy")[0] is False
+    assert controller.admit("c", "ingest")[0] is True
+    assert controller.admit("d", "ingest")[0] is True
+    assert controller.admit("e", "ingest")[0] is False
+    controller.release()
+    assert controller.admit("e", "health")[0] is True
+
+    metrics = controller.metrics()
+    assert metrics["in_flight"] == 4
+    assert metrics["classes"]["heavy"] == {"admitted": 2, "rate_limited": 0, "shed": 1}
+    assert metrics["classes"]["ingest"]["shed"] == 1
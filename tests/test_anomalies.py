@@ -0,0 +1,68 @@
+import math
+import sys
+import os
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from anomalies import SECONDS_PER_DAY, AnomalyDetector
+
+
+def feed(detector, days, rate=lambda day: 1000.0, rating=4.2):
+    """Feed one data point per day and return the events raised."""
+    events = []
+    total = 0
+    for day in range(days):
+        total += int(rate(day))
+        events += detector.observe(
+            "firefox", "stable", total, rating, day * SECONDS_PER_DAY
+        )
+    return events
+
+
+def test_monthly_seasonality_is_not_flagged():
+    """Test that the monthly download cycle is learned rather than flagged."""
+    detector = AnomalyDetector()
+    events = feed(
+        detector,
+        180,
+        rate=lambda day: 1000 * (1 + 0.2 * math.sin(2 * math.pi * day / 30)),
+    )
+    assert [e for e in events if e["metric"] == "downloads"] == []
+
+
+def test_download_spike_and_rating_drop_are_flagged():
+    """Test that jumps are flagged once and can be tailed with a cursor."""
+    detector = AnomalyDetector()
+    feed(detector, 30)
+    total = 30 * 1000
+    events = detector.observe(
+        "firefox", "stable", total + 10000, 2.0, 30 * SECONDS_PER_DAY
+    )
+    assert {(e["metric"], e["direction"]) for e in events} == {
+        ("downloads", "spike"),
+        ("rating", "drop"),
+    }
+
+    page, cursor = detector.events_after(0, limit=1)
+    assert page[0]["metric"] == "downloads"
+    assert page[0]["expected"] == 1000
+    page, cursor = detector.events_after(cursor)
+    assert [e["metric"] for e in page] == ["rating"]
+    assert detector.events_after(cursor) == ([], cursor)
+
+
+def test_event_buffer_is_bounded():
+    """Test that old events are dropped and stale cursors resume at the oldest."""
+    detector = AnomalyDetector(max_events=2)
+    for channel in ["stable", "candidate", "beta"]:
+        for day in range(10):
+            detector.observe("firefox", channel, 0, 4.2, day * SECONDS_PER_DAY)
+        detector.observe("firefox", channel, 0, 1.0, 10 * SECONDS_PER_DAY)
+
+    page, cursor = detector.events_after(0)
+    assert [e["channel"] for e in page] == ["candidate", "beta"]
+    assert [e["id"] for e in page] == [2, 3]
+    assert cursor == 3
@@ -3,17 +3,33 @@ import httpx
 from fastapi.testclient import TestClient
 import sys
 import os
+import gzip
+import json
 
 # Add the API service to the path
 sys.path.insert(
     0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
 )
 
-from main import app
+from forecasting import SECONDS_PER_DAY
+import main as main_module
+from main import app, forecaster, snap_store, summary
 
 client = TestClient(app)
 
 
+def load_worker(name):
+    """Import another instance of main.py, as a separate worker would."""
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(os.path.dirname(main_module.__file__), "main.py")
+    )
+    worker = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(worker)
+    return worker
+
+
 def test_health_endpoint():
     """Test that the health endpoint returns 200 and correct structure."""
     response = client.get("/health")
@@ -80,6 +96,20 @@ def test_stats_endpoint_no_data():
 
 def test_trending_endpoint():
     """Test that the trending endpoint returns trending data."""
+    client.post(
+        "/ingest",
+        json={
+            "snap_name": "trending-snap",
+            "channel": "stable",
+            "download_total": 1000000,
+            "download_last_30_days": 400000,
+            "rating": 5.0,
+            "version": "1.0.0",
+            "confinement": "strict",
+            "grade": "stable",
+            "publisher": "Test Publisher",
+        },
+    )
     response = client.get("/trending")
     assert response.status_code == 200
     data = response.json()
@@ -93,6 +123,40 @@ def test_trending_endpoint():
     assert "name" in first_item
     assert "downloads_growth" in first_item
     assert "rating" in first_item
+    # 400000 of 1000000 downloads in the last 30 days: 66.7% growth
+    assert first_item == {
+        "name": "trending-snap",
+        "downloads_growth": 66.7,
+        "rating": 5.0,
+        "trending_score": 100.0,
+    }
+
+    assert client.get("/trending?limit=0").status_code == 400
+
+
+def test_stats_all_channels_sums_downloads():
+    """Test that the all-channels stats sum downloads over channels."""
+    for channel, downloads in (("stable", 300), ("edge", 200)):
+        client.post(
+            "/ingest",
+            json={
+                "snap_name": "summary-snap",
+                "channel": channel,
+                "download_total": downloads,
+                "download_last_30_days": 10,
+                "rating": 4.0,
+                "version": f"{channel}-1",
+                "confinement": "strict",
+                "grade": "stable",
+                "publisher": "Test Publisher",
+            },
+        )
+    response = client.get("/stats/summary-snap")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_downloads"] == 500
+    assert data["channels"]["edge"]["version"] == "edge-1"
+    assert client.get("/stats/nonexistent-snap").status_code == 404
 
 
 def test_ingest_endpoint():
@@ -120,3 +184,572 @@ def test_ingest_endpoint():
     retrieved_data = response.json()
     assert retrieved_data["snap_name"] == "test-snap"
     assert retrieved_data["download_total"] == 100000
+
+
+def test_ingest_batch_endpoint():
+    """Test that a batch of records is ingested in one request."""
+    batch = [
+        {
+            "snap_name": f"batch-snap-{i}",
+            "channel": "stable",
+            "download_total": 1000 * (i + 1),
+            "download_last_30_days": 100,
+            "rating": 4.0,
+            "version": "1.0.0",
+            "confinement": "strict",
+            "grade": "stable",
+            "publisher": "Batch Publisher",
+        }
+        for i in range(3)
+    ]
+
+    response = client.post("/ingest/batch", json=batch)
+    assert response.status_code == 200
+    assert response.json() == {"status": "success", "ingested": 3}
+
+    response = client.get("/stats/batch-snap-2/stable")
+    assert response.status_code == 200
+    assert response.json()["download_total"] == 3000
+
+    response = client.post("/ingest/batch", json=batch * 200)
+    assert response.status_code == 400
+
+
+def test_ingest_without_downloads_or_rating():
+    """Test that unpublished figures are stored as null and not modelled."""
+    test_data = {
+        "snap_name": "unrated-snap",
+        "channel": "stable",
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "Unrated Publisher",
+    }
+    response = client.post("/ingest/batch", json=[test_data])
+    assert response.status_code == 200
+
+    stats = client.get("/stats/unrated-snap/stable").json()
+    assert stats["download_total"] is None
+    assert stats["rating"] is None
+    assert client.get("/stats/unrated-snap").json()["total_downloads"] == 0
+    assert client.get("/history/unrated-snap/stable").status_code == 404
+    assert client.get("/forecast/unrated-snap/stable").status_code == 404
+    # /compare has no series and no rank for it, but ranks published metrics
+    body = client.post(
+        "/compare",
+        json={
+            "snaps": ["unrated-snap"],
+            "metrics": ["download_total", "rating", "trending_score"],
+        },
+    ).json()
+    assert set(body["series"]["download_total"]["unrated-snap"]) == {None}
+    assert body["ranks"]["rating"] == []
+    assert [r["snap_name"] for r in body["ranks"]["trending_score"]] == ["unrated-snap"]
+
+    # Unpublished figures sort below every published one
+    response = client.get(
+        "/snaps",
+        params={"publisher": "Unrated Publisher", "sort": "rating", "order": "asc"},
+    )
+    assert response.status_code == 200
+    assert [s["snap_name"] for s in response.json()["snaps"]] == ["unrated-snap"]
+
+
+def test_release_endpoints_answer_from_channel_map():
+    """Test size growth and cadence queries over ingested channel maps."""
+    test_data = {
+        "snap_name": "release-snap",
+        "channel": "stable",
+        "download_total": 1000,
+        "download_last_30_days": 100,
+        "rating": 4.0,
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "Release Publisher",
+    }
+    for revision, released_at in [(10, "2025-01-01"), (12, "2025-01-15")]:
+        row = {
+            "channel": "latest/stable",
+            "architecture": "amd64",
+            "revision": revision,
+            "version": f"1.{revision}",
+            "size": revision * 1000,
+            "released_at": f"{released_at}T00:00:00Z",
+        }
+        response = client.post("/ingest", json={**test_data, "channel_map": [row]})
+        assert response.status_code == 200
+
+    response = client.get("/releases/release-snap/sizes")
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["revision"] for r in data["revisions"]] == [10, 12]
+    assert data["growth"] == 2000
+
+    response = client.get("/releases/release-snap/cadence")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["releases"] == 2
+    assert data["mean_interval_days"] == 14.0
+
+    response = client.get("/releases/release-snap/cadence?architecture=s390x")
+    assert response.status_code == 404
+
+
+def test_stats_endpoint_serves_precomputed_payload():
+    """Test that stats are served from the payload serialized at ingest."""
+    test_data = {
+        "snap_name": "payload-snap",
+        "channel": "edge",
+        "download_total": 42,
+        "download_last_30_days": 7,
+        "rating": 3.9,
+        "version": "2.0.0",
+        "confinement": "classic",
+        "grade": "devel",
+        "publisher": "Test Publisher",
+    }
+    assert client.post("/ingest", json=test_data).status_code == 200
+
+    response = client.get("/stats/payload-snap/edge")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == snap_store.get_payload("payload-snap", "edge")
+    assert response.json()["confinement"] == "classic"
+
+
+def test_snaps_query_filters_sorts_and_paginates():
+    """Test filtering, sorting and cursor pagination on the snaps endpoint."""
+    for i in range(5):
+        client.post(
+            "/ingest",
+            json={
+                "snap_name": f"query-snap-{i}",
+                "channel": "stable",
+                "download_total": 1000 * i,
+                "download_last_30_days": 100 * i,
+                "rating": 4.0,
+                "version": "1.0.0",
+                "confinement": "strict" if i % 2 == 0 else "classic",
+                "grade": "stable",
+                "publisher": "Query Publisher",
+            },
+        )
+
+    params = {
+        "publisher": "Query Publisher",
+        "confinement": "strict",
+        "sort": "download_last_30_days",
+        "limit": 2,
+    }
+    first = client.get("/snaps", params=params)
+    assert first.status_code == 200
+    page = first.json()
+    assert [s["snap_name"] for s in page["snaps"]] == ["query-snap-4", "query-snap-2"]
+    assert page["next_cursor"]
+
+    second = client.get("/snaps", params={**params, "cursor": page["next_cursor"]})
+    page = second.json()
+    assert [s["snap_name"] for s in page["snaps"]] == ["query-snap-0"]
+    assert page["next_cursor"] is None
+
+
+def test_snaps_query_rejects_bad_parameters():
+    """Test that unknown sort fields and malformed cursors are rejected."""
+    assert client.get("/snaps", params={"sort": "version"}).status_code == 400
+    assert client.get("/snaps", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_search_endpoint_ranks_prefix_and_typo_matches():
+    """Test that ingested metadata is searchable by prefix and with typos."""
+    test_data = {
+        "snap_name": "search-snap",
+        "channel": "stable",
+        "download_total": 1000,
+        "download_last_30_days": 100,
+        "rating": 4.0,
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "Search Publisher",
+        "summary": "A lightweight spreadsheet editor",
+        "description": "Edit spreadsheets quickly.",
+        "categories": ["productivity"],
+    }
+    assert client.post("/ingest", json=test_data).status_code == 200
+
+    for query in ["spreadsheet", "spreadsh", "spredsheet", "productivity editor"]:
+        response = client.get("/search", params={"q": query})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results, f"No results for {query}"
+        assert results[0]["snap_name"] == "search-snap"
+        assert results[0]["summary"] == "A lightweight spreadsheet editor"
+
+
+def test_anomalies_endpoint_tails_events():
+    """Test that anomalies are reported once and the cursor moves past them."""
+    test_data = {
+        "snap_name": "anomaly-snap",
+        "channel": "stable",
+        "download_total": 1000,
+        "download_last_30_days": 100,
+        "rating": 4.0,
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "Anomaly Publisher",
+    }
+    cursor = client.get("/anomalies").json()["next_cursor"]
+    for _ in range(10):
+        assert client.post("/ingest", json=test_data).status_code == 200
+    assert client.post("/ingest", json={**test_data, "rating": 1.0}).status_code == 200
+
+    page = client.get("/anomalies", params={"cursor": cursor}).json()
+    events = [e for e in page["anomalies"] if e["snap_name"] == "anomaly-snap"]
+    assert [(e["metric"], e["direction"]) for e in events] == [("rating", "drop")]
+    page = client.get("/anomalies", params={"cursor": page["next_cursor"]}).json()
+    assert page["anomalies"] == []
+    assert client.get("/anomalies", params={"limit": 0}).status_code == 400
+
+
+def test_forecast_endpoints():
+    """Test single and batch forecasts and the missing-history responses."""
+    for day in range(19000, 19010):
+        forecaster.observe("forecast-snap", "stable", day * 100, day * SECONDS_PER_DAY)
+
+    response = client.get("/forecast/forecast-snap/stable", params={"days": 3})
+    assert response.status_code == 200
+    assert [p["downloads"] for p in response.json()["forecast"]] == [100, 100, 100]
+    assert client.get("/forecast/unknown-snap/stable").status_code == 404
+    assert client.get("/forecast/forecast-snap/stable?days=0").status_code == 400
+
+    response = client.post(
+        "/forecast",
+        json={
+            "series": [{"snap_name": "forecast-snap"}, {"snap_name": "unknown-snap"}],
+            "days": 3,
+        },
+    )
+    assert response.status_code == 200
+    assert [f["snap_name"] for f in response.json()["forecasts"]] == ["forecast-snap"]
+    assert response.json()["missing"] == [
+        {"snap_name": "unknown-snap", "channel": "stable"}
+    ]
+
+
+def test_history_endpoint_uses_rollups():
+    """Test that ingested points are served as rollups over a time range."""
+    test_data = {
+        "snap_name": "history-snap",
+        "channel": "stable",
+        "download_total": 1000,
+        "download_last_30_days": 100,
+        "rating": 4.0,
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "History Publisher",
+    }
+    for total in (1000, 1500, 2500):
+        response = client.post("/ingest", json={**test_data, "download_total": total})
+        assert response.status_code == 200
+
+    response = client.get(
+        "/history/history-snap/stable", params={"metric": "downloads", "step": 86400}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["resolution"] == "day"
+    assert sum(p["sum"] for p in body["points"]) == 1500
+    assert sum(p["count"] for p in body["points"]) == 3
+
+    assert client.get("/history/unknown-snap/stable").status_code == 404
+    assert client.get("/history/history-snap/stable?metric=version").status_code == 400
+    assert client.get("/history/history-snap/stable?step=1").status_code == 400
+    # Raw points, which serve a step of 90 minutes, are kept for 2 days only
+    response = client.get("/history/history-snap/stable?step=5400")
+    assert response.status_code == 400
+    assert "multiple of 3600 seconds" in response.json()["detail"]
+
+
+def test_compare_endpoint_returns_series_and_ranks():
+    """Test that snaps are compared on aligned series and ranked."""
+    test_data = {
+        "channel": "stable",
+        "download_last_30_days": 100,
+        "rating": 4.0,
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "Compare Publisher",
+    }
+    for snap_name, total in [("compare-a", 5000), ("compare-b", 9000)]:
+        response = client.post(
+            "/ingest",
+            json={**test_data, "snap_name": snap_name, "download_total": total},
+        )
+        assert response.status_code == 200
+
+    response = client.post(
+        "/compare",
+        json={
+            "snaps": ["compare-a", "compare-b", "compare-missing"],
+            "metrics": ["download_total", "trending_score"],
+        },
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["timestamps"]) == len(body["series"]["download_total"]["compare-a"])
+    assert body["series"]["download_total"]["compare-b"][-1] == 9000
+    assert set(body["series"]["download_total"]["compare-missing"]) == {None}
+    ranks = body["ranks"]["download_total"]
+    assert [row["snap_name"] for row in ranks] == ["compare-b", "compare-a"]
+    assert ranks[0]["rank"] == 1 and ranks[0]["percentile"] is not None
+    assert body["missing"] == ["compare-missing"]
+
+    response = client.post("/compare", json={"snaps": ["a"], "metrics": ["version"]})
+    assert response.status_code == 400
+
+
+def test_summary_endpoint_serves_the_last_build():
+    """Test that /summary answers from the precomputed payload."""
+    client.post(
+        "/ingest",
+        json={
+            "snap_name": "summary-snap",
+            "channel": "beta",
+            "download_total": 1000,
+            "download_last_30_days": 100,
+            "rating": 4.0,
+            "version": "2.0",
+            "confinement": "strict",
+            "grade": "stable",
+            "publisher": "summary-publisher",
+        },
+    )
+    summary.refresh(snap_store.records())
+
+    response = client.get("/summary")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["totals"]["snaps"] == len({r.snap_name for r in snap_store.records()})
+    assert data["channel_mix"]["beta"]["records"] >= 1
+    assert data["recent_updates"][0]["snap_name"] == "summary-snap"
+    assert {"generated_at", "top_movers"} <= data.keys()
+
+    # Served as built: later ingests show up with the next build
+    client.post(
+        "/ingest",
+        json={
+            "snap_name": "summary-late",
+            "channel": "beta",
+            "download_total": 1,
+            "download_last_30_days": 1,
+            "rating": 1.0,
+            "version": "1",
+            "confinement": "strict",
+            "grade": "stable",
+            "publisher": "summary-publisher",
+        },
+    )
+    assert client.get("/summary").json() == data
+
+
+def test_metrics_endpoint_reports_admission():
+    """Test that admission counters are exposed."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    admission = response.json()["admission"]
+    assert admission["in_flight"] == 1
+    assert admission["classes"]["health"]["admitted"] >= 1
+
+
+def test_restart_persists_store_models_and_shutdown_time(tmp_path, monkeypatch):
+    """Test that a graceful shutdown persists state for the next start."""
+    import main
+    from datetime import datetime
+    from persistence import Journal
+    from store import MemoryStore
+
+    test_data = {
+        "snap_name": "restart-snap",
+        "channel": "stable",
+        "download_total": 1000,
+        "download_last_30_days": 100,
+        "rating": 4.0,
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "Restart Publisher",
+    }
+    start = int(datetime.now().timestamp()) // 3600 * 3600 - 3600
+    monkeypatch.setattr(main, "snap_store", MemoryStore(journal=Journal(tmp_path)))
+    with TestClient(app) as first:
+        assert first.post("/ingest", json=test_data).status_code == 200
+    history = main.rollups.query(
+        "restart-snap", "stable", "download_total", start, start + 7200, 3600
+    )
+    assert history is not None
+    main.rollups.set_state({"series": {}})
+    main.search_index.remove("restart-snap")
+
+    monkeypatch.setattr(main, "snap_store", MemoryStore(journal=Journal(tmp_path)))
+    with TestClient(app) as second:
+        response = second.get("/stats/restart-snap/stable")
+        assert response.status_code == 200
+        results = second.get("/search", params={"q": "restart"}).json()["results"]
+        assert "restart-snap" in [r["snap_name"] for r in results]
+        lifecycle = second.get("/metrics").json()["lifecycle"]
+    assert lifecycle["last_shutdown_sec"] >= 0
+    assert lifecycle["recovery_sec"] >= 0
+    assert (
+        main.rollups.query(
+            "restart-snap", "stable", "download_total", start, start + 7200, 3600
+        )
+        == history
+    )
+
+
+def test_restart_persists_models_with_the_sqlite_store(tmp_path, monkeypatch):
+    """Test that models survive a restart when the store has no journal."""
+    import main
+    from store import SqliteStore
+
+    monkeypatch.setattr(main, "snap_store", SqliteStore(str(tmp_path)))
+    with TestClient(app) as first:
+        response = first.post(
+            "/ingest",
+            json={
+                "snap_name": "sqlite-restart",
+                "channel": "stable",
+                "download_total": 1000,
+                "download_last_30_days": 100,
+                "rating": 4.0,
+                "version": "1.0.0",
+                "confinement": "strict",
+                "grade": "stable",
+                "publisher": "Restart Publisher",
+            },
+        )
+        assert response.status_code == 200
+    assert os.path.exists(tmp_path / "state.pickle")
+    main.search_index.remove("sqlite-restart")
+
+    monkeypatch.setattr(main, "snap_store", SqliteStore(str(tmp_path)))
+    with TestClient(app) as second:
+        results = second.get("/search", params={"q": "sqlite"}).json()["results"]
+    assert [r["snap_name"] for r in results] == ["sqlite-restart"]
+
+
+def test_workers_sharing_the_store_serve_each_others_ingests(tmp_path, monkeypatch):
+    """Test that a record ingested by one worker is searchable and has
+    history in another worker sharing the SQLite store."""
+    monkeypatch.setenv("STORE_DIR", str(tmp_path))
+    workers = [load_worker("api_worker_a"), load_worker("api_worker_b")]
+    test_data = {
+        "snap_name": "shared-snap",
+        "channel": "stable",
+        "download_total": 1000,
+        "download_last_30_days": 100,
+        "rating": 4.0,
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "Shared Publisher",
+    }
+
+    with TestClient(workers[0].app) as first, TestClient(workers[1].app) as second:
+        for total in (1000, 1500):
+            response = first.post(
+                "/ingest", json={**test_data, "download_total": total}
+            )
+            assert response.status_code == 200
+
+        results = second.get("/search", params={"q": "shared"}).json()["results"]
+        assert [r["snap_name"] for r in results] == ["shared-snap"]
+        response = second.get(
+            "/history/shared-snap/stable", params={"metric": "downloads", "step": 86400}
+        )
+        assert response.status_code == 200
+        assert sum(p["count"] for p in response.json()["points"]) == 2
+        assert second.get("/stats/shared-snap/stable").json()["download_total"] == 1500
+
+    # Each worker saved what it applied; a restarted worker replays nothing twice
+    with TestClient(load_worker("api_worker_c").app) as restarted:
+        response = restarted.get(
+            "/history/shared-snap/stable", params={"metric": "downloads", "step": 86400}
+        )
+        assert sum(p["count"] for p in response.json()["points"]) == 2
+
+
+def test_workers_read_settings_file(tmp_path, monkeypatch):
+    """Test that a worker takes its environment from the settings file."""
+    from store import SqliteStore
+
+    settings = tmp_path / "api.json"
+    settings.write_text(
+        json.dumps({"STORE_DIR": str(tmp_path / "store"), "SUMMARY_INGESTS": 5})
+    )
+    monkeypatch.setenv("SETTINGS_FILE", str(settings))
+    # The settings file overrides the environment; the values are
+    # restored after the test
+    monkeypatch.setenv("STORE_DIR", "")
+    monkeypatch.setenv("SUMMARY_INGESTS", "1000")
+
+    worker = load_worker("api_worker_settings")
+    assert isinstance(worker.snap_store, SqliteStore)
+    assert worker.summary.refresh_ingests == 5
+
+
+def test_export_streams_compressed_records():
+    """Test that exports stream every format and resume after a key."""
+    test_data = {
+        "channel": "stable",
+        "download_total": 1000,
+        "download_last_30_days": 100,
+        "rating": 4.0,
+        "version": "1.0.0",
+        "confinement": "strict",
+        "grade": "stable",
+        "publisher": "Export Publisher",
+    }
+    for i in range(3):
+        response = client.post(
+            "/ingest", json={**test_data, "snap_name": f"export-{i}"}
+        )
+        assert response.status_code == 200
+
+    params = {"publisher": "Export Publisher"}
+    response = client.get("/export", params=params)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    lines = gzip.decompress(response.content).splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert sorted(row["snap_name"] for row in rows) == [
+        "export-0",
+        "export-1",
+        "export-2",
+    ]
+
+    response = client.get(
+        "/export", params={**params, "format": "csv", "compression": "none"}
+    )
+    csv_rows = response.text.splitlines()
+    assert csv_rows[0].startswith("snap_name,channel,download_total")
+    assert len(csv_rows) == 4
+
+    response = client.get(
+        "/export", params={**params, "format": "columns", "compression": "none"}
+    )
+    assert response.json()["download_total"] == [1000, 1000, 1000]
+
+    after = f"{rows[0]['snap_name']}/{rows[0]['channel']}"
+    response = client.get("/export", params={**params, "after": after})
+    resumed = [
+        json.loads(line) for line in gzip.decompress(response.content).splitlines()
+    ]
+    assert resumed == rows[1:]
+
+    assert client.get("/export", params={"format": "xml"}).status_code == 400
+    assert client.get("/export", params={"after": "no-channel"}).status_code == 400
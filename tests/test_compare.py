@@ -0,0 +1,81 @@
+import sys
+import os
+
+import numpy as np
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from compare import Catalogue, rank_table
+from records import SnapRecord
+from rollups import DAY, RollupEngine
+
+
+def make_record(snap_name, channel, download_total):
+    return SnapRecord(
+        snap_name,
+        channel,
+        download_total,
+        0,
+        4.0,
+        "1.0",
+        0.0,
+        "strict",
+        "stable",
+        "P",
+        0.0,
+    )
+
+
+def test_rank_table_orders_and_shares_ties():
+    """Test that ranks descend by value and tied values share a rank."""
+    table = rank_table(
+        ["a", "b", "c", "d"], np.array([10.0, 30.0, 10.0, 20.0]), np.full(4, 50.0)
+    )
+    assert [(row["snap_name"], row["rank"]) for row in table] == [
+        ("b", 1),
+        ("d", 2),
+        ("a", 3),
+        ("c", 3),
+    ]
+
+
+def test_catalogue_percentiles_are_per_channel():
+    """Test that percentiles count the channel's snaps at or below a value."""
+    catalogue = Catalogue()
+    assert catalogue.stale()
+    records = [make_record(f"snap{i}", "stable", i * 10) for i in range(1, 11)]
+    records.append(make_record("edge-only", "edge", 1000))
+    catalogue.refresh(records)
+    assert not catalogue.stale()
+
+    percentiles = catalogue.percentiles(
+        "stable", "download_total", np.array([100.0, 50.0, 5.0])
+    )
+    assert percentiles.tolist() == [100.0, 50.0, 0.0]
+    assert np.isnan(catalogue.percentiles("beta", "download_total", np.ones(1))).all()
+
+
+def test_aggregate_aligns_series_and_matches_query():
+    """Test that bulk aggregation agrees with per-series range queries."""
+    engine = RollupEngine()
+    start = 1704067200
+    for i, snap_name in enumerate(["firefox", "vlc"]):
+        for point in range(4 * 24 * 2):
+            engine.observe(
+                snap_name, "stable", point * (i + 1), 4.0, start + DAY + point * 1800
+            )
+
+    keys = [("firefox", "stable"), ("missing", "stable"), ("vlc", "stable")]
+    times, aggregates = engine.aggregate(keys, "downloads", start, start + 6 * DAY, DAY)
+    assert times.tolist() == [start + day * DAY for day in range(6)]
+    assert np.isnan(aggregates["sum"][1]).all()
+    assert np.isnan(aggregates["sum"][:, 0]).all()
+    for row, key in [(0, keys[0]), (2, keys[2])]:
+        _, points = engine.query(*key, "downloads", start, start + 6 * DAY, DAY)
+        for point in points:
+            column = int((point["start"] - start) // DAY)
+            for name in ("count", "sum", "min", "max", "last"):
+                assert aggregates[name][row, column] == point[name]
@@ -1,15 +1,28 @@
 import pytest
 from fastapi.testclient import TestClient
+import base64
+import importlib.util
 import sys
 import os
 
+import httpx
+
 # Add the Copilot service to the path
-sys.path.insert(
-    0,
-    os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "copilot"),
+COPILOT_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "snap-pulse", "services", "copilot"
+)
+sys.path.insert(0, COPILOT_DIR)
+
+# Load the copilot's main.py under its own name: the API's is also "main"
+spec = importlib.util.spec_from_file_location(
+    "copilot_main", os.path.join(COPILOT_DIR, "main.py")
 )
+copilot_main = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(copilot_main)
+app = copilot_main.app
 
-from main import app
+from github_client import GitHubClient
+from results import ResultStore
 
 client = TestClient(app)
 
@@ -69,3 +82,68 @@ def test_github_webhook_endpoint():
     data = response.json()
     assert "status" in data
     assert data["status"] == "processing"
+
+
+def test_unchanged_snapcraft_yaml_is_answered_from_stored_analysis(monkeypatch):
+    pulls = []
+    content = base64.b64encode(
+        b"name: test-snap\nbase: core22\nconfinement: devmode\ngrade: stable\n"
+        b"parts:\n  app:\n    plugin: nil\n"
+    ).decode()
+
+    def handler(request):
+        path = request.url.path
+        if path == "/repos/owner/repo":
+            return httpx.Response(200, json={"default_branch": "main"})
+        if path == "/repos/owner/repo/contents/snapcraft.yaml":
+            if request.method == "PUT":
+                return httpx.Response(200, json={"content": {"sha": "b" * 40}})
+            return httpx.Response(
+                200,
+                json={
+                    "type": "file",
+                    "path": "snapcraft.yaml",
+                    "sha": "a" * 40,
+                    "content": content,
+                },
+            )
+        if path == "/repos/owner/repo/git/ref/heads/main":
+            return httpx.Response(200, json={"object": {"sha": "c" * 40}})
+        if path == "/repos/owner/repo/git/refs":
+            return httpx.Response(201, json={})
+        if path == "/repos/owner/repo/pulls":
+            pulls.append(request)
+            return httpx.Response(201, json={"html_url": "https://pr/1"})
+        return httpx.Response(404, json={"message": "Not Found"})
+
+    monkeypatch.setenv("GITHUB_TOKEN", "test")
+    monkeypatch.setattr(
+        copilot_main,
+        "github",
+        GitHubClient("test", transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(copilot_main, "results", ResultStore(None))
+    request = {
+        "snapcraft_yaml": "",
+        "repository_url": "https://github.com/owner/repo",
+        "issue_number": 1,
+    }
+
+    first = client.post("/analyze", json=request).json()
+    assert first["cached"] is False
+    assert first["pr_url"] == "https://pr/1"
+    assert first["score"] < 100
+    assert first["analysis_timestamp"] != "2025-07-11T00:00:00Z"
+
+    # Same file SHA: the stored analysis, and no second pull request
+    second = client.post("/analyze", json=request).json()
+    assert second["cached"] is True
+    assert second["suggestions"] == first["suggestions"]
+    assert second["analysis_timestamp"] == first["analysis_timestamp"]
+    assert len(pulls) == 1
+
+    history = client.get("/analyses/Owner/Repo").json()
+    assert [a["score"] for a in history["analyses"]] == [first["score"]]
+    assert history["score_trend"][-1]["score"] == first["score"]
+    assert client.get("/analyses/owner/unknown").status_code == 404
+    assert client.get("/analyses/owner/repo?limit=0").status_code == 400
@@ -0,0 +1,73 @@
+import math
+import sys
+import os
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from forecasting import REFIT_DAYS, SECONDS_PER_DAY, Forecaster
+
+FIRST_DAY = 19000
+
+
+def feed(forecaster, snap_name, days, daily, first_day=FIRST_DAY):
+    """Ingest four points a day with ``daily(day)`` downloads per day."""
+    total = 0.0
+    for day in range(days):
+        for hour in (0, 6, 12, 18):
+            total += daily(day) / 4
+            timestamp = (first_day + day) * SECONDS_PER_DAY + hour * 3600
+            forecaster.observe(snap_name, "stable", int(total), timestamp)
+
+
+def seasonal(day):
+    return 1000 * (1 + 0.2 * math.sin(2 * math.pi * day / 30))
+
+
+def test_forecast_follows_monthly_cycle():
+    """Test that a seasonal series is forecast with its monthly cycle."""
+    forecaster = Forecaster()
+    feed(forecaster, "firefox", 121, seasonal)
+
+    result = forecaster.forecast("firefox", "stable", 30)
+    assert result["model"] == "holt-winters"
+    assert len(result["forecast"]) == 30
+    for offset, point in enumerate(result["forecast"]):
+        assert abs(point["downloads"] - seasonal(120 + offset)) < 50
+
+
+def test_forecast_is_cached_and_refitted_lazily():
+    """Test that forecasts are cached and parameters refit after new days."""
+    forecaster = Forecaster()
+    feed(forecaster, "firefox", 10, lambda day: 100 * day)
+    assert forecaster.forecast("firefox", "stable", 7) is forecaster.forecast(
+        "firefox", "stable", 7
+    )
+
+    model = forecaster._models[("firefox", "stable")]
+    fitted_day = model.fitted_day
+    # Closing a couple of days updates the state but keeps the parameters
+    forecaster.observe("firefox", "stable", 10**6, (FIRST_DAY + 11) * SECONDS_PER_DAY)
+    forecaster.forecast("firefox", "stable", 7)
+    assert model.fitted_day == fitted_day
+    feed(forecaster, "firefox", REFIT_DAYS, lambda day: 100, FIRST_DAY + 12)
+    forecaster.forecast("firefox", "stable", 7)
+    assert model.fitted_day > fitted_day
+
+
+def test_batch_forecast_reports_missing_series():
+    """Test that series are forecast together and short ones are skipped."""
+    forecaster = Forecaster()
+    feed(forecaster, "firefox", 20, lambda day: 500)
+    feed(forecaster, "vlc", 20, lambda day: 50)
+    feed(forecaster, "new-snap", 1, lambda day: 50)
+
+    results = forecaster.forecast_many(
+        [("firefox", "stable"), ("new-snap", "stable"), ("vlc", "stable")], 5
+    )
+    assert results[1] is None
+    assert [p["downloads"] for p in results[0]["forecast"]] == [500] * 5
+    assert [p["downloads"] for p in results[2]["forecast"]] == [50] * 5
+    assert results[0]["projected_download_total"] == 500 * 24
@@ -0,0 +1,92 @@
+import asyncio
+import base64
+import sys
+import os
+import time
+
+import httpx
+
+# Add the Copilot service to the path
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "copilot"),
+)
+
+from github_client import GitHubClient, RateLimit, RateLimitExceeded
+
+
+def rate_headers(remaining, reset):
+    return {
+        "X-RateLimit-Limit": "5000",
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset),
+    }
+
+
+def test_find_file_probes_paths_concurrently_on_default_branch():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        headers = rate_headers(5000 - len(requests), int(time.time()) + 3600)
+        if request.url.path == "/repos/owner/repo":
+            return httpx.Response(
+                200, json={"default_branch": "trunk"}, headers=headers
+            )
+        if request.url.path.endswith("/contents/snap/snapcraft.yaml"):
+            content = base64.b64encode(b"name: test\n").decode()
+            return httpx.Response(
+                200,
+                json={
+                    "type": "file",
+                    "path": "snap/snapcraft.yaml",
+                    "sha": "abc",
+                    "content": content,
+                },
+                headers=headers,
+            )
+        return httpx.Response(404, json={"message": "Not Found"}, headers=headers)
+
+    async def run():
+        client = GitHubClient("token", transport=httpx.MockTransport(handler))
+        repo = await client.repo("owner", "repo")
+        # Repository metadata is cached
+        assert await client.repo("owner", "repo") is repo
+        found = await client.find_file(
+            "owner", "repo", ["snapcraft.yaml", "snap/snapcraft.yaml"], "trunk"
+        )
+        await client.aclose()
+        return found, client.rate_limit
+
+    found, rate_limit = asyncio.run(run())
+    assert found.path == "snap/snapcraft.yaml"
+    assert found.content == "name: test\n"
+    assert [r.url.path for r in requests].count("/repos/owner/repo") == 1
+    assert all(
+        r.url.params.get("ref") == "trunk" for r in requests if "contents" in r.url.path
+    )
+    assert rate_limit.remaining == 5000 - len(requests)
+
+
+def test_rate_limit_pauses_at_reserve_and_refuses_long_waits():
+    async def run():
+        limit = RateLimit(reserve=2, max_wait=1.0)
+        limit.update(httpx.Headers(rate_headers(3, time.time() + 3600)))
+        # One request left above the reserve
+        await limit.acquire()
+        assert limit.remaining == 2
+        try:
+            await limit.acquire()
+        except RateLimitExceeded as e:
+            assert e.retry_after > 3000
+        else:
+            raise AssertionError("expected RateLimitExceeded")
+
+        # A window resetting shortly is waited for
+        limit.update(httpx.Headers(rate_headers(1, time.time() + 0.05)))
+        started = time.monotonic()
+        await limit.acquire()
+        assert time.monotonic() - started >= 0.04
+        assert limit.remaining is None
+
+    asyncio.run(run())
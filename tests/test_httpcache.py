@@ -0,0 +1,134 @@
+import asyncio
+import sys
+import os
+import sqlite3
+
+import httpx
+
+# Add the collector service to the path
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(__file__), "..", "snap-pulse", "services", "collector"
+    ),
+)
+
+from httpcache import HttpCache
+
+
+def test_cache_sends_validators_and_keeps_records(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    assert cache.conditional_headers("firefox") == {}
+
+    record = {"snap_name": "firefox", "summary": "Web browser"}
+    cache.put("firefox", '"abc"', "Mon, 01 Sep 2025 00:00:00 GMT", record)
+    cache.close()
+
+    # Entries survive a restart
+    cache = HttpCache(str(tmp_path))
+    assert cache.conditional_headers("firefox") == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 01 Sep 2025 00:00:00 GMT",
+    }
+    assert cache.get("firefox") == record
+
+    # A response without validators drops the stale entry
+    cache.put("firefox", None, None, record)
+    assert cache.conditional_headers("firefox") == {}
+    assert cache.get("firefox") is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = HttpCache(None, max_entries=2)
+    cache.put("firefox", '"1"', None, {})
+    cache.put("vlc", '"2"', None, {})
+    cache.touch("firefox")
+    cache.put("gimp", '"3"', None, {})
+
+    assert len(cache) == 2
+    assert cache.get("vlc") is None
+    assert cache.get("firefox") == {}
+
+
+def test_cache_tells_when_a_delivered_record_is_due_again(tmp_path):
+    cache = HttpCache(None)
+    assert not cache.resend_due("firefox", 0)
+
+    cache.put("firefox", '"1"', None, {"snap_name": "firefox"})
+    assert not cache.resend_due("firefox", 3600)
+    assert cache.resend_due("firefox", 0)
+
+    # Caches written before delivery times were kept resend at once
+    path = os.path.join(str(tmp_path), "http-cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE entries (snap_name TEXT PRIMARY KEY, etag TEXT, "
+        "last_modified TEXT, record TEXT NOT NULL, used REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO entries VALUES ('vlc', '\"2\"', NULL, '{}', 0)")
+    conn.commit()
+    conn.close()
+    cache = HttpCache(str(tmp_path))
+    assert cache.resend_due("vlc", 3600)
+    cache.delivered("vlc")
+    assert not cache.resend_due("vlc", 3600)
+    assert cache.get("vlc") == {}
+
+
+def test_validators_are_cached_only_once_the_record_is_delivered(monkeypatch):
+    import app
+    from lifecycle import Shutdown, Spool
+
+    clients = []
+
+    async def get_snap_info(client, snap_name, cache):
+        clients.append(client)
+        return app.Fetched({"snap_name": snap_name}, etag=f'"{snap_name}"')
+
+    outcomes = [False, True]
+
+    async def send_batch(client, batch, timeout=30.0):
+        clients.append(client)
+        return outcomes.pop(0)
+
+    monkeypatch.setattr(app, "get_snap_info", get_snap_info)
+    monkeypatch.setattr(app, "send_batch", send_batch)
+    cache = HttpCache(None)
+
+    # Not sent and no spool to keep it: the next cycle must fetch in full
+    asyncio.run(app.collect_and_send(["firefox"], Shutdown(1), Spool(None), cache))
+    assert cache.conditional_headers("firefox") == {}
+    # Fetches and batches of a cycle share one client
+    assert clients[0] is clients[1]
+
+    asyncio.run(app.collect_and_send(["firefox"], Shutdown(1), Spool(None), cache))
+    assert cache.conditional_headers("firefox") == {"If-None-Match": '"firefox"'}
+
+
+def test_snap_record_leaves_out_unpublished_figures():
+    import app
+
+    def handler(request):
+        return httpx.Response(
+            200,
+            json={
+                "name": "firefox",
+                "channel-map": [
+                    {
+                        "channel": {"name": "stable", "risk": "stable"},
+                        "version": "128.0",
+                    }
+                ],
+            },
+            headers={"ETag": '"1"'},
+        )
+
+    async def fetch():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await app.get_snap_info(client, "firefox", HttpCache(None))
+
+    fetched = asyncio.run(fetch())
+    assert fetched.etag == '"1"'
+    assert fetched.record["version"] == "128.0"
+    for field in ("download_total", "download_last_30_days", "rating"):
+        assert field not in fetched.record
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+SERVICES = os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services")
+
+# Cumulative import time allowed per service, in seconds. Set
+# IMPORT_BUDGET_SCALE on slow machines rather than raising these.
+BUDGET_SCALE = float(os.getenv("IMPORT_BUDGET_SCALE", "1"))
+
+
+def import_times(service, module):
+    """Import ``module`` of a service in a fresh interpreter and return the
+    cumulative import time of every module it loaded, in seconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.join(SERVICES, service),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def check_startup(service, module, budget, deferred):
+    times = import_times(service, module)
+    for name in deferred:
+        assert name not in times, f"{module} imports {name} at startup"
+    assert times[module] <= budget * BUDGET_SCALE, (
+        f"Importing {service}/{module}.py took {times[module]:.3f}s, "
+        f"over its {budget * BUDGET_SCALE:.3f}s budget"
+    )
+
+
+def test_api_import_time():
+    """Test that the API starts without its client and server libraries."""
+    check_startup("api", "main", 1.2, ["httpx", "uvicorn", "opensearch_store"])
+
+
+def test_copilot_import_time():
+    """Test that the copilot starts without loading the model libraries."""
+    check_startup("copilot", "main", 1.0, ["torch", "transformers", "uvicorn"])
+
+
+def test_collector_import_time():
+    """Test that the collector imports within its budget."""
+    check_startup("collector", "app", 0.4, [])
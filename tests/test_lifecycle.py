@@ -0,0 +1,94 @@
+import asyncio
+import json
+import sys
+import os
+import time
+
+# Add the collector service to the path
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(__file__), "..", "snap-pulse", "services", "collector"
+    ),
+)
+
+from lifecycle import (
+    SPOOL_FILE,
+    Shutdown,
+    Spool,
+    read_lifecycle,
+    serve_metrics,
+    write_lifecycle,
+)
+
+
+def test_spool_returns_records_once(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append([{"snap_name": "firefox"}, {"snap_name": "vlc"}])
+    spool.append([{"snap_name": "gimp"}])
+    # A line torn by a kill mid-write is skipped
+    with open(tmp_path / SPOOL_FILE, "a") as f:
+        f.write('{"snap_na')
+
+    taker = Spool(str(tmp_path))
+    records = taker.take()
+    assert [r["snap_name"] for r in records] == ["firefox", "vlc", "gimp"]
+    taker.release()
+    assert spool.take() == []
+
+
+def test_spool_keeps_taken_records_until_released(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append([{"snap_name": "firefox"}])
+    assert [r["snap_name"] for r in spool.take()] == ["firefox"]
+
+    # Killed before release: the next process takes them again, with newer ones
+    spool.append([{"snap_name": "vlc"}])
+    restarted = Spool(str(tmp_path))
+    assert [r["snap_name"] for r in restarted.take()] == ["firefox", "vlc"]
+    restarted.release()
+    assert restarted.take() == []
+
+
+def test_shutdown_wakes_sleep_and_bounds_flush():
+    async def run():
+        shutdown = Shutdown(timeout=0.05)
+        assert shutdown.remaining() is None
+
+        asyncio.get_running_loop().call_later(0.01, shutdown.request)
+        started = time.monotonic()
+        await shutdown.sleep(60)
+        assert time.monotonic() - started < 1
+        assert shutdown.requested
+        assert 0 < shutdown.remaining() <= 0.05
+
+        await asyncio.sleep(0.06)
+        assert shutdown.remaining() == 0
+
+    asyncio.run(run())
+
+
+def test_metrics_serve_the_last_shutdown(tmp_path):
+    write_lifecycle(str(tmp_path), {"last_shutdown_sec": 1.5})
+    lifecycle = read_lifecycle(str(tmp_path))
+    assert read_lifecycle(None) == {}
+
+    async def run():
+        server = await serve_metrics(0, lambda: {"lifecycle": lifecycle})
+        port = server.sockets[0].getsockname()[1]
+        responses = []
+        for path in ("/metrics", "/other"):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            responses.append(await reader.read())
+            writer.close()
+        server.close()
+        await server.wait_closed()
+        return responses
+
+    metrics, missing = asyncio.run(run())
+    assert metrics.startswith(b"HTTP/1.1 200 OK")
+    assert json.loads(metrics.split(b"\r\n\r\n", 1)[1]) == {
+        "lifecycle": {"last_shutdown_sec": 1.5}
+    }
+    assert missing.startswith(b"HTTP/1.1 404")
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import httpx
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from models import SnapData
+from opensearch_mock import MockOpenSearch
+from opensearch_store import OpenSearchStore
+from store import MemoryStore
+
+CHANNELS = ["stable", "candidate", "beta", "edge"]
+
+
+def make_snaps(count):
+    for i in range(count):
+        yield SnapData(
+            snap_name=f"snap-{i // len(CHANNELS):03d}",
+            channel=CHANNELS[i % len(CHANNELS)],
+            download_total=100000 + i * 37 % 5000,
+            download_last_30_days=1000 + i * 13 % 900,
+            rating=3.0 + i % 20 / 10,
+            version=f"1.{i % 7}.0",
+            last_updated=datetime(2025, 7, 11),
+            confinement=["strict", "classic"][i % 2],
+            grade="stable",
+            publisher=f"publisher-{i % 5}",
+            trending_score=float(i * 7 % 101),
+        )
+
+
+def make_store(cluster, batch_size=50):
+    return OpenSearchStore(
+        "http://opensearch",
+        batch_size=batch_size,
+        transport=httpx.MockTransport(cluster),
+    )
+
+
+def test_opensearch_store_matches_memory_store():
+    """Test that queries, exports and aggregations agree with the memory
+    store once records are flushed."""
+    cluster = MockOpenSearch()
+    store = make_store(cluster)
+    memory = MemoryStore()
+
+    async def ingest():
+        await store.start()
+        for data in make_snaps(400):
+            store.put(data)
+            memory.put(data)
+        # Pending records are readable before they are indexed
+        assert store.get("snap-099", "edge").download_total == (
+            memory.get("snap-099", "edge").download_total
+        )
+        await store.stop()
+
+    asyncio.run(ingest())
+    assert len(store) == len(memory) == 400
+    assert cluster.counts["_bulk"] == 400 // 50
+
+    filters = {"publisher": "publisher-3", "confinement": None}
+    pages, after = [], None
+    while True:
+        expected, expected_after = memory.query(
+            filters, "trending_score", True, 7, after
+        )
+        records, after = store.query(filters, "trending_score", True, 7, after)
+        assert [(r.snap_name, r.channel) for r in records] == [
+            (r.snap_name, r.channel) for r in expected
+        ]
+        assert after == expected_after
+        pages.append(records)
+        if after is None:
+            break
+    assert sum(len(p) for p in pages) == 80
+
+    exported = [(r.snap_name, r.channel) for r in store.export({"channel": "beta"})]
+    assert exported == sorted(
+        (r.snap_name, r.channel) for r in memory.export({"channel": "beta"})
+    )
+    resumed = list(store.export({"channel": "beta"}, after=exported[9]))
+    assert [(r.snap_name, r.channel) for r in resumed] == exported[10:]
+    assert cluster.pits == {}
+
+    assert store.trending(5) == memory.trending(5)
+    assert store.snap_summary("snap-042") == memory.snap_summary("snap-042")
+    assert store.snap_summary("missing") is None
+    assert store.get_payload("snap-042", "beta") == memory.get_payload(
+        "snap-042", "beta"
+    )
+    keys = [("snap-042", "beta"), ("missing", "stable"), ("snap-007", "edge")]
+    assert [r and r.payload for r in store.get_records(keys)] == [
+        r and r.payload for r in memory.get_records(keys)
+    ]
+    assert cluster.counts["_mget"] == 1
+
+
+def test_opensearch_store_pauses_refresh_for_a_backlog():
+    """Test that a large backlog is sent with refresh off, then refreshed."""
+    cluster = MockOpenSearch()
+    store = make_store(cluster, batch_size=10)
+
+    async def ingest():
+        await store.start()
+        for data in make_snaps(12):
+            store.put(data)
+        assert await store.flush() == 12
+        assert cluster.refresh_intervals == []
+        for data in make_snaps(100):
+            store.put(data)
+        assert await store.flush() == 100
+        await store.stop()
+
+    asyncio.run(ingest())
+    assert cluster.refresh_intervals == ["-1", "1s"]
+    assert cluster.counts["_refresh"] == 1
+    assert len(store) == 100
+
+
+def test_opensearch_store_summary_includes_pending_records():
+    """Test that /stats/{snap_name} sees records not indexed yet."""
+    cluster = MockOpenSearch()
+    store = make_store(cluster)
+    memory = MemoryStore()
+
+    async def ingest():
+        await store.start()
+        snaps = list(make_snaps(8))
+        for data in snaps[:4]:
+            store.put(data)
+            memory.put(data)
+        await store.flush()
+        # A newer stable record and a new snap, both still pending
+        for data in [snaps[0].model_copy(update={"download_total": 1}), snaps[4]]:
+            store.put(data)
+            memory.put(data)
+        assert store.snap_summary("snap-000") == memory.snap_summary("snap-000")
+        assert store.snap_summary("snap-001") == memory.snap_summary("snap-001")
+        await store.stop()
+
+    asyncio.run(ingest())
+
+
+def test_opensearch_store_sorts_and_sums_missing_figures_like_memory_store():
+    """Test that unpublished downloads and ratings are handled alike."""
+    cluster = MockOpenSearch()
+    store = make_store(cluster)
+    memory = MemoryStore()
+    unpublished = {"download_total": None, "download_last_30_days": None}
+
+    async def ingest():
+        await store.start()
+        for i, data in enumerate(make_snaps(40)):
+            if i % 3 == 0:
+                data = data.model_copy(update={**unpublished, "rating": None})
+            store.put(data)
+            memory.put(data)
+        await store.stop()
+
+    asyncio.run(ingest())
+    for sort in ("download_total", "rating"):
+        after = None
+        while True:
+            expected, expected_after = memory.query({}, sort, False, 6, after)
+            records, after = store.query({}, sort, False, 6, after)
+            assert [(r.snap_name, r.channel) for r in records] == [
+                (r.snap_name, r.channel) for r in expected
+            ]
+            assert after == expected_after
+            if after is None:
+                break
+    assert store.trending(5) == memory.trending(5)
+    assert store.snap_summary("snap-000") == memory.snap_summary("snap-000")
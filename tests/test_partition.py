@@ -0,0 +1,38 @@
+import sys
+import os
+
+# Add the collector service to the path
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(__file__), "..", "snap-pulse", "services", "collector"
+    ),
+)
+
+from partition import claim, owner
+
+SNAPS = [f"snap-{i}" for i in range(3000)]
+
+
+def test_units_split_snaps_without_overlap():
+    """Test that every snap is claimed by exactly one unit, evenly."""
+    units = ["collector/0", "collector/1", "collector/2"]
+    slices = [claim(SNAPS, unit, units) for unit in units]
+    assert sorted(name for s in slices for name in s) == sorted(SNAPS)
+    assert all(800 < len(s) < 1200 for s in slices)
+    assert claim(SNAPS, "collector/0", []) == SNAPS
+
+
+def test_scaling_moves_few_snaps():
+    """Test that adding or removing a unit only moves that unit's snaps."""
+    units = ["collector/0", "collector/1", "collector/2"]
+    before = {name: owner(name, units) for name in SNAPS}
+
+    grown = {name: owner(name, units + ["collector/3"]) for name in SNAPS}
+    moved = [name for name in SNAPS if grown[name] != before[name]]
+    assert all(grown[name] == "collector/3" for name in moved)
+    assert len(moved) < len(SNAPS) / 3
+
+    shrunk = {name: owner(name, ["collector/0", "collector/2"]) for name in SNAPS}
+    moved = [name for name in SNAPS if shrunk[name] != before[name]]
+    assert all(before[name] == "collector/1" for name in moved)
@@ -0,0 +1,57 @@
+import sys
+import os
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from releases import SECONDS_PER_DAY, ReleaseHistory
+
+START = 1704067200
+
+
+def channel_map(edge, stable, day):
+    """Channel map rows with ``edge`` and ``stable`` revisions on amd64."""
+    released = START + day * SECONDS_PER_DAY
+    return [
+        ("latest/edge", "amd64", edge, f"1.{edge}", 1000 * edge, released),
+        ("latest/stable", "amd64", stable, f"1.{stable}", 1000 * stable, released),
+    ]
+
+
+def test_unchanged_rows_and_promotions_store_only_releases():
+    """Test that polls store nothing and promotions reuse the revision."""
+    history = ReleaseHistory()
+    assert history.observe("firefox", channel_map(2, 1, 0), START) == 2
+    # The same channel map polled again
+    assert history.observe("firefox", channel_map(2, 1, 0), START) == 0
+    # Revision 2 promoted to stable: a release, but no new revision
+    assert history.observe("firefox", channel_map(2, 2, 3), START) == 1
+
+    sizes = history.size_growth("firefox", "amd64")
+    assert [r["revision"] for r in sizes["revisions"]] == [1, 2]
+    assert history.cadence("firefox", "latest/stable", "amd64")["releases"] == 2
+    assert history.cadence("firefox", "latest/edge", "amd64")["releases"] == 1
+
+
+def test_size_growth_and_cadence():
+    """Test size changes between revisions and release intervals."""
+    history = ReleaseHistory()
+    for i, day in enumerate([0, 7, 21, 28]):
+        history.observe("firefox", channel_map(i + 2, i + 1, day), START)
+
+    sizes = history.size_growth("firefox", "amd64")
+    assert sizes["first_size"] == 1000
+    assert sizes["last_size"] == 5000
+    assert sizes["growth"] == 4000
+    assert sizes["revisions"][1]["change"] == 1000
+    assert sizes["revisions"][1]["change_pct"] == 100.0
+
+    cadence = history.cadence("firefox", "latest/stable", "amd64")
+    assert cadence["releases"] == 4
+    assert cadence["mean_interval_days"] == round(28 / 3, 2)
+    assert cadence["median_interval_days"] == 7.0
+    assert cadence["max_interval_days"] == 14.0
+    assert history.cadence("firefox", "latest/stable", "arm64") is None
+    assert history.size_growth("vlc", "amd64") is None
@@ -0,0 +1,47 @@
+import sys
+import os
+
+# Add the Copilot service to the path
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "copilot"),
+)
+
+from results import ResultStore
+
+SUGGESTIONS = [{"title": "Drop gcc", "rule": "redundant-build-packages"}]
+
+
+def test_find_returns_the_latest_analysis_of_a_file_sha(tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.add("owner/repo", "snapcraft.yaml", "a" * 40, 80, SUGGESTIONS, None)
+    latest = store.add(
+        "owner/repo", "snapcraft.yaml", "a" * 40, 85, SUGGESTIONS, "https://pr/1"
+    )
+    store.add("owner/other", "snapcraft.yaml", "b" * 40, 50, [], None)
+
+    found = store.find("owner/repo", "a" * 40)
+    assert found == latest
+    assert found.suggestions == SUGGESTIONS
+    assert store.find("owner/repo", "b" * 40) is None
+    store.close()
+
+    # Analyses outlive the process
+    reopened = ResultStore(str(tmp_path))
+    assert reopened.find("owner/repo", "a" * 40) == latest
+    assert len(reopened) == 3
+    reopened.close()
+
+
+def test_history_pages_newest_first():
+    store = ResultStore(None)
+    for i in range(5):
+        store.add("owner/repo", "snapcraft.yaml", str(i) * 40, 60 + i, [], None)
+    store.add("owner/other", "snapcraft.yaml", "f" * 40, 10, [], None)
+
+    first, before = store.history("owner/repo", limit=3)
+    assert [a.score for a in first] == [64, 63, 62]
+    second, last = store.history("owner/repo", limit=3, before=before)
+    assert [a.score for a in second] == [61, 60]
+    assert last is None
+    assert store.history("owner/missing") == ([], None)
@@ -0,0 +1,95 @@
+import sys
+import os
+
+import pytest
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from rollups import DAY, HOUR, WEEK, RollupEngine
+
+# A Monday at midnight UTC
+MONDAY = 1704067200
+
+
+def feed(engine, hours, points_per_hour=2):
+    """Ingest 100 downloads and a rising rating per point."""
+    interval = HOUR // points_per_hour
+    for i in range(hours * points_per_hour):
+        engine.observe(
+            "firefox", "stable", 100 * i, 4.0 + i / 1000, MONDAY + i * interval
+        )
+
+
+def test_resolution_is_coarsest_that_nests_in_step():
+    """Test that range queries use the coarsest rollup that fits the step."""
+    engine = RollupEngine()
+    assert engine.resolution_for(900) == "raw"
+    assert engine.resolution_for(HOUR) == "hour"
+    assert engine.resolution_for(6 * HOUR) == "hour"
+    assert engine.resolution_for(2 * DAY) == "day"
+    assert engine.resolution_for(WEEK) == "week"
+
+
+def test_resolution_must_reach_back_to_the_start_of_the_range():
+    """Test that a step whose level has expired the range is refused."""
+    engine = RollupEngine()
+    now = MONDAY + 100 * DAY
+    assert engine.resolution_for(5400, now - DAY, now) == "raw"
+    assert engine.resolution_for(DAY, now - 300 * DAY, now) == "day"
+    with pytest.raises(ValueError, match="multiple of 3600 seconds"):
+        engine.resolution_for(5400, now - 7 * DAY, now)
+    with pytest.raises(ValueError, match="multiple of 604800 seconds"):
+        engine.resolution_for(3 * DAY, now - 500 * DAY, now)
+    with pytest.raises(ValueError, match="History reaches back"):
+        engine.resolution_for(WEEK, now - 600 * WEEK, now)
+
+
+def test_rollups_aggregate_each_resolution():
+    """Test that every resolution gives the same totals for the same range."""
+    engine = RollupEngine()
+    feed(engine, 14 * 24)
+    end = MONDAY + 14 * DAY
+
+    totals = {}
+    for step in (1800, HOUR, DAY, WEEK):
+        resolution, points = engine.query(
+            "firefox", "stable", "downloads", MONDAY + DAY, end, step
+        )
+        totals[resolution] = sum(p["sum"] for p in points)
+    # Raw points cover the last two days, weeks the whole first week
+    assert totals == {
+        "raw": 100 * 2 * 48,
+        "hour": 100 * 13 * 48,
+        "day": 100 * 13 * 48,
+        "week": 100 * (14 * 48 - 1),
+    }
+
+    _, weeks = engine.query("firefox", "stable", "download_total", MONDAY, end, WEEK)
+    assert [p["start"] for p in weeks] == [MONDAY, MONDAY + WEEK]
+    assert [p["count"] for p in weeks] == [7 * 48, 7 * 48]
+    assert weeks[0]["last"] == 100 * (7 * 48 - 1)
+    assert weeks[1]["min"] == 100 * 7 * 48
+
+    _, days = engine.query("firefox", "stable", "rating", MONDAY, end, 2 * DAY)
+    assert len(days) == 7
+    assert days[0]["min"] == 4.0
+    assert days[0]["max"] == 4.0 + 95 / 1000
+
+
+def test_retention_expires_raw_points_but_keeps_rollups():
+    """Test that raw points age out while coarser rollups remain."""
+    engine = RollupEngine(retention={"raw": DAY, "hour": 2 * DAY})
+    feed(engine, 5 * 24)
+    end = MONDAY + 5 * DAY
+
+    _, raw = engine.query("firefox", "stable", "downloads", MONDAY, end, 1800)
+    assert len(raw) == 48
+    _, hours = engine.query("firefox", "stable", "downloads", MONDAY, end, HOUR)
+    # The hour the retention cut-off falls in is kept
+    assert len(hours) == 49
+    _, days = engine.query("firefox", "stable", "downloads", MONDAY, end, DAY)
+    assert [p["count"] for p in days] == [48] * 5
+    assert engine.query("vlc", "stable", "downloads", MONDAY, end, DAY) is None
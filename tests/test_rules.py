@@ -0,0 +1,122 @@
+import sys
+import os
+
+# Add the Copilot service to the path
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "copilot"),
+)
+
+import yaml
+
+from rules import MAX_SCORE, RULES, WEIGHTS, analyze, rule, score
+
+SNAPCRAFT_YAML = """
+name: test-snap
+base: core22
+version: '1.0'
+summary: Test snap
+description: A test snap for validation
+grade: stable
+confinement: devmode
+
+apps:
+  test-snap:
+    command: bin/test-snap
+    plugs: [home, network, network-control]
+
+parts:
+  app:
+    plugin: python
+    source: .
+    build-packages: [gcc, python3-dev, pkg-config, gcc]
+    stage-packages: [libssl3, libcurl4, ca-certificates]
+"""
+
+
+def test_rules_find_deterministic_issues():
+    analysis = analyze(SNAPCRAFT_YAML)
+    assert analysis.covered
+    findings = {f.rule: f for f in analysis.findings}
+
+    patch = yaml.safe_load(findings["redundant-build-packages"].yaml_patch)
+    assert patch == {"parts": {"app": {"build-packages": ["gcc", "pkg-config"]}}}
+
+    patch = yaml.safe_load(findings["base-stage-packages"].yaml_patch)
+    assert patch == {"parts": {"app": {"stage-packages": ["libcurl4"]}}}
+
+    patch = yaml.safe_load(findings["broad-plugs"].yaml_patch)
+    assert patch == {"apps": {"test-snap": {"plugs": ["personal-files", "network"]}}}
+
+    assert yaml.safe_load(findings["devmode-stable"].yaml_patch) == {
+        "confinement": "strict"
+    }
+
+
+def test_files_outside_the_rules_are_not_covered():
+    # Unknown plugin: the model still has to look at it
+    unknown = SNAPCRAFT_YAML.replace("plugin: python", "plugin: flutter")
+    assert not analyze(unknown).covered
+    assert not analyze("parts: [not, a, mapping").covered
+    assert analyze("- a list").findings == []
+
+
+def test_rules_are_pluggable():
+    @rule("no-summary")
+    def no_summary(project):
+        if not project.get("summary"):
+            yield "missing summary"
+
+    try:
+        assert "missing summary" in analyze("name: x\nbase: core22\n").findings
+    finally:
+        del RULES["no-summary"]
+
+
+def test_score_takes_off_the_weight_of_each_finding():
+    analysis = analyze(SNAPCRAFT_YAML)
+    rules = [finding.rule for finding in analysis.findings]
+    assert score(analysis.findings) == max(
+        0, MAX_SCORE - sum(WEIGHTS[name] for name in rules)
+    )
+    assert score([]) == MAX_SCORE
+    # Devmode in a stable grade alone costs more than a redundant package
+    assert WEIGHTS["devmode-stable"] > WEIGHTS["redundant-build-packages"]
+
+
+def test_non_string_base_or_plugin_is_a_finding():
+    malformed = SNAPCRAFT_YAML.replace("base: core22", "base: [core22, core24]")
+    malformed = malformed.replace("plugin: python", "plugin: {name: python}")
+    analysis = analyze(malformed)
+    assert not analysis.covered
+    findings = [f for f in analysis.findings if f.rule == "malformed-names"]
+    assert [f.title for f in findings] == [
+        "Set the base to a single name",
+        "Set the plugin of app to a single name",
+    ]
+    assert yaml.safe_load(findings[0].yaml_patch) == {"base": "core22"}
+    assert findings[1].yaml_patch == ""
+
+
+def test_single_names_read_as_lists_and_other_values_are_findings():
+    single = SNAPCRAFT_YAML.replace(
+        "stage-packages: [libssl3, libcurl4, ca-certificates]",
+        "stage-packages: libssl3",
+    )
+    single = single.replace(
+        "plugs: [home, network, network-control]", "plugs: network-control"
+    )
+    single = single.replace(
+        "build-packages: [gcc, python3-dev, pkg-config, gcc]", "build-packages: 5"
+    )
+    findings = {f.rule: f for f in analyze(single).findings}
+    patch = yaml.safe_load(findings["base-stage-packages"].yaml_patch)
+    assert patch == {"parts": {"app": {"stage-packages": []}}}
+    assert "broad-plugs" in findings
+    assert "redundant-build-packages" not in findings
+    malformed = findings["malformed-names"]
+    assert malformed.title == "Set the build-packages of app to a list of names"
+    assert (
+        malformed.description
+        == "The build-packages of app is a int, not a list of names"
+    )
@@ -0,0 +1,50 @@
+import sys
+import os
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from search import SearchIndex, _within_one_edit
+
+
+def test_reindexing_replaces_previous_text():
+    """Test that re-ingesting a snap drops terms it no longer contains."""
+    index = SearchIndex()
+    index.add("firefox", {"summary": "Mozilla web browser"})
+    index.add("chromium", {"summary": "Open source browser"})
+    index.add("firefox", {"summary": "Private web browsing"})
+
+    assert [name for name, _, _ in index.search("mozilla ")] == []
+    assert [name for name, _, _ in index.search("private")] == ["firefox"]
+    assert {name for name, _, _ in index.search("browser ")} == {"chromium"}
+    assert len(index) == 2
+
+
+def test_within_one_edit():
+    """Test the edit distance check used for typo matching."""
+    assert _within_one_edit("browser", "browsr")
+    assert _within_one_edit("browser", "borwser")
+    assert _within_one_edit("browser", "browzer")
+    assert not _within_one_edit("browser", "bruwsr")
+
+
+def test_state_round_trip_keeps_exact_prefix_and_fuzzy_matches():
+    """Test that a restored index answers as the saved one did."""
+    index = SearchIndex()
+    index.add("firefox", {"summary": "Mozilla web browser"})
+    index.add("chromium", {"summary": "Open source browser"})
+    index.add("vlc", {"summary": "Media player", "categories": ["video"]})
+    for query in ("browser", "brow", "browsr", "media player"):
+        index.search(query)
+
+    restored = SearchIndex()
+    restored.set_state(index.get_state())
+    for query in ("browser", "brow", "browsr", "media player"):
+        assert restored.search(query) == index.search(query)
+    assert len(restored) == 3
+
+    # Still maintained incrementally after the restore
+    restored.add("firefox", {"summary": "Private web browsing"})
+    assert [name for name, _, _ in restored.search("mozilla ")] == []
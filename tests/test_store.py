@@ -0,0 +1,298 @@
+import sys
+import os
+import threading
+from datetime import datetime
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+from models import SnapData
+from persistence import Journal, encode_record
+from indexes import SortedList
+from records import SnapRecord
+from store import MemoryStore, SqliteStore, shard_for
+
+
+def make_snap(snap_name="firefox", channel="stable", download_total=150000):
+    return SnapData(
+        snap_name=snap_name,
+        channel=channel,
+        download_total=download_total,
+        download_last_30_days=12000,
+        rating=4.2,
+        version="1.0.0",
+        last_updated=datetime(2025, 7, 11),
+        confinement="strict",
+        grade="stable",
+        publisher="Test Publisher",
+        trending_score=54.0,
+    )
+
+
+def test_shard_for_is_stable():
+    """Test that a snap always maps to the same shard."""
+    assert shard_for("firefox", 16) == shard_for("firefox", 16)
+    assert 0 <= shard_for("firefox", 16) < 16
+
+
+def test_memory_store_put_and_get():
+    """Test that the memory store keeps the latest record per channel."""
+    store = MemoryStore(shards=4)
+    store.put(make_snap(download_total=1))
+    store.put(make_snap(download_total=2))
+    store.put(make_snap(channel="edge"))
+
+    assert store.get("firefox", "stable").download_total == 2
+    assert set(store.channels("firefox")) == {"stable", "edge"}
+    assert store.get("firefox", "beta") is None
+    assert len(store) == 2
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    """Test that two store instances on one directory see each other's writes."""
+    writer = SqliteStore(str(tmp_path), shards=4)
+    reader = SqliteStore(str(tmp_path), shards=4)
+
+    writer.put(make_snap())
+    assert reader.get("firefox", "stable") == make_snap()
+
+    writer.put(make_snap(download_total=200000))
+    assert reader.get("firefox", "stable").download_total == 200000
+    assert len(reader) == 1
+    assert [r.snap_name for r in reader.records()] == ["firefox"]
+
+
+def test_journal_recovers_snapshot_and_log(tmp_path):
+    """Test that a restarted store recovers the snapshot plus later ingests."""
+    store = MemoryStore(shards=4, journal=Journal(str(tmp_path)))
+    store.put(make_snap(download_total=1))
+    store.put(make_snap(snap_name="discord"))
+    assert store.checkpoint() == 2
+    store.put(make_snap(download_total=2))
+    store.close()
+
+    restarted = MemoryStore(shards=4, journal=Journal(str(tmp_path)))
+    assert restarted.journal.recover(restarted) == 3
+    assert restarted.get("firefox", "stable").download_total == 2
+    assert restarted.get("discord", "stable") == make_snap(snap_name="discord")
+    assert len(restarted) == 2
+
+
+def test_checkpoint_keeps_a_put_racing_with_rotation(tmp_path):
+    """Test that a record logged before a checkpoint is in its snapshot."""
+
+    class RacingJournal(Journal):
+        def append(self, data):
+            super().append(data)
+            if data.snap_name == "discord":
+                # Checkpoint after the record is logged but before the put
+                # stores it
+                self.racer = threading.Thread(target=store.checkpoint)
+                self.racer.start()
+                self.racer.join(0.2)
+
+    journal = RacingJournal(str(tmp_path))
+    store = MemoryStore(shards=4, journal=journal)
+    store.put(make_snap())
+    store.put(make_snap(snap_name="discord"))
+    journal.racer.join()
+    store.close()
+
+    restarted = MemoryStore(shards=4, journal=Journal(str(tmp_path)))
+    assert restarted.journal.recover(restarted) == 2
+    assert restarted.get("discord", "stable") == make_snap(snap_name="discord")
+
+
+def test_journal_keeps_missing_downloads_and_rating(tmp_path):
+    """Test that unpublished figures survive the log and the snapshot."""
+    unrated = make_snap(snap_name="unrated").model_copy(
+        update={"download_total": None, "download_last_30_days": None, "rating": None}
+    )
+    store = MemoryStore(shards=4, journal=Journal(str(tmp_path)))
+    store.put(make_snap())
+    store.put(unrated)
+    store.checkpoint()
+    store.put(unrated.model_copy(update={"channel": "edge"}))
+    store.close()
+
+    restarted = MemoryStore(shards=4, journal=Journal(str(tmp_path)))
+    assert restarted.journal.recover(restarted) == 3
+    assert restarted.get("unrated", "stable") == unrated
+    assert restarted.get("unrated", "edge").rating is None
+    assert restarted.get("firefox", "stable") == make_snap()
+    page, _ = restarted.query({}, "download_total", True, 3)
+    assert [(r.snap_name, r.channel) for r in page] == [
+        ("firefox", "stable"),
+        ("unrated", "stable"),
+        ("unrated", "edge"),
+    ]
+
+
+def test_journal_ignores_torn_log_tail(tmp_path):
+    """Test that a partially written frame at the end of the log is skipped."""
+    journal = Journal(str(tmp_path))
+    journal.append(SnapRecord.from_model(make_snap()))
+    journal.close()
+    with open(next(tmp_path.glob("wal-*.log")), "ab") as f:
+        f.write(
+            encode_record(SnapRecord.from_model(make_snap(snap_name="discord")))[:-3]
+        )
+
+    store = MemoryStore(shards=4)
+    assert Journal(str(tmp_path)).recover(store) == 1
+    assert store.get("discord", "stable") is None
+
+
+def test_snap_record_round_trip_shares_categorical_strings():
+    """Test that compact records convert back to SnapData and intern strings."""
+    first = SnapRecord.from_model(make_snap(snap_name="firefox"))
+    second = SnapRecord.from_model(make_snap(snap_name="discord"))
+
+    assert first.to_model() == make_snap(snap_name="firefox")
+    assert first.publisher is second.publisher
+    assert first.confinement is second.confinement
+    assert not hasattr(first, "__dict__")
+
+
+def test_stores_answer_queries_from_indexes(tmp_path):
+    """Test that both backends filter, sort and page through the same way."""
+    for store in (MemoryStore(shards=4), SqliteStore(str(tmp_path), shards=4)):
+        for i in range(10):
+            store.put(make_snap(snap_name=f"snap-{i}", download_total=i % 4))
+        store.put(make_snap(snap_name="snap-3", channel="edge"))
+
+        filters = {"channel": "stable", "publisher": "Test Publisher"}
+        names, after = [], None
+        while True:
+            page, after = store.query(filters, "download_total", True, 3, after)
+            names.extend(record.snap_name for record in page)
+            if after is None:
+                break
+
+        expected = sorted(
+            (f"snap-{i}" for i in range(10)),
+            key=lambda name: (int(name[5:]) % 4, name),
+            reverse=True,
+        )
+        assert names == expected
+
+        page, after = store.query({"channel": "edge"}, "rating", False, 3)
+        assert [(r.snap_name, r.channel) for r in page] == [("snap-3", "edge")]
+        assert after is None
+
+
+def test_memory_store_indexes_restored_records_without_blocking():
+    """Test that puts and queries go on while restored records are indexed."""
+    store = MemoryStore(shards=4)
+    for i in range(10):
+        store.restore(SnapRecord.from_model(make_snap(f"snap-{i}", download_total=i)))
+
+    # Queries scan until the index is built, paging the same way
+    names, after = [], None
+    while True:
+        page, after = store.query(
+            {"channel": "stable"}, "download_total", True, 4, after
+        )
+        names.extend(record.snap_name for record in page)
+        if after is None:
+            break
+    assert names == [f"snap-{i}" for i in reversed(range(10))]
+
+    build = store.index.build
+
+    def build_during_put(records):
+        records = list(records)
+        store.put(make_snap("snap-0", download_total=100))
+        store.put(make_snap("snap-new", download_total=50))
+        build(records)
+
+    store.index.build = build_during_put
+    store.ensure_index()
+
+    page, _ = store.query({}, "download_total", True, 3)
+    assert [r.snap_name for r in page] == ["snap-0", "snap-new", "snap-9"]
+    assert len(store.index) == 11
+
+
+def test_stores_export_a_consistent_snapshot(tmp_path):
+    """Test that exports ignore later writes and resume after a key."""
+    for store in (MemoryStore(shards=4), SqliteStore(str(tmp_path), shards=4)):
+        for i in range(20):
+            store.put(make_snap(snap_name=f"snap-{i}", download_total=i))
+
+        export = store.export({"channel": "stable"})
+        first = [next(export) for _ in range(5)]
+        # Writes after the export started are not part of it
+        for i in range(20):
+            store.put(make_snap(snap_name=f"snap-{i}", download_total=-1))
+        store.put(make_snap(snap_name="snap-new"))
+        rest = list(export)
+
+        records = first + rest
+        assert sorted(r.snap_name for r in records) == sorted(
+            f"snap-{i}" for i in range(20)
+        )
+        assert all(r.download_total == int(r.snap_name[5:]) for r in records)
+
+        after = (records[7].snap_name, records[7].channel)
+        resumed = [r.snap_name for r in store.export({}, after)]
+        assert "snap-new" in resumed
+        resumed.remove("snap-new")
+        assert resumed == [r.snap_name for r in records[8:]]
+
+
+def test_sorted_list_iterates_from_cursor():
+    """Test that the bucketed sorted list stays ordered across splits."""
+    SortedList.LOAD, load = 4, SortedList.LOAD
+    try:
+        items = SortedList()
+        for value in [5, 3, 9, 1, 7, 2, 8, 6, 4, 0, 11, 10]:
+            items.add(value)
+        items.remove(7)
+        assert list(items.iter_after()) == [0, 1, 2, 3, 4, 5, 6, 8, 9, 10, 11]
+        assert list(items.iter_after(5)) == [6, 8, 9, 10, 11]
+        assert list(items.iter_after(5, reverse=True)) == [4, 3, 2, 1, 0]
+    finally:
+        SortedList.LOAD = load
+
+
+def test_sorted_list_orders_by_key_across_splits():
+    """Test that a keyed sorted list keeps items ordered by their key as
+    they are added, removed and re-added with a new key."""
+    SortedList.LOAD, load = 4, SortedList.LOAD
+    try:
+        values = [5, 3, 9, 1, 7, 2, 8, 6, 4, 0, 11, 10]
+        items = SortedList(range(6), key=lambda i: values[i])
+        for i in range(6, len(values)):
+            items.add(i)
+        # Move item 4 from value 7 to the end
+        items.remove(4)
+        values[4] = 12
+        items.add(4)
+        expected = [0, 1, 2, 3, 4, 5, 6, 8, 9, 10, 11, 12]
+        assert [values[i] for i in items.iter_after()] == expected
+        assert [values[i] for i in items.iter_after(8)] == [9, 10, 11, 12]
+        assert [values[i] for i in items.iter_after(8, reverse=True)] == expected[6::-1]
+    finally:
+        SortedList.LOAD = load
+
+
+def test_memory_store_reindexes_a_replaced_record():
+    """Test that putting a record again moves it in the sorted indexes."""
+    store = MemoryStore(shards=2)
+    for i in range(5):
+        store.put(make_snap(snap_name=f"snap-{i}", download_total=i * 10))
+    store.put(
+        make_snap(snap_name="snap-0", download_total=100).model_copy(
+            update={"publisher": "Other"}
+        )
+    )
+
+    page, _ = store.query({}, "download_total", True, 2)
+    assert [r.snap_name for r in page] == ["snap-0", "snap-4"]
+    page, _ = store.query({"publisher": "Other"}, "download_total", True, 5)
+    assert [r.snap_name for r in page] == ["snap-0"]
+    page, _ = store.query({"publisher": "Test Publisher"}, "download_total", True, 5)
+    assert [r.snap_name for r in page] == ["snap-4", "snap-3", "snap-2", "snap-1"]
@@ -0,0 +1,79 @@
+import sys
+import os
+
+# Add the API service to the path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "snap-pulse", "services", "api")
+)
+
+import json
+
+from records import SnapRecord
+from summary import Summary, build_summary
+
+
+def make_record(snap_name, channel, download_total, last_30_days, updated):
+    return SnapRecord(
+        snap_name,
+        channel,
+        download_total,
+        last_30_days,
+        4.0,
+        "1.0",
+        updated,
+        "strict",
+        "stable",
+        f"publisher-{snap_name}",
+        10.0,
+    )
+
+
+RECORDS = [
+    make_record("firefox", "stable", 9000, 1000, 100.0),
+    make_record("firefox", "edge", 1000, 500, 300.0),
+    make_record("vlc", "stable", 4000, 2000, 200.0),
+    make_record("gimp", "stable", 6000, 0, 50.0),
+]
+
+
+def test_build_summary_totals_movers_channels_and_recent_updates():
+    summary = build_summary(RECORDS, top=2)
+
+    assert summary["totals"] == {
+        "snaps": 3,
+        "records": 4,
+        "publishers": 3,
+        "download_total": 20000,
+        "download_last_30_days": 3500,
+    }
+    # vlc doubled its downloads; firefox grew 1500 on 8500
+    assert [m["name"] for m in summary["top_movers"]] == ["vlc", "firefox"]
+    assert summary["top_movers"][0]["downloads_growth"] == 100.0
+    assert summary["channel_mix"]["stable"] == {
+        "records": 3,
+        "download_total": 19000,
+        "download_share": 95.0,
+    }
+    assert [(u["snap_name"], u["channel"]) for u in summary["recent_updates"]] == [
+        ("firefox", "edge"),
+        ("vlc", "stable"),
+    ]
+
+
+def test_summary_is_rebuilt_after_its_interval_or_enough_ingests():
+    summary = Summary(refresh_sec=3600, refresh_ingests=3)
+    assert summary.payload is None
+    assert summary.due()
+
+    summary.refresh(RECORDS)
+    assert json.loads(summary.payload)["totals"]["records"] == 4
+    assert not summary.due()
+    summary.ingested(2)
+    assert not summary.due()
+    summary.ingested()
+    assert summary.due()
+
+    summary.refresh(RECORDS[:1])
+    assert json.loads(summary.payload)["totals"]["records"] == 1
+    summary.refresh_sec = 0
+    assert summary.due()